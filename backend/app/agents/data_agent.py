@@ -4,15 +4,23 @@ from openai import OpenAI
 from polygon import RESTClient
 from dotenv import load_dotenv
 import os
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, timezone
+from services.bar_store import bar_to_dict
 
 load_dotenv()
 
 class DataAgent:
-    def __init__(self):
-        # Initialize DataAgent with OpenAI and Polygon
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.polygon = RESTClient(api_key=os.getenv('POLYGON_API_KEY'))
+    def __init__(self, client=None, polygon=None, bar_store=None, market_stream=None):
+        # Initialize DataAgent with OpenAI and Polygon (clients can be shared by the caller)
+        self.client = client or OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.polygon = polygon or RESTClient(api_key=os.getenv('POLYGON_API_KEY'))
+        
+        # Optional local OHLCV history, used for backtesting and analytics
+        self.bar_store = bar_store
+        
+        # Optional BarAggregator fed by the live trade stream
+        self.market_stream = market_stream
         
     def get_market_data(self, symbol: str):
         """Get last 7 days of crypto market data"""
@@ -28,6 +36,12 @@ class DataAgent:
         print(f"From: {start}")
         print(f"To: {end}")
         
+        # Live bars from the trade stream plus stored history avoid the REST call entirely
+        streamed = self._streamed_market_data(symbol, start)
+        if streamed is not None:
+            print(f"Using streamed {symbol} bars")
+            return streamed, start, end
+        
         # Get data from Polygon
         market_data = self.polygon.get_aggs(
             ticker=f"X:{symbol}USD",
@@ -37,15 +51,100 @@ class DataAgent:
             to=end,
             limit=7
         ) 
-
+        
+        self._store_bars(symbol, market_data)
+        
+        # Overlay the still-open daily bar so the current price is up to the second
+        if self.market_stream and self.market_stream.is_fresh(symbol):
+            market_data = self._merge_bars(
+                market_data,
+                self.market_stream.get_bars(symbol, '1d', limit=7),
+                self.market_stream.partial_timestamps(symbol, '1d')
+            )
         
         return market_data, start, end
 
+    def _streamed_market_data(self, symbol: str, start: str, days: int = 7):
+        """Daily bars built from stored history and the live stream, or None if they don't cover the window"""
+        if not self.market_stream or not self.market_stream.is_fresh(symbol):
+            return None
+        
+        # Polygon daily bars are stamped at midnight UTC
+        since_ms = int(datetime.strptime(start, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+        history = self.bar_store.get_bars(symbol, "day", since=since_ms) if self.bar_store else []
+        streamed = self.market_stream.get_bars(symbol, '1d', limit=days)
+        partial = self.market_stream.partial_timestamps(symbol, '1d')
+        
+        # A bar the stream joined mid-day can only extend a complete stored bar, never stand in for one
+        stored = {bar["timestamp"] for bar in history}
+        if any(bar["timestamp"] in partial and bar["timestamp"] not in stored for bar in streamed):
+            return None
+        
+        bars = self._merge_bars(history, streamed, partial)
+        if len(bars) < days:
+            return None
+        return bars[-days:]
+
+    @staticmethod
+    def _merge_bars(bars, overlay, partial=()):
+        """
+        Merge two bar lists by timestamp, preferring the overlay's bars
+        
+        Overlay bars whose timestamp is in partial were only seen from partway through
+        the bucket; they update the base bar's close, widen its high and low and add
+        their volume instead of replacing it.
+        """
+        merged = {bar["timestamp"]: bar for bar in (bar_to_dict(bar) for bar in bars or [])}
+        for bar in (bar_to_dict(bar) for bar in overlay or []):
+            base = merged.get(bar["timestamp"])
+            if base is not None and bar["timestamp"] in partial:
+                merged[bar["timestamp"]] = {
+                    **base,
+                    "high": max(base["high"], bar["high"]),
+                    "low": min(base["low"], bar["low"]),
+                    "close": bar["close"],
+                    "volume": (base["volume"] or 0) + (bar["volume"] or 0)
+                }
+            else:
+                merged[bar["timestamp"]] = bar
+        return [merged[timestamp] for timestamp in sorted(merged)]
+
+    def _store_bars(self, symbol: str, bars, timespan: str = "day"):
+        """Keep fetched bars in the local bar store, if one is configured"""
+        if not self.bar_store:
+            return
+        try:
+            self.bar_store.record_bars(symbol, bars, timespan)
+        except Exception as e:
+            print(f"Error storing {symbol} bars: {e}")
+
+    def backfill_bars(self, symbol: str, days: int = 365):
+        """Fetch up to `days` of daily bars into the local bar store"""
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        
+        bars = self.polygon.get_aggs(
+            ticker=f"X:{symbol}USD",
+            multiplier=1,
+            timespan="day",
+            from_=start_date.strftime('%Y-%m-%d'),
+            to=end_date.strftime('%Y-%m-%d'),
+            limit=50000
+        )
+        
+        self._store_bars(symbol, bars)
+        return len(bars)
+
     async def analyze_crypto(self, crypto: str):
         """Analyze crypto with market data"""
-        market_data, start_date, end_date = self.get_market_data(crypto)
-        
-        completion = self.client.chat.completions.create(
+        # Blocking calls run in worker threads so the pipeline can be cancelled between them
+        market_data, start_date, end_date = await asyncio.to_thread(self.get_market_data, crypto)
+        return await self.analyze_market_data(crypto, market_data, start_date, end_date)
+
+    async def analyze_market_data(self, crypto: str, market_data, start_date: str, end_date: str):
+        """LLM analysis of already-fetched market data"""
+        completion = await asyncio.to_thread(
+            self.client.chat.completions.create,
             model="gpt-4",
             messages=[
                 {
@@ -8,28 +8,114 @@ import re
 from dotenv import load_dotenv
 from agents.data_agent import DataAgent
 from agents.sentiment_agent import SentimentAgent
+from services.bar_store import latest_close
+from services.router import create_router
+from services.cache_backend import FlightGroup
+from services.prompt_builder import PromptBuilder, format_bars
+from services.simulation import format_simulation
+from services.fingerprint import market_fingerprint, market_changed, ids_fingerprint, ids_changed, text_fingerprint
 from datetime import datetime, timedelta
 
 load_dotenv()
 
+SIMULATION_HEADING = "Monte Carlo simulation of the price from stored daily bars (reproducible; use these numbers):"
+SIMULATION_TASK = """Take every price range, level and probability from the simulation above; do not compute your own.
+                    Your job is to explain in a few sentences what would push the price toward either end of those ranges.
+                    """
+
 class CryptoAnalysisSystem:
-    def __init__(self):
-        """Initialize the complete crypto analysis system"""
-        self.data_agent = DataAgent()
-        self.sentiment_agent = SentimentAgent()
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.context = {}
+    def __init__(self, context=None, data_agent=None, sentiment_agent=None, client=None, backtest_store=None,
+                 stage_cache=None):
+        """Initialize the complete crypto analysis system
+        
+        Args:
+            context: Optional dict-like store for follow-up context (e.g. a shared cache namespace)
+            data_agent: Optional shared DataAgent
+            sentiment_agent: Optional shared SentimentAgent
+            client: Optional shared OpenAI client
+            backtest_store: Optional store that records predictions/strategies for later scoring
+            stage_cache: Optional dict-like store of per-stage outputs and the input fingerprints they were built from
+        """
+        self.client = client or OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.data_agent = data_agent or DataAgent(client=self.client)
+        self.sentiment_agent = sentiment_agent or SentimentAgent(openai_client=self.client)
+        self.backtest_store = backtest_store
+        self.context = context if context is not None else {}
+        self.stage_cache = stage_cache if stage_cache is not None else {}
+        
+        # Concurrent runs of the same stage (e.g. a prefetch and a real request) share one task
+        self._stage_flights = FlightGroup()
+    
+    async def _market_stage(self, symbol: str):
+        """Market analysis, reused unless the bars moved materially since it was generated
+        
+        Returns:
+            (analysis text, whether it was regenerated)
+        """
+        return await self._stage_flights.run(f"{symbol}:market", lambda: self._compute_market_stage(symbol))
+    
+    async def _compute_market_stage(self, symbol: str):
+        market_data, start_date, end_date = await asyncio.to_thread(self.data_agent.get_market_data, symbol)
+        fingerprint = market_fingerprint(market_data)
+        
+        key = f"{symbol}:market"
+        cached = self.stage_cache.get(key)
+        if cached and not market_changed(cached["fingerprint"], fingerprint):
+            return cached["output"], False
+        
+        output = await self.data_agent.analyze_market_data(symbol, market_data, start_date, end_date)
+        self.stage_cache[key] = {"fingerprint": fingerprint, "output": output}
+        return output, True
+    
+    async def _sentiment_stage(self, symbol: str):
+        """Sentiment analysis, reused unless enough new articles/tweets/context arrived since it was generated
+        
+        Returns:
+            (sentiment result dictionary, whether it was regenerated)
+        """
+        return await self._stage_flights.run(f"{symbol}:sentiment", lambda: self._compute_sentiment_stage(symbol))
+    
+    async def _compute_sentiment_stage(self, symbol: str):
+        inputs = await self.sentiment_agent.collect_sentiment_inputs(symbol)
+        fingerprint = ids_fingerprint(**self.sentiment_agent.input_ids(inputs))
+        
+        key = f"{symbol}:sentiment"
+        cached = self.stage_cache.get(key)
+        if cached and not ids_changed(cached["fingerprint"], fingerprint):
+            return cached["output"], False
+        
+        output = await self.sentiment_agent.analyze_collected(symbol, inputs)
+        self.stage_cache[key] = {"fingerprint": fingerprint, "output": output}
+        return output, True
+    
+    async def prefetch(self, symbol: str):
+        """Warm the market and sentiment stages (bars, news, tweets, sentiment snapshot) ahead of a likely request
+        
+        Returns:
+            Names of the stages that had to be regenerated
+        """
+        (_, market_refreshed), (_, sentiment_refreshed) = await asyncio.gather(
+            self._market_stage(symbol),
+            self._sentiment_stage(symbol)
+        )
+        return [stage for stage, refreshed in (("market", market_refreshed), ("sentiment", sentiment_refreshed)) if refreshed]
     
     async def get_complete_analysis(self, symbol: str):
-        """Get complete analysis combining market data and sentiment"""
-        # Get technical analysis from data agent
-        print(f"Analyzing market data for {symbol}...")
-        market_analysis = await self.data_agent.analyze_crypto(symbol)
-        
-        # Get sentiment analysis from sentiment agent
-        print(f"Analyzing market sentiment for {symbol}...")
-        sentiment_result = await self.sentiment_agent.analyze_sentiment(symbol)
+        """Get complete analysis combining market data and sentiment
+        
+        Each stage's output is reused while its inputs are unchanged, so a refresh of a
+        quiet symbol usually costs zero or one LLM call instead of three.
+        """
+        # Get technical and sentiment analysis concurrently; cancelling this call cancels both
+        print(f"Analyzing market data and sentiment for {symbol}...")
+        (market_analysis, market_refreshed), (sentiment_result, sentiment_refreshed) = await asyncio.gather(
+            self._market_stage(symbol),
+            self._sentiment_stage(symbol)
+        )
         sentiment_analysis = sentiment_result["text"]
+        refreshed_stages = [
+            stage for stage, refreshed in (("market", market_refreshed), ("sentiment", sentiment_refreshed)) if refreshed
+        ]
         
         # Store context for follow-up questions
         self.context[symbol] = {
@@ -39,9 +125,18 @@ class CryptoAnalysisSystem:
             "sources": sentiment_result["sources"]
         }
         
-        # Combine both analyses
-        print("Generating insights...")
-        combined_analysis = await self.combine_analyses(symbol, market_analysis, sentiment_analysis)
+        # Combine both analyses, unless neither input changed
+        key = f"{symbol}:combined"
+        fingerprint = text_fingerprint(market_analysis, sentiment_analysis)
+        cached = self.stage_cache.get(key)
+        if cached and cached["fingerprint"] == fingerprint:
+            combined_analysis = cached["output"]
+        else:
+            print("Generating insights...")
+            combined_analysis = await self.combine_analyses(symbol, market_analysis, sentiment_analysis)
+            self.stage_cache[key] = {"fingerprint": fingerprint, "output": combined_analysis}
+            refreshed_stages.append("combined")
+        print(f"Refreshed stages for {symbol}: {', '.join(refreshed_stages) or 'none'}")
         
         # Return combined analysis with metadata
         return {
@@ -50,7 +145,8 @@ class CryptoAnalysisSystem:
             "sentiment_analysis": sentiment_analysis,
             "sentiment_score": sentiment_result["sentiment_score"],
             "sources": sentiment_result["sources"],
-            "sources_count": sentiment_result["sources_count"]
+            "sources_count": sentiment_result["sources_count"],
+            "refreshed_stages": refreshed_stages
         }
     
     async def handle_followup(self, symbol: str, question: str):
@@ -75,20 +171,12 @@ class CryptoAnalysisSystem:
         if is_timing_question:
             model_to_use = "gpt-4"  # Use GPT-4 for timing questions since it supports the prompt format we're using
         
-        prompt_content = f"""You are Cryptosys. You've previously analyzed {symbol} with this information:
-        
-        MARKET ANALYSIS:
-        {context['market']}
-        
-        SENTIMENT ANALYSIS:
-        {context['sentiment']}
-        
-        The user is asking: "{question}"
+        instructions = f"""The user is asking: "{question}"
         
         Answer their question directly and specifically. """
         
         if is_timing_question:
-            prompt_content += """Provide EXACT recommendations with:
+            instructions += """Provide EXACT recommendations with:
             1. Specific timeframes (e.g., "May 10-15" or "next Tuesday-Friday")
             2. Specific price targets or ranges when appropriate
             3. Clear action steps
@@ -96,15 +184,35 @@ class CryptoAnalysisSystem:
             Be direct and concise - get straight to the point with what they should do and when.
             """
         else:
-            prompt_content += """Be concise and directly answer their specific question.
+            instructions += """Be concise and directly answer their specific question.
             Only provide relevant information that directly answers their question.
             
             If they want detailed analysis, provide it - otherwise, be brief and to the point.
             """
         
-        prompt_content += "\nInclude a brief disclaimer at the end that this is for informational purposes only."
+        instructions += "\nInclude a brief disclaimer at the end that this is for informational purposes only."
+        
+        # Earlier coverage relevant to this question (cached per question, bounded by the retrieval budget)
+        history = await self.sentiment_agent.retrieve_context(symbol, question)
+        
+        # Both analyses are summarized (sentiment first) rather than growing the prompt without bound;
+        # historical context is the first thing cut
+        prompt = PromptBuilder(model_to_use)
+        prompt.add("intro", f"You are Cryptosys. You've previously analyzed {symbol} with this information:", required=True)
+        prompt.add("market_analysis", context['market'], heading="MARKET ANALYSIS:", priority=2, mode="summarize", min_tokens=100)
+        prompt.add("sentiment_analysis", context['sentiment'], heading="SENTIMENT ANALYSIS:", priority=1, mode="summarize", min_tokens=100)
+        prompt.add(
+            "historical_context",
+            "\n".join(f"• [{document['date']}] {' '.join(document['text'].split())}" for document in history),
+            heading="RELATED EARLIER COVERAGE:",
+            priority=0,
+            min_tokens=60
+        )
+        prompt.add("question", instructions, required=True)
+        prompt_content = prompt.build()
         
-        completion = self.client.chat.completions.create(
+        completion = await asyncio.to_thread(
+            self.client.chat.completions.create,
             model=model_to_use,
             messages=[
                 {
@@ -118,12 +226,14 @@ class CryptoAnalysisSystem:
             "response": completion.choices[0].message.content,
             "sentiment_score": context.get("sentiment_score", 50),
             "sources": context.get("sources", []),
-            "sources_count": len(context.get("sources", []))
+            "sources_count": len(context.get("sources", [])),
+            "prompt_report": prompt.report
         }
     
     async def combine_analyses(self, symbol: str, market_analysis: str, sentiment_analysis: str):
         """Combine market and sentiment analyses into a conversational response"""
-        completion = self.client.chat.completions.create(
+        completion = await asyncio.to_thread(
+            self.client.chat.completions.create,
             model="gpt-4",  # Use GPT-4 for analysis synthesis
             messages=[
                 {
@@ -162,13 +272,6 @@ class CryptoAnalysisSystem:
         Returns:
             Prediction information as a dictionary
         """
-        # Get market data from data agent
-        market_data, start_date, end_date = self.data_agent.get_market_data(symbol)
-        
-        # Get sentiment data with structured result
-        sentiment_result = await self.sentiment_agent.analyze_sentiment(symbol)
-        sentiment_analysis = sentiment_result["text"]
-        
         # Map timeframe to days for prediction
         timeframe_days = {
             'week': 7,
@@ -176,30 +279,30 @@ class CryptoAnalysisSystem:
             '3months': 90
         }
         days = timeframe_days.get(timeframe, 30)  # Default to 30 days
+        
+        # Get market data, structured sentiment and the price simulation concurrently
+        (market_data, start_date, end_date), (sentiment_result, _), simulation = await asyncio.gather(
+            asyncio.to_thread(self.data_agent.get_market_data, symbol),
+            self._sentiment_stage(symbol),
+            self._simulation_for_prompt(symbol, days)
+        )
+        sentiment_analysis = sentiment_result["text"]
+        
         target_date = datetime.now() + timedelta(days=days)
         
         # Current date formatted for the prompt
         current_date_str = datetime.now().strftime('%B %d, %Y')
         target_date_str = target_date.strftime('%B %d, %Y')
         
-        # Generate prediction using GPT-4
-        completion = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""You are a crypto market expert for Cryptosys. Today's date is {current_date_str}. When referring to dates, always use human-readable format like 'May 5' or 'next Monday', never use timestamps.
-                    
-                    Based on this market data:
-                    
-                    {market_data}
-                    
-                    And this sentiment analysis:
-                    
-                    {sentiment_analysis}
-                    
-                    Provide a specific price prediction for {symbol} by {target_date_str} ({days} days).
-                    
+        # Most recent bars are kept over older ones; sentiment is summarized before either is cut
+        prompt = PromptBuilder("gpt-4")
+        prompt.add("intro", f"You are a crypto market expert for Cryptosys. Today's date is {current_date_str}. When referring to dates, always use human-readable format like 'May 5' or 'next Monday', never use timestamps.", required=True)
+        prompt.add("market_data", format_bars(market_data), heading="Based on this market data:", priority=3, mode="tail")
+        prompt.add("sentiment_analysis", sentiment_analysis, heading="And this sentiment analysis:", priority=2, mode="summarize", min_tokens=100)
+        if simulation:
+            prompt.add("simulation", format_simulation(simulation), heading=SIMULATION_HEADING, priority=4)
+        prompt.add("task", f"""Provide a specific price prediction for {symbol} by {target_date_str} ({days} days).
+                    {SIMULATION_TASK if simulation else ""}
                     Your response should include:
                     1. Exact price range prediction (low-high)
                     2. Most likely price point with date ranges for when it might be reached
@@ -207,16 +310,30 @@ class CryptoAnalysisSystem:
                     4. Clear recommendation (buy, sell, or hold) with exact timing suggestions
                     
                     Be specific, direct, and concise. Provide exact numbers and dates. Include a brief disclaimer at the end.
-                    """
+                    """, required=True)
+        
+        # Generate prediction using GPT-4
+        completion = await asyncio.to_thread(
+            self.client.chat.completions.create,
+            model="gpt-4",
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt.build()
                 }
             ]
         )
         
+        prediction = completion.choices[0].message.content
+        self._record_for_backtest(symbol, prediction, "prediction", timeframe, days, market_data)
+        
         return {
-            "prediction": completion.choices[0].message.content,
+            "prediction": prediction,
+            "simulation": simulation,
             "sentiment_score": sentiment_result["sentiment_score"],
             "sources": sentiment_result["sources"],
-            "sources_count": sentiment_result["sources_count"]
+            "sources_count": sentiment_result["sources_count"],
+            "prompt_report": prompt.report
         }
     
     async def optimal_trading_strategy(self, symbol: str, goal: str):
@@ -230,13 +347,6 @@ class CryptoAnalysisSystem:
         Returns:
             Strategy analysis as a dictionary
         """
-        # Get market data from data agent
-        market_data, start_date, end_date = self.data_agent.get_market_data(symbol)
-        
-        # Get sentiment data with structured result
-        sentiment_result = await self.sentiment_agent.analyze_sentiment(symbol)
-        sentiment_analysis = sentiment_result["text"]
-        
         # Extract the timeframe from the question
         timeframe_matches = re.search(r'(\d+)\s*(day|week|month|year)s?', goal.lower())
         days = 30  # Default to one month
@@ -253,6 +363,14 @@ class CryptoAnalysisSystem:
             elif unit == "year":
                 days = amount * 365
         
+        # Get market data, structured sentiment and the price simulation concurrently
+        (market_data, start_date, end_date), (sentiment_result, _), simulation = await asyncio.gather(
+            asyncio.to_thread(self.data_agent.get_market_data, symbol),
+            self._sentiment_stage(symbol),
+            self._simulation_for_prompt(symbol, days)
+        )
+        sentiment_analysis = sentiment_result["text"]
+        
         # Extract action from the question
         action = "hold"  # Default to hold recommendation
         if "sell" in goal.lower():
@@ -264,13 +382,8 @@ class CryptoAnalysisSystem:
         current_date = datetime.now()
         current_date_str = current_date.strftime('%B %d, %Y')
         
-        # Generate a response using GPT-4
-        completion = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""You are a critical, intelligent crypto analyst. The current date is {current_date_str}.
+        prompt = PromptBuilder("gpt-4")
+        prompt.add("intro", f"""You are a critical, intelligent crypto analyst. The current date is {current_date_str}.
                     When analyzing investment strategies, consider ALL options:
                     1. Buying more if that's the best strategy
                     2. Selling if that's the best strategy
@@ -280,19 +393,15 @@ class CryptoAnalysisSystem:
                     Always match your response to the FULL timeframe the user mentioned.
                     Be willing to challenge the user's assumptions if they're asking about an action that isn't optimal.
                     
-                    When referring to dates, always use human-readable format like 'May 5' or 'next Monday', never use timestamps.
-                    
-                    Based on this market data:
-                    
-                    {market_data}
-                    
-                    And this sentiment analysis:
-                    
-                    {sentiment_analysis}
-                    
-                    The user asked: "{goal}"
+                    When referring to dates, always use human-readable format like 'May 5' or 'next Monday', never use timestamps.""", required=True)
+        prompt.add("market_data", format_bars(market_data), heading="Based on this market data:", priority=3, mode="tail")
+        prompt.add("sentiment_analysis", sentiment_analysis, heading="And this sentiment analysis:", priority=2, mode="summarize", min_tokens=100)
+        if simulation:
+            prompt.add("simulation", format_simulation(simulation), heading=SIMULATION_HEADING, priority=4)
+        prompt.add("task", f"""The user asked: "{goal}"
                     
                     Provide a comprehensive, intelligent strategy for {symbol} over the FULL {days}-day period mentioned.
+                    {SIMULATION_TASK if simulation else ""}
                     
                     Think critically about whether the action the user asked about (buying, selling, timing) is actually the BEST approach given the data. If a different approach would be better, explain why.
                     
@@ -301,21 +410,160 @@ class CryptoAnalysisSystem:
                     2. Specific timing recommendations across the FULL timeframe with exact dates
                     3. Price targets and signals to watch for
                     4. Clear explanation of WHY you're making these recommendations
-                    5. Different scenarios and how the user should respond to each
+                    5. Different scenarios and how the user should respond to each{" (use the simulated 5th/median/95th percentile paths as the bear/base/bull cases)" if simulation else ""}
                     
                     Use the first paragraph to directly answer whether they should take the action they asked about, or if a different approach would be better for maximum returns.
-                    """
+                    """, required=True)
+        
+        # Generate a response using GPT-4
+        completion = await asyncio.to_thread(
+            self.client.chat.completions.create,
+            model="gpt-4",
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt.build()
                 }
             ]
         )
         
+        strategy = completion.choices[0].message.content
+        self._record_for_backtest(symbol, strategy, "strategy", f"{days}d", days, market_data)
+        
         return {
-            "strategy": completion.choices[0].message.content,
+            "strategy": strategy,
+            "simulation": simulation,
             "sentiment_score": sentiment_result["sentiment_score"],
             "sources": sentiment_result["sources"],
-            "sources_count": sentiment_result["sources_count"]
+            "sources_count": sentiment_result["sources_count"],
+            "prompt_report": prompt.report
         }
     
+    async def synthesize_comparison(self, summary: dict):
+        """Turn a numeric multi-symbol comparison into a short plain-language takeaway"""
+        completion = await asyncio.to_thread(
+            self.client.chat.completions.create,
+            model="gpt-4",
+            max_tokens=200,
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"""You are Cryptosys, a concise crypto analyst. Compare these assets using ONLY the statistics below (daily data, returns are fractions, not percentages).
+                    
+                    {json.dumps(summary)}
+                    
+                    In under 100 words: which is stronger relative to {summary.get("benchmark")}, how tightly they move together, and which carries more risk (volatility, beta, drawdown). Do not invent numbers.
+                    """
+                }
+            ]
+        )
+        
+        return completion.choices[0].message.content
+    
+    async def compare_assets(self, symbols, benchmark: str = "BTC", window: int = 30, lookback_days: int = 365,
+                             backfill: bool = True, synthesize: bool = False):
+        """
+        Compare several cryptocurrencies from stored daily bars
+        
+        Args:
+            symbols: Symbols to compare
+            benchmark: Symbol used for beta and relative strength
+            window: Rolling window in days
+            lookback_days: How much history to use
+            backfill: Fetch daily history for symbols with too few stored bars
+            synthesize: Add one short LLM-written takeaway
+            
+        Returns:
+            Numeric summary from compare_symbols (with "error" if data is missing)
+        """
+        from services.analytics import compare_symbols
+        bar_store = self.data_agent.bar_store
+        
+        # Only symbols without enough local history cost a REST call, once
+        if backfill:
+            for symbol in dict.fromkeys(list(symbols) + [benchmark.upper()]):
+                timestamps, _ = bar_store.close_series(symbol, "day")
+                if len(timestamps) < window + 1:
+                    await asyncio.to_thread(self.data_agent.backfill_bars, symbol, max(lookback_days, window + 1))
+        
+        summary = await asyncio.to_thread(
+            compare_symbols,
+            bar_store,
+            symbols,
+            benchmark=benchmark,
+            window=window,
+            lookback_days=lookback_days
+        )
+        
+        if synthesize and "error" not in summary:
+            compact = {key: summary[key] for key in ("benchmark", "window_days", "recent_correlation_matrix", "relative_strength_ranking")}
+            compact["metrics"] = [
+                {key: value for key, value in item.items() if key != "rolling_correlation"}
+                for item in summary["metrics"]
+            ]
+            summary["synthesis"] = await self.synthesize_comparison(compact)
+        
+        return summary
+    
+    async def simulate(self, symbol: str, days: int, method: str = None, paths: int = None):
+        """
+        Monte Carlo price bands for symbol over days, from stored daily bars
+        
+        Args:
+            symbol: Cryptocurrency symbol
+            days: Horizon in days
+            method: 'bootstrap' or 'gbm' (default SIMULATION_METHOD)
+            paths: Number of paths (default SIMULATION_PATHS)
+            
+        Returns:
+            Summary from simulate_prices (with "error" if there is not enough history)
+        """
+        from services.simulation import simulate_prices, SIM_PATHS, SIM_LOOKBACK_DAYS, SIM_MIN_HISTORY
+        bar_store = self.data_agent.bar_store
+        
+        timestamps, closes = await asyncio.to_thread(bar_store.close_series, symbol, "day")
+        # Only symbols without enough local history cost a REST call, once
+        if len(timestamps) < SIM_MIN_HISTORY + 1:
+            await asyncio.to_thread(self.data_agent.backfill_bars, symbol, SIM_LOOKBACK_DAYS)
+            timestamps, closes = await asyncio.to_thread(bar_store.close_series, symbol, "day")
+        
+        return await asyncio.to_thread(
+            simulate_prices, timestamps, closes, days, symbol=symbol,
+            method=method or os.getenv('SIMULATION_METHOD', 'bootstrap'),
+            paths=paths or SIM_PATHS
+        )
+    
+    async def _simulation_for_prompt(self, symbol: str, days: int):
+        """Simulation to ground a prediction/strategy prompt, or None; never fails the request"""
+        if not self.data_agent.bar_store:
+            return None
+        try:
+            simulation = await self.simulate(symbol, days)
+        except Exception as e:
+            print(f"Error simulating {symbol}: {e}")
+            return None
+        if "error" in simulation:
+            print(simulation["error"])
+            return None
+        return simulation
+    
+    def _record_for_backtest(self, symbol: str, text: str, kind: str, timeframe: str, days: int, market_data):
+        """Store a prediction/strategy so it can be scored once its horizon has passed"""
+        if not self.backtest_store:
+            return
+        try:
+            self.backtest_store.record_prediction(
+                symbol,
+                text,
+                kind=kind,
+                model="gpt-4",
+                timeframe=timeframe,
+                horizon_days=days,
+                entry_price=latest_close(market_data)
+            )
+        except Exception as e:
+            print(f"Error recording {kind} for backtesting: {e}")
+    
     async def analyze_policy_impact(self, symbol: str, policy_description: str):
         """
         Analyze how a policy or regulation might impact a cryptocurrency
@@ -327,32 +575,21 @@ class CryptoAnalysisSystem:
         Returns:
             Impact analysis as a dictionary
         """
-        # Get current market data
-        market_data, start_date, end_date = self.data_agent.get_market_data(symbol)
-        
-        # Get sentiment data with structured result
-        sentiment_result = await self.sentiment_agent.analyze_sentiment(symbol)
+        # Get current market data and structured sentiment concurrently
+        (market_data, start_date, end_date), (sentiment_result, _) = await asyncio.gather(
+            asyncio.to_thread(self.data_agent.get_market_data, symbol),
+            self._sentiment_stage(symbol)
+        )
         
         # Get current date for reference
         current_date_str = datetime.now().strftime('%B %d, %Y')
         
-        # Generate analysis using GPT-4
-        completion = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""You are Cryptosys, a crypto regulatory analysis expert. Today's date is {current_date_str}. When referring to dates, always use human-readable format like 'May 5' or 'next Monday', never use timestamps.
-                    
-                    Analyze how this policy might impact {symbol}:
-                    
-                    POLICY DESCRIPTION:
-                    {policy_description}
-                    
-                    MARKET DATA:
-                    {market_data}
-                    
-                    Provide a specific impact analysis with:
+        # The policy text is the user's question and is never cut; the most recent bars are kept over older ones
+        prompt = PromptBuilder("gpt-4")
+        prompt.add("intro", f"You are Cryptosys, a crypto regulatory analysis expert. Today's date is {current_date_str}. When referring to dates, always use human-readable format like 'May 5' or 'next Monday', never use timestamps.", required=True)
+        prompt.add("policy", policy_description, heading=f"Analyze how this policy might impact {symbol}:\n\nPOLICY DESCRIPTION:", required=True)
+        prompt.add("market_data", format_bars(market_data), heading="MARKET DATA:", priority=3, mode="tail")
+        prompt.add("task", """Provide a specific impact analysis with:
                     1. Immediate impact (next 7 days)
                     2. Medium-term impact (1-3 months)
                     3. Long-term impact (beyond 3 months)
@@ -361,7 +598,16 @@ class CryptoAnalysisSystem:
                     6. Specific recommendations for investors
                     
                     Be direct, specific, and concise. Include a brief disclaimer at the end.
-                    """
+                    """, required=True)
+        
+        # Generate analysis using GPT-4
+        completion = await asyncio.to_thread(
+            self.client.chat.completions.create,
+            model="gpt-4",
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt.build()
                 }
             ]
         )
@@ -370,11 +616,13 @@ class CryptoAnalysisSystem:
             "impact_analysis": completion.choices[0].message.content,
             "sentiment_score": sentiment_result["sentiment_score"],
             "sources": sentiment_result["sources"],
-            "sources_count": sentiment_result["sources_count"]
+            "sources_count": sentiment_result["sources_count"],
+            "prompt_report": prompt.report
         }
 
 async def chat():
     system = CryptoAnalysisSystem()
+    router = create_router()
     current_symbol = None
     
     print("\nWelcome to Cryptosys! I can analyze cryptocurrencies and provide insights.")
@@ -395,7 +643,8 @@ async def chat():
             continue
             
         if not current_symbol:
-            current_symbol = user_input.upper()
+            # Accept names and aliases ("ethereum", "sats") as well as tickers
+            current_symbol = router.route(user_input)["symbol"] or user_input.strip().upper()
             print(f"\nAnalyzing {current_symbol}. This will take a moment...")
             
             try:
@@ -407,14 +656,11 @@ async def chat():
                 print(f"\nI couldn't analyze {current_symbol}. Error: {e}")
                 current_symbol = None
         else:
-            # Check for prediction or strategy requests
-            if "predict" in user_input.lower() or "forecast" in user_input.lower():
-                timeframe = "month"  # Default
-                
-                if "week" in user_input.lower():
-                    timeframe = "week"
-                elif "3 month" in user_input.lower() or "three month" in user_input.lower():
-                    timeframe = "3months"
+            # Check for prediction, strategy or policy requests
+            route = router.route(user_input, current_symbol)
+            
+            if route["intent"] == "predict":
+                timeframe = route["timeframe"]
                 
                 try:
                     print(f"\nGenerating price analysis for {current_symbol} over {timeframe}...")
@@ -425,7 +671,7 @@ async def chat():
                 except Exception as e:
                     print(f"\nI couldn't generate a price analysis. Error: {e}")
             
-            elif any(phrase in user_input.lower() for phrase in ["when should i", "strategy", "timing", "best time", "maximize"]):
+            elif route["intent"] == "strategy":
                 try:
                     print(f"\nDeveloping investment strategy...")
                     result = await system.optimal_trading_strategy(current_symbol, user_input)
@@ -435,7 +681,7 @@ async def chat():
                 except Exception as e:
                     print(f"\nI couldn't generate an investment strategy. Error: {e}")
             
-            elif any(phrase in user_input.lower() for phrase in ["policy", "regulation", "impact", "affect"]):
+            elif route["intent"] == "policy":
                 try:
                     print(f"\nAnalyzing potential impact...")
                     result = await system.analyze_policy_impact(current_symbol, user_input)
@@ -2,14 +2,18 @@
 
 from openai import OpenAI
 import requests
-import tweepy  # Added for Twitter API
 from dotenv import load_dotenv
 import os
 import re
-from datetime import datetime, timedelta
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
 import warnings
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
+import hashlib
+from services.dedup import collapse_near_duplicates
+from services.ingestion import article_documents, chunk_documents, write_chunks
+from services.prompt_builder import trim_to_tokens
+from services.storage import data_path
 
 # Suppress LangChain deprecation warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -18,44 +22,89 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 load_dotenv()
 
 class SentimentAgent:
-    def __init__(self):
-        """Initialize the Sentiment Agent with necessary APIs and databases"""
-        # Initialize OpenAI
-        self.openai = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    def __init__(self, openai_client=None, sentiment_store=None, news_collector=None, tweet_collector=None, ingestion=None,
+                 retrieval_cache=None):
+        """Initialize the Sentiment Agent with necessary APIs and databases
+        
+        tweepy, LangChain and Chroma are heavy optional dependencies, so the Twitter
+        client and vector database are only imported and built on first use.
+        """
+        # Initialize OpenAI (the client can be shared by the caller)
+        self.openai = openai_client or OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        
+        # Optional time-series store that keeps every sentiment score we produce
+        self.sentiment_store = sentiment_store
         
         # News API configuration
         self.news_api_key = os.getenv('NEWS_API_KEY')
         
+        # Optional incremental collector; without it every call fetches one fresh page
+        self.news_collector = news_collector
+        
+        # Optional incremental tweet collector; without it every call runs one recent search
+        self.tweet_collector = tweet_collector
+        
+        # Optional background ingestion pipeline; without it new articles are stored inline
+        self.ingestion = ingestion
+        
+        # Historical retrieval: per-(symbol, query) result cache and a strict latency budget
+        self.retrieval_cache = retrieval_cache if retrieval_cache is not None else {}
+        self.retrieval_timeout = float(os.getenv('RETRIEVAL_TIMEOUT', 1.0))
+        
         # Twitter API configuration
         self.twitter_bearer_token = os.getenv('TWITTER_BEARER_TOKEN')
         
-        # Initialize Twitter client
-        self.twitter_client = self._initialize_twitter()
-        
-        # Vector database setup - with graceful degradation
-        self.vector_db = None
+        # Lazily initialized clients - see the twitter_client and vector_db properties
+        self._twitter_client = None
+        self._twitter_initialized = False
+        self._vector_db = None
+        self._vector_db_initialized = False
         self.embeddings = None
-        
-        # Try to initialize vector DB if dependencies are available
-        try:
-            from langchain_community.embeddings import OpenAIEmbeddings
-            from langchain_community.vectorstores import Chroma
-            
-            self.embeddings = OpenAIEmbeddings()
-            self.vector_db = self._initialize_vector_db()
-        except ImportError:
-            print("Vector database dependencies not available. Sentiment analysis will work without historical context.")
+        self._init_lock = threading.Lock()
+    
+    @property
+    def twitter_client(self):
+        """Twitter client, created on first access"""
+        if not self._twitter_initialized:
+            with self._init_lock:
+                if not self._twitter_initialized:
+                    self._twitter_client = self._initialize_twitter()
+                    self._twitter_initialized = True
+        return self._twitter_client
+    
+    @property
+    def vector_db(self):
+        """Vector database, created on first access - with graceful degradation"""
+        if not self._vector_db_initialized:
+            with self._init_lock:
+                if not self._vector_db_initialized:
+                    # Try to initialize vector DB if dependencies are available
+                    try:
+                        from langchain_community.embeddings import OpenAIEmbeddings
+                        
+                        self.embeddings = OpenAIEmbeddings()
+                        self._vector_db = self._initialize_vector_db()
+                    except ImportError:
+                        print("Vector database dependencies not available. Sentiment analysis will work without historical context.")
+                    except Exception as e:
+                        print(f"Error initializing embeddings: {e}")
+                    self._vector_db_initialized = True
+        return self._vector_db
     
     def _initialize_twitter(self):
         """Initialize Twitter API client"""
         try:
             if self.twitter_bearer_token:
+                import tweepy
                 client = tweepy.Client(bearer_token=self.twitter_bearer_token)
                 print("Twitter client initialized successfully")
                 return client
             else:
                 print("Twitter bearer token not found. Twitter sentiment analysis will be unavailable.")
                 return None
+        except ImportError:
+            print("tweepy not installed. Twitter sentiment analysis will be unavailable.")
+            return None
         except Exception as e:
             print(f"Error initializing Twitter client: {e}")
             return None
@@ -67,9 +116,11 @@ class SentimentAgent:
             import chromadb
             from langchain_community.vectorstores import Chroma
             
+            # Persisted under the data directory so stored history survives restarts
             db = Chroma(
                 collection_name="crypto_sentiment",
-                embedding_function=self.embeddings
+                embedding_function=self.embeddings,
+                persist_directory=os.getenv('CHROMA_PERSIST_DIR') or data_path("chroma")
             )
             print("Vector database initialized successfully")
             return db
@@ -81,7 +132,20 @@ class SentimentAgent:
             return None
 
     async def get_news_data(self, symbol: str, limit: int = 20):
-        """Fetch recent news articles about a cryptocurrency"""
+        """
+        Fetch recent news articles about a cryptocurrency
+        
+        Returns:
+            (articles, new_articles): the newest `limit` articles for the prompt, and every
+            article fetched for the first time by this call (all of them without a local corpus)
+        """
+        if self.news_collector:
+            # Only articles newer than the last one seen are fetched; the rest come from the local corpus
+            new_articles = await self.news_collector.collect(symbol)
+            articles = await asyncio.to_thread(self.news_collector.corpus, symbol, None, limit)
+            print(f"Found {len(articles)} news articles about {symbol}")
+            return articles, new_articles
+        
         # Prepare request parameters
         params = {
             'q': f"{symbol} cryptocurrency",
@@ -95,172 +159,252 @@ class SentimentAgent:
         
         try:
             # Make API request
-            response = requests.get(url, params=params)
+            response = await asyncio.to_thread(requests.get, url, params=params)
             data = response.json()
             
             # Process response
             if data.get('status') == 'ok':
                 articles = data.get('articles', [])
                 print(f"Found {len(articles)} news articles about {symbol}")
-                return articles
+                return articles, articles
             else:
                 print(f"News API error: {data.get('message')}")
-                return []
+                return [], []
         except Exception as e:
             print(f"Error fetching news: {e}")
-            return []
+            return [], []
     
   
 
+    @staticmethod
+    def _format_tweets(tweets):
+        """Shape tweets for the prompt and their source links"""
+        formatted_tweets = []
+        tweet_sources = []
+        
+        for tweet in tweets:
+            metrics = tweet['public_metrics']
+            formatted_tweets.append({
+                'id': str(tweet['id']),
+                'text': tweet['text'],
+                'likes': metrics.get('like_count', 0),
+                'retweets': metrics.get('retweet_count', 0),
+                'created_at': tweet['created_at']
+            })
+            
+            tweet_sources.append({
+                "name": "Twitter (Recent)",
+                "title": f"{tweet['text'][:40]}...",
+                "url": f"https://twitter.com/twitter/status/{tweet['id']}"
+            })
+        
+        return {
+            'tweets': formatted_tweets,
+            'sources': tweet_sources
+        }
+
     async def get_twitter_data(self, symbol: str, limit: int = 10):
         """Fetch tweets about a cryptocurrency from the last 3 days only"""
         if not self.twitter_client:
             print("Twitter client not available")
             return {'tweets': [], 'sources': []}
         
-        try:
-            # Calculate date from 3 days ago in proper format
-            three_days_ago = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if self.tweet_collector:
+            # Only tweets newer than the last one seen are fetched; the prompt gets an
+            # engagement-weighted sample of everything stored for the window
+            await self.tweet_collector.collect(self.twitter_client, symbol)
+            sample = await asyncio.to_thread(self.tweet_collector.sample, symbol, limit)
+            print(f"Sampled {len(sample)} recent tweets about {symbol}")
+            return self._format_tweets([
+                {**tweet, 'created_at': datetime.fromtimestamp(tweet['created_ts'], timezone.utc)}
+                for tweet in sample
+            ])
         
-            # Add time filter to query
-            query = f"#{symbol} -is:retweet since:{three_days_ago}"
+        try:
+            # Recent search takes the window as start_time; "since:" is not a supported operator
+            three_days_ago = (datetime.now(timezone.utc) - timedelta(days=3)).strftime("%Y-%m-%dT%H:%M:%SZ")
             
-            try:
-                response = self.twitter_client.search_recent_tweets(
-                    query=query,
-                    max_results=limit,
-                    tweet_fields=['created_at', 'public_metrics']
-                )
-                
-                if response and response.data:
-                    tweets = response.data
-                    print(f"Found {len(tweets)} recent tweets (last 3 days) about {symbol}")
-                    
-                    # Process tweets as before...
-                    formatted_tweets = []
-                    tweet_sources = []
-                    
-                    for tweet in tweets:
-                        # Get tweet metrics
-                        metrics = tweet.public_metrics if hasattr(tweet, 'public_metrics') else {}
-                        likes = metrics.get('like_count', 0)
-                        retweets = metrics.get('retweet_count', 0)
-                        
-                        formatted_tweets.append({
-                            'text': tweet.text,
-                            'likes': likes,
-                            'retweets': retweets,
-                            'created_at': tweet.created_at
-                        })
-                        
-                        tweet_url = f"https://twitter.com/twitter/status/{tweet.id}"
-                        tweet_sources.append({
-                            "name": "Twitter (Recent)",
-                            "title": f"{tweet.text[:40]}...",
-                            "url": tweet_url
-                        })
-                    
-                    return {
-                        'tweets': formatted_tweets,
-                        'sources': tweet_sources
+            response = await asyncio.to_thread(
+                self.twitter_client.search_recent_tweets,
+                query=f"#{symbol} -is:retweet",
+                start_time=three_days_ago,
+                max_results=max(10, min(100, limit)),
+                tweet_fields=['created_at', 'public_metrics']
+            )
+            
+            if response and response.data:
+                tweets = response.data[:limit]
+                print(f"Found {len(tweets)} recent tweets (last 3 days) about {symbol}")
+                return self._format_tweets([
+                    {
+                        'id': tweet.id,
+                        'text': tweet.text,
+                        'public_metrics': getattr(tweet, 'public_metrics', None) or {},
+                        'created_at': tweet.created_at
                     }
-                else:
-                    print(f"No recent tweets found for {symbol}")
-                    return {'tweets': [], 'sources': []}
-            except Exception as e:
-                print(f"Twitter API error: {e}")
-                return {'tweets': [], 'sources': []}
-                
+                    for tweet in tweets
+                ])
+            
+            print(f"No recent tweets found for {symbol}")
+            return {'tweets': [], 'sources': []}
         except Exception as e:
-            print(f"Error in Twitter processing: {e}")
+            print(f"Twitter API error: {e}")
             return {'tweets': [], 'sources': []}
 
     def store_in_vector_db(self, symbol: str, news_articles):
-        """Store news data in vector database for future reference"""
+        """Store news data in vector database for future reference (inline; the API uses the ingestion pipeline)"""
         # Skip if vector DB initialization failed
         if not self.vector_db or not news_articles:
             return
             
         try:
-            # Import necessary classes only if vector_db is available
-            from langchain.text_splitter import RecursiveCharacterTextSplitter
-            
-            # Format news articles for storage
-            formatted_articles = []
-            for article in news_articles:
-                title = article.get('title', '')
-                desc = article.get('description', '')
-                content = article.get('content', '')
-                formatted_articles.append(f"TITLE: {title}\nDESCRIPTION: {desc}\nCONTENT: {content}")
-            
-            news_content = "\n\n".join(formatted_articles)
-            
-            # Split content into manageable chunks
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
-            )
-            chunks = splitter.split_text(news_content)
+            # Token-sized chunks, embedded and upserted in grouped writes
+            chunks = chunk_documents(article_documents(symbol, news_articles))
             
             if not chunks:
                 print("No content to store after processing")
                 return
-                
-            # Prepare documents with metadata
-            today = datetime.now().strftime("%Y-%m-%d")
-            docs = [
-                {"page_content": chunk, "metadata": {"symbol": symbol, "date": today}}
-                for chunk in chunks
-            ]
             
-            # Store in vector database
-            self.vector_db.add_documents(docs)
+            write_chunks(self.vector_db, chunks)
             print(f"Stored {len(chunks)} document chunks in vector database")
             
         except Exception as e:
             print(f"Error storing data in vector database: {e}")
 
-    def retrieve_historical_context(self, symbol: str):
-        """Retrieve relevant historical data from vector database"""
+    def retrieve_historical_context(self, symbol: str, query: str = None, k: int = 5):
+        """Retrieve relevant historical data from vector database
+        
+        Results are cached per (symbol, query), so repeated questions skip the embedding
+        call and the similarity search.
+        
+        Returns:
+            List of {"id", "text", "title", "date"} documents
+        """
+        query = query or f"{symbol} cryptocurrency market sentiment"
+        key = f"{symbol}:{k}:{' '.join(query.lower().split())}"
+        cached = self.retrieval_cache.get(key)
+        if cached is not None:
+            return cached
+        
         if not self.vector_db:
             return []
             
         try:
-            results = self.vector_db.similarity_search(
-                f"{symbol} cryptocurrency market sentiment",
-                k=5
-            )
+            results = self.vector_db.similarity_search(query, k=k, filter={"symbol": symbol})
+            documents = [
+                {
+                    "id": f"{doc.metadata.get('url')}#{doc.metadata.get('chunk', 0)}" if doc.metadata.get('url')
+                          else hashlib.sha1(doc.page_content.encode()).hexdigest()[:16],
+                    "text": doc.page_content,
+                    "title": doc.metadata.get('title', ''),
+                    "date": doc.metadata.get('date', '')
+                }
+                for doc in results
+            ]
+            self.retrieval_cache[key] = documents
             
-            if results:
-                print(f"Retrieved {len(results)} relevant historical documents")
-                return [doc.page_content for doc in results]
+            if documents:
+                print(f"Retrieved {len(documents)} relevant historical documents")
             else:
                 print("No relevant historical data found")
-                return []
+            return documents
                 
         except Exception as e:
             print(f"Error retrieving historical data: {e}")
             return []
 
+    async def retrieve_context(self, symbol: str, query: str = None, k: int = 5):
+        """Historical context within the RETRIEVAL_TIMEOUT latency budget; empty if it is missed
+        
+        A search that misses the budget keeps running and fills the cache for the next call.
+        """
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(self.retrieve_historical_context, symbol, query, k),
+                self.retrieval_timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"Historical context for {symbol} missed the {self.retrieval_timeout}s retrieval budget")
+            return []
+
+    @staticmethod
+    def _cluster_note(cluster):
+        """Prompt annotation for a cluster of near-duplicates"""
+        if cluster["count"] == 1:
+            return ""
+        return f" [x{cluster['count']} copies, weight {cluster['weight']}]"
+
     async def analyze_sentiment(self, symbol: str):
         """Generate sentiment analysis with metadata for a cryptocurrency"""
-        # Get news articles
-        news = await self.get_news_data(symbol)
-        self.store_in_vector_db(symbol, news)
+        inputs = await self.collect_sentiment_inputs(symbol)
+        return await self.analyze_collected(symbol, inputs)
+
+    async def collect_sentiment_inputs(self, symbol: str):
+        """Fetch and de-duplicate the news and tweets an analysis is based on (no LLM calls)"""
+        # Get news articles, Twitter data and historical context concurrently (all are cancelled if the caller goes away)
+        (news, new_articles), twitter_data, context = await asyncio.gather(
+            self.get_news_data(symbol),
+            self.get_twitter_data(symbol),
+            self.retrieve_context(symbol)
+        )
         
-        # Get Twitter data
-        twitter_data = await self.get_twitter_data(symbol)
+        # Every article collected by this call, not just the ones in the prompt's slice of the
+        # corpus; articles fetched by an earlier call are already in the vector database
+        if self.ingestion:
+            # Chunking, embedding and the vector store write happen in the background
+            self.ingestion.submit(symbol, new_articles)
+        else:
+            await asyncio.to_thread(self.store_in_vector_db, symbol, new_articles)
+        
+        # Collapse syndicated copies and copy-paste tweets into weighted clusters
+        news_clusters = collapse_near_duplicates(
+            news,
+            text_of=lambda article: f"{article.get('title') or ''} {article.get('description') or ''}"
+        )
+        tweet_clusters = collapse_near_duplicates(
+            zip(twitter_data['tweets'], twitter_data['sources']),
+            text_of=lambda pair: pair[0]['text'],
+            rank_of=lambda pair: pair[0].get('likes', 0) + pair[0].get('retweets', 0)
+        )
+        duplicates_collapsed = (len(news) - len(news_clusters)) + (len(twitter_data['tweets']) - len(tweet_clusters))
+        if duplicates_collapsed:
+            print(f"Collapsed {duplicates_collapsed} near-duplicate articles/tweets for {symbol}")
         
-        # Format news and collect sources
+        return {
+            "news": news,
+            "tweets": twitter_data['tweets'],
+            "news_clusters": news_clusters,
+            "tweet_clusters": tweet_clusters,
+            "duplicates_collapsed": duplicates_collapsed,
+            "context": context,
+            "context_ids": [document["id"] for document in context]
+        }
+
+    @staticmethod
+    def input_ids(inputs):
+        """Article URLs and tweet IDs an analysis was built from, for change detection"""
+        return {
+            "articles": [article.get('url') for article in inputs["news"]],
+            "tweets": [tweet.get('id') for tweet in inputs["tweets"]],
+            "context": inputs.get("context_ids", [])
+        }
+
+    async def analyze_collected(self, symbol: str, inputs):
+        """Generate the sentiment analysis for inputs from collect_sentiment_inputs"""
+        news_clusters = inputs["news_clusters"]
+        tweet_clusters = inputs["tweet_clusters"]
+        
+        # Format news and collect sources (one per cluster)
         recent_news = []
         sources = []
         
-        for article in news[:5]:
+        for cluster in news_clusters[:5]:
+            article = cluster["representative"]
             title = article.get('title', 'No title')
             source = article.get('source', {}).get('name', 'Unknown source')
             url = article.get('url', '')
             
-            recent_news.append(f"• {title} ({source})")
+            recent_news.append(f"• {title} ({source}){self._cluster_note(cluster)}")
             
             if source and source != "Unknown source":
                 sources.append({
@@ -273,16 +417,29 @@ class SentimentAgent:
         
         # Format Twitter data
         twitter_sentiment = ""
-        if twitter_data['tweets']:
-            tweet_texts = [f"• {tweet['text']}" for tweet in twitter_data['tweets']]
+        if tweet_clusters:
+            tweet_texts = [
+                f"• {cluster['representative'][0]['text']}{self._cluster_note(cluster)}"
+                for cluster in tweet_clusters
+            ]
             twitter_sentiment = "\n".join(tweet_texts)
             
             # Add Twitter sources
-            sources.extend(twitter_data['sources'])
+            sources.extend(cluster["representative"][1] for cluster in tweet_clusters)
+        
+        # Earlier coverage from the vector store, as a baseline to compare today's tone against
+        historical_context = ""
+        if inputs.get("context"):
+            historical_context = "\n    HISTORICAL CONTEXT (earlier coverage, for comparison only):\n" + "\n".join(
+                f"    • [{document['date']}] {trim_to_tokens(' '.join(document['text'].split()), 120)}"
+                for document in inputs["context"]
+            ) + "\n"
         
         # Generate analysis
-        completion = self.openai.chat.completions.create(
-            model="gpt-4",
+        model = "gpt-4"
+        completion = await asyncio.to_thread(
+            self.openai.chat.completions.create,
+            model=model,
             messages=[
                 {
                     "role": "system",
@@ -297,6 +454,9 @@ class SentimentAgent:
     
     TWITTER SENTIMENT:
     {twitter_sentiment}
+    {historical_context}
+    Items marked [xN copies, weight W] appeared N times in near-identical form. Count each such item with
+    weight W, not N: mass-copied posts are often coordinated promotion and must not skew the score.
 
     Provide:
     1. Overall sentiment (bullish/bearish/neutral)
@@ -333,11 +493,25 @@ class SentimentAgent:
             except ValueError:
                 pass
         
+        # Keep the score so trends can be read back later without new LLM calls
+        if self.sentiment_store:
+            try:
+                self.sentiment_store.append(
+                    symbol,
+                    sentiment_score,
+                    news_count=len(news_clusters),
+                    tweet_count=len(tweet_clusters),
+                    model=model
+                )
+            except Exception as e:
+                print(f"Error storing sentiment score: {e}")
+        
         return {
             "text": analysis_text,
             "sentiment_score": sentiment_score,
             "sources": sources,
-            "sources_count": len(sources)
+            "sources_count": len(sources),
+            "duplicates_collapsed": inputs["duplicates_collapsed"]
         }
 
 # Test function
@@ -0,0 +1,48 @@
+# test_alerts.py
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.alerts import AlertEngine
+
+
+def test_every_stream_is_woken_by_a_local_alert():
+    async def scenario(directory):
+        engine = AlertEngine(os.path.join(directory, "alerts.db"))
+        engine.bind_loop(asyncio.get_running_loop())
+        engine.add_rule("client", "BTC", "sentiment_above", 70)
+
+        # Long polls: only the wake-up can deliver the alert in time
+        streams = [engine.stream("client", poll_interval=30) for _ in range(3)]
+        pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+        await asyncio.sleep(0.1)
+        assert len(engine._subscribers) == 3
+
+        engine.on_sentiment("BTC", 80, time.time())
+        done, _ = await asyncio.wait(pending, timeout=2)
+        assert len(done) == 3
+        for task in done:
+            event = json.loads(task.result().split("data: ", 1)[1])
+            assert event["symbol"] == "BTC" and event["value"] == 80
+
+        for stream in streams:
+            await stream.aclose()
+        assert not engine._subscribers
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
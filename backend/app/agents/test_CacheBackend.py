@@ -0,0 +1,64 @@
+# test_cache_backend.py
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.cache_backend import MemoryCacheBackend, SQLiteCacheBackend
+
+
+def test_single_flight_computes_once_across_workers():
+    async def scenario(directory):
+        path = os.path.join(directory, "cache.db")
+        # Two backends on one file stand in for two worker processes
+        workers = [SQLiteCacheBackend(path, lock_poll_interval=0.01) for _ in range(2)]
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return {"combined_analysis": "text"}
+
+        results = await asyncio.gather(*(
+            workers[index % 2].single_flight("analysis", "BTC", compute) for index in range(6)
+        ))
+        assert len(calls) == 1
+        assert all(result == {"combined_analysis": "text"} for result in results)
+
+        # Served from the shared cache afterwards, by either worker
+        assert await workers[1].single_flight("analysis", "BTC", compute) == {"combined_analysis": "text"}
+        assert len(calls) == 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+
+
+def test_locks_expire_and_need_their_token():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.db")
+        for owner, other in ((MemoryCacheBackend(), None), (SQLiteCacheBackend(path), SQLiteCacheBackend(path))):
+            other = other or owner
+            token = owner.acquire_lock("flight:analysis:BTC", 0.1)
+            assert token is not None
+            assert other.acquire_lock("flight:analysis:BTC", 0.1) is None
+
+            # Only the holder's token releases it
+            other.release_lock("flight:analysis:BTC", "not-the-token")
+            assert other.acquire_lock("flight:analysis:BTC", 0.1) is None
+
+            # A crashed holder never releases; its lease runs out instead
+            time.sleep(0.15)
+            assert other.acquire_lock("flight:analysis:BTC", 0.1) is not None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
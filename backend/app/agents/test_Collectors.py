@@ -0,0 +1,148 @@
+# test_collectors.py
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.news_collector import NewsCollector, NewsStore
+from services.tweet_collector import TweetCollector, TweetStore
+
+
+def make_tweets(count, likes=0):
+    now = time.time()
+    return [
+        {
+            "id": str(1000 + index),
+            "created_ts": now - 3600,
+            "author_id": None,
+            "text": f"tweet {index}",
+            "public_metrics": {"like_count": likes}
+        }
+        for index in range(count)
+    ]
+
+
+def test_refreshed_tweet_metrics_change_the_sample():
+    with tempfile.TemporaryDirectory() as directory:
+        collector = TweetCollector(TweetStore(os.path.join(directory, "tweets.db")))
+        tweets = make_tweets(20)
+        assert collector.store.save_tweets("BTC", tweets) == 20
+
+        before = [tweet["id"] for tweet in collector.sample("BTC", k=3)]
+        outsider = next(tweet for tweet in tweets if tweet["id"] not in before)
+
+        # Seen again with real engagement: the counts are updated, not ignored
+        outsider["public_metrics"] = {"like_count": 50000, "retweet_count": 20000}
+        assert collector.store.save_tweets("BTC", [outsider]) == 0
+
+        after = [tweet["id"] for tweet in collector.sample("BTC", k=3)]
+        assert outsider["id"] in after and after != before
+
+
+def test_stale_tweet_metrics_are_refetched():
+    class Tweet:
+        def __init__(self, tweet_id, likes):
+            self.id = tweet_id
+            self.public_metrics = {"like_count": likes}
+
+    class Client:
+        requested = None
+
+        def get_tweets(self, ids, tweet_fields):
+            Client.requested = list(ids)
+            return type("Response", (), {"data": [Tweet(tweet_id, 99) for tweet_id in ids]})
+
+    with tempfile.TemporaryDirectory() as directory:
+        collector = TweetCollector(TweetStore(os.path.join(directory, "tweets.db")))
+        collector.store.save_tweets("BTC", make_tweets(3))
+
+        collector.metrics_refresh = 3600
+        assert collector._refresh_metrics(Client(), "BTC") == 0
+
+        collector.metrics_refresh = 0
+        assert collector._refresh_metrics(Client(), "BTC") == 3
+        assert len(Client.requested) == 3
+        assert all(tweet["public_metrics"]["like_count"] == 99 for tweet in collector.store.recent("BTC"))
+
+
+def make_articles(pages, page_size):
+    """Newest first, as NewsAPI sorts by publishedAt"""
+    now = datetime.now(timezone.utc)
+    return [
+        [
+            {
+                "url": f"https://news.example/{page}-{index}",
+                "publishedAt": (now - timedelta(hours=page * page_size + index)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            }
+            for index in range(page_size)
+        ]
+        for page in range(pages)
+    ]
+
+
+def news_collector(directory, pages, failing=()):
+    collector = NewsCollector(api_key="test", store=NewsStore(os.path.join(directory, "news.db")))
+    collector.page_size = 2
+    collector.min_interval = 0
+    total = sum(len(page) for page in pages)
+
+    def fetch_page(symbol, since, page):
+        if page in failing:
+            raise ConnectionError("page failed")
+        return {"status": "ok", "totalResults": total, "articles": list(pages[page - 1])}
+
+    collector._fetch_page = fetch_page
+    return collector
+
+
+def test_news_store_cursor_advancement():
+    with tempfile.TemporaryDirectory() as directory:
+        store = NewsStore(os.path.join(directory, "news.db"))
+        store.claim_fetch("BTC", 0)
+        newer, older = make_articles(2, 2)
+
+        store.save_articles("BTC", older, advance_cursor=False)
+        assert store.cursor("BTC") is None
+        store.save_articles("BTC", older)
+        assert store.cursor("BTC") == older[0]["publishedAt"]
+        store.save_articles("BTC", newer)
+        assert store.cursor("BTC") == newer[0]["publishedAt"]
+
+        # Re-saving older articles never moves the cursor back
+        store.save_articles("BTC", older)
+        assert store.cursor("BTC") == newer[0]["publishedAt"]
+
+
+def test_news_cursor_waits_for_every_page():
+    pages = make_articles(3, 2)
+
+    with tempfile.TemporaryDirectory() as directory:
+        collector = news_collector(directory, pages, failing=(2,))
+        new_articles = asyncio.run(collector.collect("BTC"))
+        assert len(new_articles) == 4
+        assert collector.store.cursor("BTC") is None
+
+    with tempfile.TemporaryDirectory() as directory:
+        collector = news_collector(directory, pages)
+        collector.max_pages = 2
+        asyncio.run(collector.collect("BTC"))
+        assert collector.store.cursor("BTC") is None
+
+        collector.max_pages = 3
+        new_articles = asyncio.run(collector.collect("BTC"))
+        assert len(new_articles) == 2
+        assert collector.store.cursor("BTC") == pages[0][0]["publishedAt"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,72 @@
+# test_fingerprint.py
+import os
+import sys
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.fingerprint import (
+    analysis_version, ids_changed, ids_fingerprint, market_changed, market_fingerprint, text_fingerprint
+)
+
+
+def bars(*closes, start=0):
+    return [
+        {"timestamp": (start + index) * 86400000, "open": close, "high": close, "low": close, "close": close, "volume": 1}
+        for index, close in enumerate(closes)
+    ]
+
+
+def test_market_moves_below_the_threshold_are_not_material():
+    reference = market_fingerprint(bars(100, 200, 50))
+
+    assert not market_changed(reference, market_fingerprint(bars(100, 200, 50)), 0.02)
+    assert not market_changed(reference, market_fingerprint(bars(101.9, 196.1, 50.99)), 0.02)
+    assert market_changed(reference, market_fingerprint(bars(100, 200, 51)), 0.02)
+    assert market_changed(reference, market_fingerprint(bars(98, 200, 50)), 0.02)
+
+
+def test_new_or_dropped_bars_are_material():
+    reference = market_fingerprint(bars(100, 100, 100))
+
+    assert market_changed(reference, market_fingerprint(bars(100, 100, 100, 100)), 0.02)
+    assert market_changed(reference, market_fingerprint(bars(100, 100)), 0.02)
+    assert market_changed(reference, market_fingerprint(bars(100, 100, 100, start=1)), 0.02)
+    assert market_changed(None, market_fingerprint(bars(100)), 0.02)
+
+
+def test_new_id_share_threshold():
+    reference = ids_fingerprint(articles=["a", "b", "c", "d"], tweets=["1", "2"])
+
+    # Order, duplicates and items ageing out of the window don't matter
+    assert not ids_changed(reference, ids_fingerprint(articles=["d", "c", "b", "a", "a"], tweets=["2", "1"]), 0.25)
+    assert not ids_changed(reference, ids_fingerprint(articles=["a", "b"], tweets=[]), 0.25)
+
+    # One new article in five is 20%: below a 25% threshold; one in four is exactly 25%
+    assert not ids_changed(reference, ids_fingerprint(articles=["a", "b", "c", "d", "e"], tweets=["1", "2"]), 0.25)
+    assert ids_changed(reference, ids_fingerprint(articles=["b", "c", "d", "e"], tweets=["1", "2"]), 0.25)
+
+    # Any one group is enough, and a new group is always material
+    assert ids_changed(reference, ids_fingerprint(articles=["a", "b", "c", "d"], tweets=["1", "3"]), 0.25)
+    assert ids_changed(reference, ids_fingerprint(articles=["a"], tweets=["1"], context=["x"]), 0.25)
+    assert ids_changed(None, ids_fingerprint(articles=["a"]), 0.25)
+
+
+def test_text_fingerprints_and_versions():
+    assert text_fingerprint("a", "b") == text_fingerprint("a", "b")
+    assert text_fingerprint("ab", "") != text_fingerprint("a", "b")
+    assert text_fingerprint(None) == text_fingerprint("")
+
+    analysis = {"market_analysis": "m", "sentiment_analysis": "s", "combined_analysis": "c", "sentiment_score": 60}
+    assert analysis_version(analysis) == analysis_version(dict(analysis))
+    assert analysis_version(analysis) != analysis_version({**analysis, "sentiment_score": 61})
+    assert analysis_version({**analysis, "version": "pinned"}) == "pinned"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
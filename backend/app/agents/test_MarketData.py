@@ -0,0 +1,72 @@
+# test_market_data.py
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# Add the parent directory to path to allow importing the agents and services packages
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from agents.data_agent import DataAgent
+from services.market_stream import BarAggregator, ReplayTradeSource
+
+DAY_MS = 86400 * 1000
+
+
+def bar(day, open, high, low, close, volume):
+    return {"timestamp": day * DAY_MS, "open": open, "high": high, "low": low, "close": close, "volume": volume}
+
+
+def test_merge_bars_extends_partial_bars():
+    stored = [bar(1, 100, 110, 95, 105, 1000), bar(2, 105, 120, 100, 115, 2000)]
+    streamed = [bar(2, 112, 125, 111, 118, 50), bar(3, 118, 119, 117, 119, 10)]
+
+    # A bar seen from its start replaces the stored one
+    merged = DataAgent._merge_bars(stored, streamed)
+    assert merged == [stored[0], streamed[0], streamed[1]]
+
+    # One seen from partway through keeps the stored open, widens the range and adds its volume
+    merged = DataAgent._merge_bars(stored, streamed, partial={2 * DAY_MS, 3 * DAY_MS})
+    assert merged[1] == bar(2, 105, 125, 100, 118, 2050)
+    # With nothing stored for the bucket, the partial bar is all there is
+    assert merged[2] == streamed[1]
+    assert [item["timestamp"] for item in merged] == [DAY_MS, 2 * DAY_MS, 3 * DAY_MS]
+
+    assert DataAgent._merge_bars(None, streamed) == streamed
+    assert DataAgent._merge_bars(stored, None) == stored
+
+
+def test_aggregator_marks_bars_joined_mid_bucket():
+    aggregator = BarAggregator(timeframes={'1d': (86400, 10)})
+    aggregator.add_trade("btc", 100, 1, 2 * DAY_MS + 3600 * 1000)
+    aggregator.add_trade("btc", 101, 1, 3 * DAY_MS)
+
+    assert aggregator.partial_timestamps("BTC") == {2 * DAY_MS}
+    assert [item["close"] for item in aggregator.get_bars("BTC")] == [100, 101]
+
+
+def test_replayed_trades_are_fresh():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trades.jsonl")
+        with open(path, "w") as f:
+            # Recorded a long time ago
+            for index in range(3):
+                f.write(json.dumps({"symbol": "BTC", "price": 100 + index, "size": 1, "timestamp": DAY_MS + index}) + "\n")
+
+        aggregator = BarAggregator(timeframes={'1d': (86400, 10)})
+        assert not aggregator.is_fresh("BTC")
+        asyncio.run(ReplayTradeSource(path).run(aggregator.add_trade))
+
+        assert aggregator.last_price("BTC") == (102, DAY_MS + 2)
+        assert aggregator.is_fresh("btc")
+        assert not aggregator.is_fresh("BTC", max_age=-1)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
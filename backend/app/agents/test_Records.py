@@ -0,0 +1,50 @@
+# test_records.py
+import json
+import os
+import sys
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.records import AnalysisRecord, Sources, shared_source
+
+
+def test_sources_are_pooled_but_read_as_they_were_written():
+    sources = [
+        {"name": "Example", "title": "Bitcoin rallies", "url": "https://news.example/1"},
+        {"title": "No name or link"},
+        {"name": None, "title": "Explicit None", "url": "https://news.example/2"}
+    ]
+    first = AnalysisRecord({"symbol": "BTC", "sources": [dict(source) for source in sources]})
+    second = AnalysisRecord({"symbol": "ETH", "sources": [dict(source) for source in sources]})
+
+    # Held once at rest
+    assert isinstance(first.sources, Sources)
+    assert all(a is b for a, b in zip(first.sources, second.sources))
+    assert shared_source(sources[1]) is first.sources[1]
+
+    # Missing fields stay missing, None stays None
+    assert first["sources"] == sources
+    assert "url" not in first["sources"][1] and dict(first.sources[1]) == {"title": "No name or link"}
+    assert json.loads(json.dumps(first.to_dict()))["sources"] == sources
+
+    # Every read is a fresh copy, so modifying one can't reach the pooled record or another symbol
+    first["sources"][0]["title"] = "changed"
+    assert second["sources"][0]["title"] == "Bitcoin rallies"
+    assert first["sources"][0]["title"] == "Bitcoin rallies"
+
+
+def test_record_keys_follow_the_original_dict():
+    record = AnalysisRecord({"symbol": "BTC", "combined_analysis": "x" * 1000, "stale": False})
+    assert set(record) == {"symbol", "combined_analysis", "stale"}
+    assert record["combined_analysis"] == "x" * 1000 and record.get("version") is None
+    assert "version" not in record
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,104 @@
+# test_reports.py
+import asyncio
+import os
+import sys
+import tempfile
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.admission import AdmissionController
+from services.reports import ReportService, ReportStore
+
+
+class Container:
+    """Analyses that take a little while, counted"""
+
+    def __init__(self):
+        self.admission = AdmissionController()
+        self.analyzed = []
+
+    def cached_analysis(self, symbol):
+        return None
+
+    async def ensure_analysis(self, symbol):
+        self.analyzed.append(symbol)
+        await asyncio.sleep(0.05)
+        return {"combined_analysis": f"{symbol} analysis", "market_analysis": "", "sentiment_analysis": ""}
+
+
+def report_service(directory, store=None):
+    service = ReportService(Container(), store or ReportStore(os.path.join(directory, "reports.db")))
+    service.directory = os.path.join(directory, "reports")
+    service.render_workers = 0
+    return service
+
+
+def test_report_runs_through_background_admission():
+    async def scenario(directory):
+        service = report_service(directory)
+        job = service.submit(["BTC", "ETH"], "full", "markdown")
+        await service._tasks[job["id"]]
+
+        job = service.get(job["id"])
+        assert job["status"] == "done" and job["completed"] == 2
+        with open(job["artifact_path"]) as f:
+            assert "BTC analysis" in f.read()
+        assert service.container.admission.counters["background_admitted_total"] == 2
+        assert service.container.admission.running == 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+
+
+def test_cancel_from_another_worker():
+    async def scenario(directory):
+        owner = report_service(directory)
+        owner.analysis_concurrency = 1
+        other = report_service(directory)
+
+        job = owner.submit([f"S{index}" for index in range(10)])
+        await asyncio.sleep(0.12)
+        assert job["id"] not in other._tasks
+        assert other.cancel(job["id"])
+
+        # The owner stops at its next check between symbols
+        await asyncio.gather(owner._tasks.get(job["id"]) or asyncio.sleep(0), return_exceptions=True)
+        job = other.get(job["id"])
+        assert job["status"] == "cancelled"
+        assert len(owner.container.analyzed) < 10
+        assert not other.cancel(job["id"])
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+
+
+def test_orphaned_jobs_are_failed():
+    with tempfile.TemporaryDirectory() as directory:
+        store = ReportStore(os.path.join(directory, "reports.db"))
+
+        silent = store.create(["BTC"], "summary", "markdown")
+        store.execute("UPDATE report_jobs SET heartbeat_at = 0 WHERE id = ?", (silent["id"],))
+        alive = store.create(["BTC"], "summary", "markdown")
+
+        # On startup: no heartbeat for REPORT_STALE_SECONDS
+        service = report_service(directory, store)
+        assert store.get(silent["id"])["status"] == "failed"
+        assert store.get(silent["id"])["error"]
+
+        # On read: the owner process is gone
+        dead_owner = store.create(["BTC"], "summary", "markdown")
+        store.execute("UPDATE report_jobs SET status = 'running', owner_pid = 999999999 WHERE id = ?", (dead_owner["id"],))
+        assert store.get(dead_owner["id"])["status"] == "running"
+        assert service.get(dead_owner["id"])["status"] == "failed"
+
+        assert service.get(alive["id"])["status"] == "queued"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,53 @@
+# test_sentiment_store.py
+import os
+import sys
+import tempfile
+import threading
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.sentiment_store import SentimentStore
+
+
+def test_concurrent_model_registration_gets_distinct_ids():
+    with tempfile.TemporaryDirectory() as directory:
+        # One store per worker, sharing only the directory
+        stores = [SentimentStore(directory) for _ in range(4)]
+        assigned = {}
+
+        def register(worker, store):
+            for index in range(10):
+                model = f"model-{worker}-{index}"
+                assigned[model] = store._model_id(model)
+
+        threads = [threading.Thread(target=register, args=(worker, store)) for worker, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(assigned.values())) == 40
+        names = SentimentStore(directory)._model_names()
+        assert all(names[model_id] == model for model, model_id in assigned.items())
+
+
+def test_history_names_each_records_model():
+    with tempfile.TemporaryDirectory() as directory:
+        store = SentimentStore(directory)
+        store.append("BTC", 40, model="gpt-4", timestamp=1_000)
+        SentimentStore(directory).append("BTC", 80, model="gpt-4o", timestamp=2_000)
+        store.append("BTC", 60, model="gpt-4o", timestamp=3_000)
+
+        history = store.history("BTC", since=0, until=3_000)
+        assert history["points"] == 3 and history["latest_score"] == 60
+        assert history["models"] == {"gpt-4": 1, "gpt-4o": 2}
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
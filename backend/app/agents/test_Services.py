@@ -0,0 +1,296 @@
+# test_services.py
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import time
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.admission import AdmissionController, Overloaded
+from services.backtest import BacktestStore, parse_prediction
+from services.bar_store import BarStore
+from services.conditional import analysis_etag, analysis_response, is_not_modified
+from services.dedup import collapse_near_duplicates, simhash
+from services.prefetch import Prefetcher
+from services.prompt_builder import PromptBuilder, summarize_extract
+from services.router import SymbolRouter
+from services.simulation import simulate_prices
+
+DAY_MS = 86400 * 1000
+
+
+class FakeRequest:
+    """Just enough of a Starlette request for the conditional helpers"""
+
+    def __init__(self, **headers):
+        self.headers = {name.replace("_", "-"): value for name, value in headers.items()}
+
+
+def daily_series(returns, start_price=100.0):
+    """Timestamps and closes for a run of daily log returns"""
+    closes = [start_price]
+    for value in returns:
+        closes.append(closes[-1] * math.exp(value))
+    start = 1_700_000_000_000
+    return [start + day * DAY_MS for day in range(len(closes))], closes
+
+
+def test_simhash_groups_near_duplicates():
+    headlines = [
+        "Bitcoin surges past $70,000 as ETF inflows hit a record high this week",
+        "Ethereum developers schedule the next network upgrade for early spring",
+        "BREAKING: Bitcoin surges past $70,000 as ETF inflows hit a record high this week https://t.co/abc",
+    ]
+    distance = bin(simhash(headlines[0]) ^ simhash(headlines[2])).count("1")
+    assert distance <= 7, distance
+    assert bin(simhash(headlines[0]) ^ simhash(headlines[1])).count("1") > 7
+
+    clusters = collapse_near_duplicates(headlines, text_of=lambda text: text, rank_of=len)
+    assert [cluster["count"] for cluster in clusters] == [2, 1]
+    assert clusters[0]["representative"] == headlines[2]
+    assert clusters[0]["weight"] == 2.0
+    assert clusters[1]["weight"] == 1.0
+
+
+def test_router_symbols_and_intents():
+    router = SymbolRouter()
+
+    route = router.route("What's happening with Ethereum?")
+    assert (route["symbol"], route["intent"]) == ("ETH", "analyze")
+
+    route = router.route("Predict SOL price next week")
+    assert (route["symbol"], route["intent"], route["timeframe"]) == ("SOL", "predict", "week")
+
+    route = router.route("When should I sell my BTC?")
+    assert (route["symbol"], route["intent"]) == ("BTC", "strategy")
+
+    route = router.route("BTC vs ETH which is better?")
+    assert route["symbols"] == ["BTC", "ETH"] and route["intent"] == "compare" and route["synthesize"]
+    assert not router.route("correlation of SOL and ETH")["synthesize"]
+
+    route = router.route("how about the news?", current_symbol="doge")
+    assert route["symbol"] == "DOGE" and route["symbol_from_context"] and route["intent"] == "followup"
+
+
+def test_backtest_parses_and_scores_predictions():
+    text = (
+        "Expected range: $60,000 - $65k over the next week.\n"
+        "Most likely price: $62,500\n\n"
+        "Recommendation: Buy on dips."
+    )
+    assert parse_prediction(text) == {"low": 60000.0, "high": 65000.0, "point": 62500.0, "action": "buy"}
+
+    with tempfile.TemporaryDirectory() as directory:
+        bar_store = BarStore(os.path.join(directory, "bars.db"))
+        store = BacktestStore(bar_store, os.path.join(directory, "backtest.db"))
+        store.fee = 0.001
+
+        created_at = time.time() - 10 * 86400
+        store.record_prediction("btc", text, "prediction", "gpt-4", "week", 7, entry_price=60000, created_at=created_at)
+        target_ms = int((created_at + 7 * 86400) * 1000)
+        bar_store.record_bars("BTC", [
+            {"timestamp": target_ms, "open": 62000, "high": 64000, "low": 61000, "close": 63000, "volume": 1}
+        ])
+
+        overall = store.evaluate()["overall"]
+        assert overall["scored"] == 1
+        assert overall["hit_rate"] == 1.0
+        assert overall["direction_accuracy"] == 1.0
+        assert overall["mean_abs_pct_error"] == round(500 / 63000, 4)
+        assert overall["total_pnl"] == round(3000 / 60000 - 0.001, 4)
+
+
+def test_simulation_probabilities_follow_the_trend():
+    import numpy as np
+
+    noise = np.random.default_rng(7).normal(0, 0.01, 200)
+    up_timestamps, up_closes = daily_series(noise + 0.004)
+    down_timestamps, down_closes = daily_series(noise - 0.004)
+
+    up = simulate_prices(up_timestamps, up_closes, 60, symbol="UP", paths=4000)
+    down = simulate_prices(down_timestamps, down_closes, 60, symbol="DOWN", paths=4000)
+
+    assert up["probability_up"] > 0.9 and down["probability_up"] < 0.1
+    # "-10%" is the chance of ending at least 10% lower, not its complement
+    assert up["probability_final"]["+10%"] > up["probability_final"]["-10%"]
+    assert down["probability_final"]["-10%"] > down["probability_final"]["+10%"]
+    assert down["probability_touch"]["-10%"] >= down["probability_final"]["-10%"]
+    assert down["median_max_drawdown"] < 0
+
+    bands = down["bands"][-1]
+    assert bands["p5"] <= bands["p25"] <= bands["p50"] <= bands["p75"] <= bands["p95"] < down["last_close"] * 1.1
+
+    assert simulate_prices(up_timestamps, up_closes, 60, symbol="UP", paths=4000) == up
+    assert "error" in simulate_prices(up_timestamps[:10], up_closes[:10], 60)
+
+
+def test_simulation_dates_are_utc():
+    # The last bar is stamped at midnight UTC on 2023-11-15, which is still the 14th west of Greenwich
+    timestamps, closes = daily_series([0.001] * 60)
+    timestamps = [timestamp - timestamps[-1] + 1_700_006_400_000 for timestamp in timestamps]
+
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "America/Los_Angeles"
+    time.tzset()
+    try:
+        simulation = simulate_prices(timestamps, closes, 7, paths=100)
+    finally:
+        if previous is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = previous
+        time.tzset()
+
+    assert simulation["as_of"] == "2023-11-15"
+    assert simulation["bands"][0]["date"] == "2023-11-22"
+
+
+def test_admission_sheds_load():
+    async def scenario():
+        controller = AdmissionController()
+        controller.max_concurrent = 1
+        controller.per_client = 1
+        controller.max_queue = 1
+        controller.queue_timeout = 0.05
+
+        started = await controller.acquire("a")
+        assert controller.under_pressure
+
+        # The same client is at its cap
+        try:
+            await controller.acquire("a")
+            assert False, "expected a 429"
+        except Overloaded as e:
+            assert (e.status_code, e.reason) == (429, "client_limit") and e.retry_after >= 1
+
+        # One request may wait; the next finds the queue full
+        waiting = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        try:
+            await controller.acquire("c")
+            assert False, "expected a 503"
+        except Overloaded as e:
+            assert (e.status_code, e.reason) == (503, "queue_full")
+
+        # The waiter gives up once its queue timeout passes
+        try:
+            await waiting
+            assert False, "expected a queue timeout"
+        except Overloaded as e:
+            assert (e.status_code, e.reason) == (503, "queue_timeout")
+
+        # A released slot goes to the next waiter
+        waiting = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        controller.release("a", started)
+        controller.release("b", await waiting)
+
+        metrics = controller.metrics()
+        assert metrics["running"] == 0 and metrics["queued"] == 0
+        assert metrics["rejected_client_limit"] == 1
+        assert metrics["rejected_queue_full"] == 1
+        assert metrics["rejected_queue_timeout"] == 1
+        assert metrics["completed_total"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_prefetch_yields_to_admission():
+    class AnalysisSystem:
+        async def prefetch(self, symbol):
+            return ["market"]
+
+    class Container:
+        def __init__(self):
+            self.admission = AdmissionController()
+            self.admission.max_concurrent = 1
+            self.analysis_cache = {}
+            self.analysis_system = AnalysisSystem()
+
+    async def scenario():
+        container = Container()
+        prefetcher = Prefetcher(container)
+        prefetcher.admission_timeout = 0.05
+
+        # Warm-ups take (and give back) a background slot
+        assert prefetcher.schedule("ETH") == "scheduled"
+        await prefetcher._tasks["ETH"]["task"]
+        assert "ETH" in prefetcher._warmed
+        assert container.admission.counters["background_admitted_total"] == 1
+        assert container.admission.running == 0
+
+        # No new prefetches while interactive requests fill every slot
+        started = await container.admission.acquire("client")
+        assert prefetcher.schedule("SOL") == "busy"
+
+        # One scheduled before the pressure started gives up instead of queueing behind it
+        container.admission.release("client", started)
+        assert prefetcher.schedule("SOL") == "scheduled"
+        started = await container.admission.acquire("client")
+        await prefetcher._tasks["SOL"]["task"]
+        assert "SOL" not in prefetcher._warmed and not container.admission._background
+        container.admission.release("client", started)
+
+    asyncio.run(scenario())
+
+
+def test_prompt_builder_summarizes_then_drops_low_priority_sections():
+    text = (
+        "Sentiment is bullish overall. Many sources agree on it.\n"
+        "Inflows keep rising across every exchange this week.\n\n"
+        "Key drivers:\n"
+        "1. ETF inflows. They hit a record.\n"
+        "- Lower fees"
+    )
+    assert summarize_extract(text, 100) == "Sentiment is bullish overall.\nKey drivers:\n1. ETF inflows.\n- Lower fees"
+    # Only the first line opens a paragraph, even when a later one repeats it (single characters are interned)
+    assert summarize_extract("a\nb\na", 100) == "a"
+
+    prompt = PromptBuilder("gpt-4", budget=60)
+    prompt.add("intro", "Answer briefly.", required=True)
+    prompt.add("context", "filler words " * 200, priority=1)
+    prompt.add("sentiment", text * 3, priority=2, mode="summarize", min_tokens=10)
+    prompt.add("question", "Should I buy?", required=True)
+    rendered = prompt.build()
+
+    actions = {section["name"]: section["action"] for section in prompt.report["sections"]}
+    assert actions == {"intro": "kept", "context": "dropped", "sentiment": "summarized", "question": "kept"}
+    assert prompt.report["tokens"] <= 60
+    assert rendered.startswith("Answer briefly.") and rendered.endswith("Should I buy?")
+
+
+def test_conditional_requests_prefer_etag():
+    generated_at = 1_700_000_000
+    analysis = {"symbol": "BTC", "combined_analysis": "text", "generated_at": generated_at, "version": "abc"}
+    etag = analysis_etag(analysis)
+    current_date = "Tue, 14 Nov 2023 22:13:20 GMT"
+    old_date = "Mon, 01 Jan 2001 00:00:00 GMT"
+
+    assert is_not_modified(FakeRequest(if_none_match=etag), analysis)
+    assert is_not_modified(FakeRequest(if_none_match=f'"other", W/{etag}'), analysis)
+    assert is_not_modified(FakeRequest(if_modified_since=current_date), analysis)
+    assert not is_not_modified(FakeRequest(if_modified_since=old_date), analysis)
+
+    # If-None-Match decides whenever it is sent, in both directions
+    assert is_not_modified(FakeRequest(if_none_match=etag, if_modified_since=old_date), analysis)
+    assert not is_not_modified(FakeRequest(if_none_match='"other"', if_modified_since=current_date), analysis)
+
+    # A stale copy has its own tag
+    assert not is_not_modified(FakeRequest(if_none_match=etag), {**analysis, "stale": True})
+
+    response = analysis_response(FakeRequest(if_none_match=etag), analysis)
+    assert response.status_code == 304 and response.headers["etag"] == etag and not response.body
+    response = analysis_response(FakeRequest(), analysis)
+    assert response.status_code == 200 and response.headers["last-modified"] == current_date
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
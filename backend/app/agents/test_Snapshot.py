@@ -0,0 +1,109 @@
+# test_snapshot.py
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to path to allow importing the services package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from services.cache_backend import MemoryCacheBackend
+from services.snapshot import HEADER, MAGIC, VERSION, CacheSnapshotter, SnapshotError, read_snapshot, write_snapshot
+
+
+def expect_snapshot_error(path, message):
+    try:
+        read_snapshot(path)
+    except SnapshotError as e:
+        assert message in str(e), str(e)
+    else:
+        assert False, f"expected SnapshotError: {message}"
+
+
+def test_snapshot_round_trip_and_corruption():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.snapshot")
+        namespaces = {"analysis": [["BTC", {"combined_analysis": "text"}, None]]}
+        write_snapshot(path, namespaces)
+        assert read_snapshot(path) == namespaces
+
+        with open(path, "rb") as f:
+            data = f.read()
+        _, _, length, digest = HEADER.unpack(data[:HEADER.size])
+
+        def rewrite(content):
+            with open(path, "wb") as f:
+                f.write(content)
+
+        rewrite(data[:HEADER.size - 1])
+        expect_snapshot_error(path, "truncated")
+
+        rewrite(b"NOTSNAP\0" + data[8:])
+        expect_snapshot_error(path, "Not a cache snapshot")
+
+        rewrite(HEADER.pack(MAGIC, VERSION + 1, length, digest) + data[HEADER.size:])
+        expect_snapshot_error(path, "version")
+
+        rewrite(data[:-1] + bytes([data[-1] ^ 0xFF]))
+        expect_snapshot_error(path, "checksum")
+
+        rewrite(data[:-10])
+        expect_snapshot_error(path, "checksum")
+
+        expect_snapshot_error(os.path.join(directory, "missing.snapshot"), "Cannot read")
+
+
+def test_restore_skips_corrupt_and_expired_entries():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.snapshot")
+        with open(path, "wb") as f:
+            f.write(b"garbage")
+        backend = MemoryCacheBackend()
+        assert CacheSnapshotter(backend, path=path, namespaces=("analysis",)).restore() == 0
+
+        write_snapshot(path, {"analysis": [
+            ["live", {"value": 1}, time.time() + 3600],
+            ["expired", {"value": 2}, time.time() - 1],
+            ["fresh", {"value": 3}, None]
+        ]})
+        backend.set("analysis", "fresh", {"value": "computed since startup"})
+        assert CacheSnapshotter(backend, path=path, namespaces=("analysis",)).restore() == 1
+        assert backend.get("analysis", "live") == {"value": 1}
+        assert backend.get("analysis", "expired") is None
+        assert backend.get("analysis", "fresh") == {"value": "computed since startup"}
+
+
+def test_concurrent_saves_keep_every_workers_entries():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.snapshot")
+        snapshotters = []
+        for worker in range(4):
+            backend = MemoryCacheBackend()
+            for index in range(25):
+                backend.set("analysis", f"w{worker}-{index}", {"text": "x" * 500})
+            snapshotters.append(CacheSnapshotter(backend, path=path, namespaces=("analysis",)))
+
+        def save_repeatedly(snapshotter):
+            for _ in range(5):
+                snapshotter.save()
+
+        threads = [threading.Thread(target=save_repeatedly, args=(snapshotter,)) for snapshotter in snapshotters]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(read_snapshot(path)["analysis"]) == 100
+
+        restored = MemoryCacheBackend()
+        assert CacheSnapshotter(restored, path=path, namespaces=("analysis",)).restore() == 100
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
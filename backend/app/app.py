@@ -1,20 +1,77 @@
 # app.py
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
 import os
+import time
+import asyncio
 import traceback
 from dotenv import load_dotenv
-from agents.data_agent import DataAgent
-from agents.sentiment_agent import SentimentAgent
-from agents.main_agent import CryptoAnalysisSystem
-from openai import OpenAI
+from services.container import AgentContainer
+from services.timeutil import parse_duration
+from services.cancellation import run_until_disconnected, ClientDisconnected, CLIENT_CLOSED_REQUEST
+from services.admission import AdmissionMiddleware
+from services.conditional import analysis_response, validator_headers, analysis_status
 
 load_dotenv()
 
-app = FastAPI(title="Cryptosys API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared agent container; agents and clients are built on first use"""
+    app.state.container = AgentContainer()
+    
+    # Warm-restore analyses, context and sessions from the last snapshot
+    app.state.container.start_cache_snapshots()
+    
+    # Set AGENT_EAGER_INIT=1 to pay the construction cost at startup instead of on the first request
+    if os.getenv('AGENT_EAGER_INIT') == '1':
+        app.state.container.warm_up()
+    
+    # The symbol registry may page through Polygon's ticker list (SYMBOL_REGISTRY_POLYGON=1);
+    # build it in a worker thread now rather than inside the first /api/route or /api/chat request
+    await asyncio.to_thread(lambda: app.state.container.router)
+    
+    # Alerts fired from worker threads wake this loop's push streams (the engine is built on first use)
+    app.state.container.loop = asyncio.get_running_loop()
+    
+    # Live trade stream (MARKET_STREAM=polygon|replay) feeding the in-memory bars
+    app.state.container.start_market_stream()
+    
+    yield
+    
+    await app.state.container.stop_market_stream()
+    await app.state.container.stop_cache_snapshots()
+    await app.state.container.stop_ingestion()
+    await app.state.container.stop_reports()
+    app.state.container.close()
+
+def get_container(request: Request) -> AgentContainer:
+    """FastAPI dependency returning this worker's agent container"""
+    return request.app.state.container
+
+# Endpoints that can start a multi-call LLM pipeline
+PIPELINE_PATHS = ("/api/analyze/", "/api/followup", "/api/predict", "/api/strategy", "/api/policy-impact", "/api/chat")
+
+def needs_admission(scope) -> bool:
+    """Whether a request goes through admission control (analyses servable from cache skip it)"""
+    path = scope["path"]
+    if scope["method"] not in ("GET", "POST") or not path.startswith(PIPELINE_PATHS):
+        return False
+    if path.startswith("/api/analyze/"):
+        symbol = path[len("/api/analyze/"):].upper()
+        if "/" in symbol:
+            # Status lookups never run the pipeline
+            return False
+        container = scope["app"].state.container
+        return container.cached_analysis(symbol, allow_stale=container.admission.under_pressure) is None
+    return True
+
+app = FastAPI(title="Cryptosys API", lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware, needs_admission=needs_admission)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # We'll restrict this later
@@ -23,15 +80,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize agents
-data_agent = DataAgent()
-sentiment_agent = SentimentAgent()
-analysis_system = CryptoAnalysisSystem()
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
-# Cache for analysis results
-analysis_cache = {}
-
 # Pydantic models for request validation
 class FollowUpRequest(BaseModel):
     symbol: str = Field(..., description="Cryptocurrency symbol (e.g., BTC, ETH)")
@@ -49,43 +97,92 @@ class PolicyImpactRequest(BaseModel):
     symbol: str = Field(..., description="Cryptocurrency symbol (e.g., BTC, ETH)")
     policy_description: str = Field(..., description="Description of the policy or regulation")
 
+class AlertRuleRequest(BaseModel):
+    client_id: str = Field(..., description="Identifier of the user/client that receives the alert")
+    symbol: str = Field(..., description="Cryptocurrency symbol (e.g., BTC, ETH)")
+    kind: str = Field(..., description="'price_above', 'price_below', 'percent_move', 'sentiment_above', 'sentiment_below' or 'sentiment_delta'")
+    threshold: float = Field(..., description="Price level (USD), percent move, or sentiment score/points depending on kind")
+    timeframe: Optional[str] = Field(None, description="Bar timeframe for 'percent_move' rules: '1m', '5m', '1h' or '1d'")
+    cooldown: float = Field(300, description="Minimum seconds between two triggers of this rule")
+
+class RouteRequest(BaseModel):
+    text: str = Field(..., description="User message to route")
+    current_symbol: Optional[str] = Field(None, description="Symbol the conversation is already about, used if the message names none")
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., description="User message")
+    session_id: Optional[str] = Field(None, description="Session id from a previous reply; omit to start a new session")
+    stream: bool = Field(False, description="Stream progress events and the reply as Server-Sent Events")
+
+class PrefetchRequest(BaseModel):
+    symbol: Optional[str] = Field(None, description="Symbol to warm up")
+    text: Optional[str] = Field(None, description="Partial user input or suggested query; symbols mentioned in it are warmed up")
+    client_id: Optional[str] = Field(None, description="Client identifier; a client's newer prefetch cancels its older one")
+
+class ReportRequest(BaseModel):
+    symbols: List[str] = Field(..., description="Symbols to include, e.g. a whole watchlist")
+    template: str = Field("summary", description="'summary' (combined analysis) or 'full' (plus technical, sentiment and sources)")
+    format: str = Field("markdown", description="'markdown', 'html' or 'pdf'")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Cryptosys API"}
 
+def client_closed():
+    """Error for a client that went away; the response is never read, it only shows up in logs"""
+    return HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected")
+
 @app.get("/api/analyze/{symbol}")
-async def analyze_crypto(symbol: str):
-    """Get comprehensive analysis for a cryptocurrency with sentiment data"""
+async def analyze_crypto(symbol: str, http_request: Request, container: AgentContainer = Depends(get_container)):
+    """Get comprehensive analysis for a cryptocurrency with sentiment data
+    
+    Responses carry ETag and Last-Modified; pollers sending If-None-Match or
+    If-Modified-Since get an empty 304 while the analysis is unchanged.
+    """
     symbol = symbol.upper()
     
-    if symbol in analysis_cache:
-        return analysis_cache[symbol]
+    # Under load, a stale analysis now beats a fresh one after a long queue
+    cached = container.cached_analysis(symbol, allow_stale=container.admission.under_pressure)
+    if cached is not None:
+        if container.admission.under_pressure:
+            container.admission.counters["served_from_cache"] += 1
+        return analysis_response(http_request, cached)
     
     try:
-        result = await analysis_system.get_complete_analysis(symbol)
-        
-        analysis_cache[symbol] = {
-            "symbol": symbol,
-            "market_analysis": result.get("market_analysis", ""),
-            "sentiment_analysis": result.get("sentiment_analysis", ""),
-            "combined_analysis": result.get("combined_analysis", ""),
-            "sentiment_score": result.get("sentiment_score", 50),
-            "sources": result.get("sources", []),
-            "sources_count": result.get("sources_count", 0)
-        }
-        
-        return analysis_cache[symbol]
+        analysis = await run_until_disconnected(http_request, container.ensure_analysis(symbol))
+        return analysis_response(http_request, analysis)
         
+    except ClientDisconnected:
+        raise client_closed()
     except Exception as e:
         error_details = traceback.format_exc()
         print(f"Error analyzing {symbol}: {error_details}")
         raise HTTPException(status_code=500, detail=f"Error analyzing {symbol}: {str(e)}")
 
+@app.head("/api/analyze/{symbol}")
+async def analysis_head(symbol: str, container: AgentContainer = Depends(get_container)):
+    """Whether an analysis is cached (200 with its validators) or not (404), without running anything"""
+    cached = container.cached_analysis(symbol.upper(), allow_stale=True)
+    if cached is None:
+        return Response(status_code=404)
+    return Response(status_code=200, headers=validator_headers(cached))
+
+@app.get("/api/analyze/{symbol}/status")
+async def analysis_status_endpoint(symbol: str, container: AgentContainer = Depends(get_container)):
+    """Existence, version and age of a symbol's cached analysis, and whether one is being computed"""
+    symbol = symbol.upper()
+    return analysis_status(
+        symbol,
+        container.cached_analysis(symbol, allow_stale=True),
+        computing=container.analysis_in_flight(symbol)
+    )
+
 @app.post("/api/followup")
-async def handle_followup(request: FollowUpRequest):
+async def handle_followup(request: FollowUpRequest, http_request: Request, container: AgentContainer = Depends(get_container)):
     """Handle follow-up questions about a cryptocurrency with sentiment data"""
     symbol = request.symbol.upper()
     question = request.question
+    analysis_cache = container.analysis_cache
     
     if symbol not in analysis_cache:
         raise HTTPException(status_code=404, detail=f"No analysis found for {symbol}")
@@ -95,6 +192,7 @@ async def handle_followup(request: FollowUpRequest):
         cached = analysis_cache[symbol]
         
         # Create context for the main agent if it doesn't exist
+        analysis_system = container.analysis_system
         if symbol not in analysis_system.context:
             analysis_system.context[symbol] = {
                 "market": cached["market_analysis"],
@@ -104,7 +202,7 @@ async def handle_followup(request: FollowUpRequest):
             }
         
         # Use the main agent to handle the follow-up
-        result = await analysis_system.handle_followup(symbol, question)
+        result = await run_until_disconnected(http_request, analysis_system.handle_followup(symbol, question))
         
         return {
             "symbol": symbol,
@@ -115,84 +213,98 @@ async def handle_followup(request: FollowUpRequest):
             "sources_count": result.get("sources_count", 0)
         }
         
+    except ClientDisconnected:
+        raise client_closed()
     except Exception as e:
         error_details = traceback.format_exc()
         print(f"Error handling follow-up: {error_details}")
         raise HTTPException(status_code=500, detail=f"Error handling follow-up: {str(e)}")
 
 @app.post("/api/predict")
-async def predict_price(request: PredictionRequest):
+async def predict_price(request: PredictionRequest, http_request: Request, container: AgentContainer = Depends(get_container)):
     """Generate price movement prediction for a specific timeframe with sentiment data"""
     symbol = request.symbol.upper()
     timeframe = request.timeframe
+    analysis_cache = container.analysis_cache
     
     # Ensure we have basic analysis first
     if symbol not in analysis_cache:
         try:
             # Get initial analysis
-            await analyze_crypto(symbol)
+            await run_until_disconnected(http_request, container.ensure_analysis(symbol))
+        except ClientDisconnected:
+            raise client_closed()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error analyzing {symbol} prior to prediction: {str(e)}")
     
     try:
         # Generate prediction using the main agent
-        result = await analysis_system.predict_price_movement(symbol, timeframe)
+        result = await run_until_disconnected(http_request, container.analysis_system.predict_price_movement(symbol, timeframe))
         
         return {
             "symbol": symbol,
             "timeframe": timeframe,
             "prediction": result.get("prediction", ""),
+            "simulation": result.get("simulation"),
             "sentiment_score": result.get("sentiment_score", 50),
             "sources": result.get("sources", []),
             "sources_count": result.get("sources_count", 0)
         }
         
+    except ClientDisconnected:
+        raise client_closed()
     except Exception as e:
         error_details = traceback.format_exc()
         print(f"Error generating prediction: {error_details}")
         raise HTTPException(status_code=500, detail=f"Error generating prediction: {str(e)}")
 
 @app.post("/api/strategy")
-async def trading_strategy(request: TradingStrategyRequest):
+async def trading_strategy(request: TradingStrategyRequest, http_request: Request, container: AgentContainer = Depends(get_container)):
     """Generate optimal investment strategy based on user's goal with sentiment data"""
     symbol = request.symbol.upper()
     goal = request.goal
+    analysis_cache = container.analysis_cache
     
     # Ensure we have basic analysis first
     if symbol not in analysis_cache:
         try:
             # Get initial analysis
-            await analyze_crypto(symbol)
+            await run_until_disconnected(http_request, container.ensure_analysis(symbol))
+        except ClientDisconnected:
+            raise client_closed()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error analyzing {symbol} prior to strategy: {str(e)}")
     
     try:
         # Generate strategy using the main agent
-        result = await analysis_system.optimal_trading_strategy(symbol, goal)
+        result = await run_until_disconnected(http_request, container.analysis_system.optimal_trading_strategy(symbol, goal))
         
         return {
             "symbol": symbol,
             "goal": goal,
             "strategy": result.get("strategy", ""),
+            "simulation": result.get("simulation"),
             "sentiment_score": result.get("sentiment_score", 50),
             "sources": result.get("sources", []),
             "sources_count": result.get("sources_count", 0)
         }
         
+    except ClientDisconnected:
+        raise client_closed()
     except Exception as e:
         error_details = traceback.format_exc()
         print(f"Error generating strategy: {error_details}")
         raise HTTPException(status_code=500, detail=f"Error generating strategy: {str(e)}")
 
 @app.post("/api/policy-impact")
-async def policy_impact(request: PolicyImpactRequest):
+async def policy_impact(request: PolicyImpactRequest, http_request: Request, container: AgentContainer = Depends(get_container)):
     """Analyze how a policy or regulation might impact a cryptocurrency with sentiment data"""
     symbol = request.symbol.upper()
     policy_description = request.policy_description
     
     try:
         # Generate analysis using the main agent
-        result = await analysis_system.analyze_policy_impact(symbol, policy_description)
+        result = await run_until_disconnected(http_request, container.analysis_system.analyze_policy_impact(symbol, policy_description))
         
         return {
             "symbol": symbol,
@@ -203,11 +315,347 @@ async def policy_impact(request: PolicyImpactRequest):
             "sources_count": result.get("sources_count", 0)
         }
         
+    except ClientDisconnected:
+        raise client_closed()
     except Exception as e:
         error_details = traceback.format_exc()
         print(f"Error analyzing policy impact: {error_details}")
         raise HTTPException(status_code=500, detail=f"Error analyzing policy impact: {str(e)}")
 
+@app.get("/api/sentiment/{symbol}/history")
+async def sentiment_history(
+    symbol: str,
+    window: str = Query("1h", description="Bucket size for the downsampled series, e.g. '15m', '1h', '1d'"),
+    since: str = Query("7d", description="How far back to look, e.g. '24h', '30d'"),
+    half_life: str = Query("1d", description="Half-life of the time-decayed aggregate, e.g. '6h', '1d'"),
+    container: AgentContainer = Depends(get_container)
+):
+    """Stored sentiment history for a cryptocurrency - served from the time-series store, no LLM calls"""
+    symbol = symbol.upper()
+    
+    try:
+        window_seconds = parse_duration(window)
+        since_seconds = parse_duration(since)
+        half_life_seconds = parse_duration(half_life)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if window_seconds <= 0 or half_life_seconds <= 0:
+        raise HTTPException(status_code=400, detail="window and half_life must be positive")
+    
+    now = time.time()
+    return await asyncio.to_thread(
+        container.sentiment_store.history,
+        symbol,
+        since=now - since_seconds,
+        until=now,
+        window=window_seconds,
+        half_life=half_life_seconds
+    )
+
+@app.get("/api/market/{symbol}/bars")
+async def market_bars(
+    symbol: str,
+    timeframe: str = Query("1m", description="Bar size: '1m', '5m', '1h' or '1d'"),
+    limit: int = Query(60, ge=1, le=2000, description="Number of most recent bars"),
+    container: AgentContainer = Depends(get_container)
+):
+    """Live bars aggregated from the trade stream (no REST calls)"""
+    symbol = symbol.upper()
+    aggregator = container.bar_aggregator
+    
+    if timeframe not in aggregator.timeframes:
+        raise HTTPException(status_code=400, detail=f"Unknown timeframe '{timeframe}'")
+    
+    last = aggregator.last_price(symbol)
+    return {
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "last_price": last[0] if last else None,
+        "last_trade_timestamp": last[1] if last else None,
+        "bars": aggregator.get_bars(symbol, timeframe, limit=limit)
+    }
+
+@app.post("/api/alerts")
+async def create_alert(request: AlertRuleRequest, container: AgentContainer = Depends(get_container)):
+    """Create a price or sentiment alert rule"""
+    if request.kind == 'percent_move' and request.timeframe and request.timeframe not in container.bar_aggregator.timeframes:
+        raise HTTPException(status_code=400, detail=f"Unknown timeframe '{request.timeframe}'")
+    
+    try:
+        rule = await asyncio.to_thread(
+            container.alert_engine.add_rule,
+            request.client_id,
+            request.symbol,
+            request.kind,
+            request.threshold,
+            timeframe=request.timeframe,
+            cooldown=request.cooldown
+        )
+        return rule.to_dict()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/alerts")
+async def list_alerts(
+    client_id: Optional[str] = Query(None, description="Only list this client's rules"),
+    container: AgentContainer = Depends(get_container)
+):
+    """List alert rules"""
+    return {"rules": await asyncio.to_thread(container.alert_engine.list_rules, client_id)}
+
+@app.delete("/api/alerts/{rule_id}")
+async def delete_alert(
+    rule_id: int,
+    client_id: Optional[str] = Query(None, description="Only delete the rule if it belongs to this client"),
+    container: AgentContainer = Depends(get_container)
+):
+    """Delete an alert rule"""
+    if not await asyncio.to_thread(container.alert_engine.remove_rule, rule_id, client_id):
+        raise HTTPException(status_code=404, detail=f"No alert rule {rule_id}")
+    return {"deleted": rule_id}
+
+@app.get("/api/alerts/stream")
+async def alert_stream(
+    http_request: Request,
+    client_id: str = Query(..., description="Client whose alerts to push"),
+    container: AgentContainer = Depends(get_container)
+):
+    """Push a client's alerts as Server-Sent Events (resumes from the Last-Event-ID header)"""
+    last_event_id = http_request.headers.get("last-event-id")
+    last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    
+    async def events():
+        async for event in container.alert_engine.stream(client_id, last_id):
+            if await http_request.is_disconnected():
+                break
+            yield event
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/compare")
+async def compare_cryptos(
+    symbols: str = Query(..., description="Comma-separated symbols, e.g. 'ETH,SOL'"),
+    benchmark: str = Query("BTC", description="Benchmark for beta and relative strength"),
+    window: int = Query(30, ge=2, le=365, description="Rolling window in days"),
+    lookback: str = Query("365d", description="History to use, e.g. '90d' or '365d'"),
+    backfill: bool = Query(True, description="Fetch daily history for symbols with too few stored bars"),
+    synthesize: bool = Query(False, description="Add one short LLM-written takeaway"),
+    container: AgentContainer = Depends(get_container)
+):
+    """Correlation, beta, relative strength and drawdowns for several cryptocurrencies from stored bars"""
+    symbol_list = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+    if not symbol_list or len(symbol_list) > 50:
+        raise HTTPException(status_code=400, detail="Provide between 1 and 50 symbols")
+    
+    try:
+        lookback_days = int(parse_duration(lookback) // 86400)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        summary = await container.analysis_system.compare_assets(
+            symbol_list,
+            benchmark=benchmark,
+            window=window,
+            lookback_days=lookback_days,
+            backfill=backfill,
+            synthesize=synthesize
+        )
+        if "error" in summary:
+            raise HTTPException(status_code=404, detail=summary["error"])
+        
+        return summary
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_details = traceback.format_exc()
+        print(f"Error comparing {symbols}: {error_details}")
+        raise HTTPException(status_code=500, detail=f"Error comparing {symbols}: {str(e)}")
+
+@app.get("/api/simulate/{symbol}")
+async def simulate_price(
+    symbol: str,
+    days: int = Query(30, ge=1, le=730, description="Horizon in days"),
+    method: str = Query("bootstrap", description="'bootstrap' (resampled historical returns) or 'gbm'"),
+    paths: int = Query(20000, ge=1000, le=200000, description="Number of simulated paths"),
+    container: AgentContainer = Depends(get_container)
+):
+    """Monte Carlo price percentile bands from stored daily bars (no LLM call; same inputs give the same numbers)"""
+    symbol = symbol.upper()
+    if method not in ("bootstrap", "gbm"):
+        raise HTTPException(status_code=400, detail="method must be 'bootstrap' or 'gbm'")
+    
+    try:
+        simulation = await container.analysis_system.simulate(symbol, days, method=method, paths=paths)
+    except Exception as e:
+        error_details = traceback.format_exc()
+        print(f"Error simulating {symbol}: {error_details}")
+        raise HTTPException(status_code=500, detail=f"Error simulating {symbol}: {str(e)}")
+    
+    if "error" in simulation:
+        raise HTTPException(status_code=404, detail=simulation["error"])
+    return simulation
+
+@app.get("/api/backtest")
+async def backtest(
+    symbol: Optional[str] = Query(None, description="Only score this symbol"),
+    model: Optional[str] = Query(None, description="Only score this model, e.g. 'gpt-4'"),
+    timeframe: Optional[str] = Query(None, description="Only score this timeframe, e.g. 'month' or '90d'"),
+    kind: Optional[str] = Query(None, description="'prediction' or 'strategy'"),
+    backfill: bool = Query(False, description="Fetch a year of daily bars for the symbol before scoring"),
+    container: AgentContainer = Depends(get_container)
+):
+    """Score stored predictions and strategies against what the market actually did"""
+    try:
+        if backfill and symbol:
+            await asyncio.to_thread(container.data_agent.backfill_bars, symbol.upper())
+        
+        return await asyncio.to_thread(
+            container.backtest_store.evaluate,
+            symbol=symbol,
+            model=model,
+            timeframe=timeframe,
+            kind=kind
+        )
+        
+    except Exception as e:
+        error_details = traceback.format_exc()
+        print(f"Error running backtest: {error_details}")
+        raise HTTPException(status_code=500, detail=f"Error running backtest: {str(e)}")
+
+@app.post("/api/route")
+async def route_message(request: RouteRequest, container: AgentContainer = Depends(get_container)):
+    """Resolve the assets a message mentions and classify what the user wants"""
+    try:
+        return container.router.route(request.text, request.current_symbol)
+    except Exception as e:
+        error_details = traceback.format_exc()
+        print(f"Error routing message: {error_details}")
+        raise HTTPException(status_code=500, detail=f"Error routing message: {str(e)}")
+
+@app.post("/api/chat")
+async def chat(request: ChatRequest, http_request: Request, container: AgentContainer = Depends(get_container)):
+    """Answer one chat message in a single round trip, running only the stages its intent needs"""
+    if request.stream:
+        return StreamingResponse(
+            container.chat.stream(request.message, request.session_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    try:
+        return await run_until_disconnected(http_request, container.chat.respond(request.message, request.session_id))
+        
+    except ClientDisconnected:
+        raise client_closed()
+    except Exception as e:
+        error_details = traceback.format_exc()
+        print(f"Error handling chat message: {error_details}")
+        raise HTTPException(status_code=500, detail=f"Error handling chat message: {str(e)}")
+
+@app.post("/api/prefetch", status_code=202)
+async def prefetch(request: PrefetchRequest, container: AgentContainer = Depends(get_container)):
+    """Warm market data, news, tweets and sentiment for symbols the user is likely to ask about"""
+    symbols = [request.symbol.upper()] if request.symbol else []
+    if request.text:
+        symbols += container.router.route(request.text)["symbols"]
+    symbols = list(dict.fromkeys(symbols))[:3]
+    
+    try:
+        return {
+            # The client's own prefetch follows the first symbol; the rest are shared warm-ups
+            "symbols": {
+                symbol: container.prefetcher.schedule(symbol, request.client_id if index == 0 else None)
+                for index, symbol in enumerate(symbols)
+            }
+        }
+    except Exception as e:
+        error_details = traceback.format_exc()
+        print(f"Error scheduling prefetch: {error_details}")
+        raise HTTPException(status_code=500, detail=f"Error scheduling prefetch: {str(e)}")
+
+@app.delete("/api/prefetch")
+async def cancel_prefetch(
+    client_id: str = Query(..., description="Client whose prefetch should be cancelled"),
+    container: AgentContainer = Depends(get_container)
+):
+    """Cancel a client's prefetch (work a real request has joined keeps running)"""
+    return {"cancelled": container.prefetcher.cancel(client_id)}
+
+@app.post("/api/reports", status_code=202)
+async def create_report(request: ReportRequest, container: AgentContainer = Depends(get_container)):
+    """Start a batch report job; poll it or stream its progress, then download the artifact"""
+    symbols = list(dict.fromkeys(s.strip().upper() for s in request.symbols if s.strip()))
+    if not symbols or len(symbols) > 100:
+        raise HTTPException(status_code=400, detail="Provide between 1 and 100 symbols")
+    
+    try:
+        return container.reports.submit(symbols, request.template, request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_details = traceback.format_exc()
+        print(f"Error creating report: {error_details}")
+        raise HTTPException(status_code=500, detail=f"Error creating report: {str(e)}")
+
+@app.get("/api/reports/{job_id}")
+async def get_report(job_id: str, container: AgentContainer = Depends(get_container)):
+    """Status and progress of a report job"""
+    job = container.reports.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No report job {job_id}")
+    return job
+
+@app.get("/api/reports/{job_id}/events")
+async def report_events(job_id: str, http_request: Request, container: AgentContainer = Depends(get_container)):
+    """Stream a report job's progress as Server-Sent Events until it finishes"""
+    async def events():
+        async for event in container.reports.events(job_id):
+            if await http_request.is_disconnected():
+                break
+            yield event
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/reports/{job_id}/download")
+async def download_report(job_id: str, container: AgentContainer = Depends(get_container)):
+    """Download a finished report"""
+    from services.reports import FORMATS, MEDIA_TYPES
+    
+    job = container.reports.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No report job {job_id}")
+    if job["status"] != "done" or not job["artifact_path"] or not os.path.exists(job["artifact_path"]):
+        raise HTTPException(status_code=409, detail=f"Report {job_id} is {job['status']}, not ready for download")
+    
+    return FileResponse(
+        job["artifact_path"],
+        media_type=MEDIA_TYPES[job["format"]],
+        filename=f"report-{job_id[:8]}.{FORMATS[job['format']]}"
+    )
+
+@app.delete("/api/reports/{job_id}")
+async def cancel_report(job_id: str, container: AgentContainer = Depends(get_container)):
+    """Cancel a running report job"""
+    if container.reports.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"No report job {job_id}")
+    return {"cancelled": container.reports.cancel(job_id)}
+
+@app.get("/api/admission")
+async def admission_metrics(container: AgentContainer = Depends(get_container)):
+    """Admission control state: running and queued pipelines, rejections and timings"""
+    return container.admission.metrics()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
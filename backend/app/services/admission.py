@@ -0,0 +1,236 @@
+# admission.py
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from dotenv import load_dotenv
+from starlette.responses import JSONResponse
+
+load_dotenv()
+
+
+class Overloaded(Exception):
+    """A request was turned away by admission control"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps how many LLM pipelines run at once, globally and per client
+
+    Requests over the global cap wait in a bounded FIFO queue for at most
+    ADMISSION_QUEUE_TIMEOUT seconds; beyond that they are rejected fast (503),
+    as are clients already at their own cap (429), with a Retry-After estimated
+    from recent pipeline durations. Keeping the number of running pipelines fixed
+    keeps each one fast, so throughput holds up instead of every request timing out.
+
+    Background work (report jobs) takes slots through acquire_background: it is never
+    rejected, but only gets a slot no client request is waiting for.
+    """
+
+    def __init__(self):
+        self.max_concurrent = int(os.getenv('ADMISSION_MAX_CONCURRENT', 8))
+        self.per_client = int(os.getenv('ADMISSION_PER_CLIENT', 2))
+        self.max_queue = int(os.getenv('ADMISSION_MAX_QUEUE', 16))
+        self.queue_timeout = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10))
+
+        self.running = 0
+        self._waiters = deque()
+        self._background = deque()
+        self._clients = {}    # client_id -> requests running or queued
+
+        # Exponentially weighted averages, seeded with a typical full pipeline run
+        self._service_time = float(os.getenv('ADMISSION_EXPECTED_SECONDS', 15))
+        self._queue_wait = 0.0
+
+        self.counters = {
+            "admitted_total": 0,
+            "queued_total": 0,
+            "background_admitted_total": 0,
+            "completed_total": 0,
+            "rejected_client_limit": 0,
+            "rejected_queue_full": 0,
+            "rejected_queue_timeout": 0,
+            "served_from_cache": 0
+        }
+        self.max_queue_depth = 0
+
+    @property
+    def under_pressure(self):
+        """True while every pipeline slot is taken; callers should answer from cache where they can"""
+        return self.running >= self.max_concurrent
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up for a new request"""
+        estimate = self._service_time * (len(self._waiters) + 1) / self.max_concurrent
+        return max(1, min(60, math.ceil(estimate)))
+
+    def _reject(self, status_code: int, reason: str):
+        self.counters[f"rejected_{reason}"] += 1
+        return Overloaded(status_code, reason, self.retry_after())
+
+    async def acquire(self, client_id: str):
+        """
+        Take a pipeline slot, waiting in the queue if needed
+
+        Returns:
+            Time the slot was granted, to pass back to release()
+
+        Raises:
+            Overloaded: The client is at its cap, the queue is full, or the wait timed out
+        """
+        if self._clients.get(client_id, 0) >= self.per_client:
+            raise self._reject(429, "client_limit")
+
+        if self.running < self.max_concurrent and not self._waiters:
+            self.running += 1
+        elif len(self._waiters) >= self.max_queue:
+            raise self._reject(503, "queue_full")
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.counters["queued_total"] += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+            self._clients[client_id] = self._clients.get(client_id, 0) + 1
+            queued_at = time.monotonic()
+            try:
+                # release() hands its slot straight to the first live waiter
+                await asyncio.wait_for(waiter, self.queue_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                self._leave(client_id)
+                if waiter.done() and not waiter.cancelled():
+                    # The slot arrived just as we gave up: pass it on
+                    self._handoff()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise self._reject(503, "queue_timeout")
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            self._clients[client_id] -= 1
+            self._queue_wait = 0.8 * self._queue_wait + 0.2 * (time.monotonic() - queued_at)
+
+        self._clients[client_id] = self._clients.get(client_id, 0) + 1
+        self.counters["admitted_total"] += 1
+        return time.monotonic()
+
+    async def acquire_background(self, client_id: str = "background"):
+        """
+        Take a slot for low-priority work, waiting for as long as it takes
+
+        Client requests always go first; the per-client cap doesn't apply (callers
+        bound their own concurrency). Returns the time to pass back to release().
+        """
+        if self.running < self.max_concurrent and not self._waiters and not self._background:
+            self.running += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._background.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._handoff()
+                raise
+            finally:
+                if waiter in self._background:
+                    self._background.remove(waiter)
+
+        self._clients[client_id] = self._clients.get(client_id, 0) + 1
+        self.counters["background_admitted_total"] += 1
+        return time.monotonic()
+
+    def _handoff(self):
+        """Give a freed slot to the first waiter still waiting (client requests first), or return it to the pool"""
+        for queue in (self._waiters, self._background):
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.running -= 1
+
+    def _leave(self, client_id: str):
+        self._clients[client_id] -= 1
+        if not self._clients[client_id]:
+            del self._clients[client_id]
+
+    def release(self, client_id: str, started: float):
+        self._leave(client_id)
+        self.counters["completed_total"] += 1
+        self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+        self._handoff()
+
+    def metrics(self):
+        return {
+            "running": self.running,
+            "queued": len(self._waiters),
+            "queued_background": len(self._background),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "per_client": self.per_client,
+            "under_pressure": self.under_pressure,
+            "clients": len(self._clients),
+            "avg_service_seconds": round(self._service_time, 2),
+            "avg_queue_wait_seconds": round(self._queue_wait, 2),
+            "max_queue_depth": self.max_queue_depth,
+            "retry_after": self.retry_after(),
+            **self.counters
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying the container's AdmissionController to pipeline requests
+
+    The slot is held until the response has been fully sent, so streamed answers
+    count against the cap for as long as they run.
+    """
+
+    def __init__(self, app, needs_admission):
+        """
+        Args:
+            app: ASGI app to wrap
+            needs_admission: Callable(scope) -> bool; False for requests that won't start a pipeline
+        """
+        self.app = app
+        self.needs_admission = needs_admission
+
+    @staticmethod
+    def client_id(scope):
+        """X-Client-Id header if the client sends one, else its address"""
+        for name, value in scope.get("headers", []):
+            if name == b"x-client-id" and value:
+                return value.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "anonymous"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.needs_admission(scope):
+            await self.app(scope, receive, send)
+            return
+
+        controller = scope["app"].state.container.admission
+        client_id = self.client_id(scope)
+        try:
+            started = await controller.acquire(client_id)
+        except Overloaded as e:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly", "reason": e.reason, "retry_after": e.retry_after},
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(client_id, started)
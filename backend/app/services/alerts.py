@@ -0,0 +1,365 @@
+# alerts.py
+
+import asyncio
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from services.storage import SQLiteStore, data_path
+
+load_dotenv()
+
+# Rule kinds and what their threshold means
+PRICE_KINDS = {
+    'price_above': "price crosses above threshold (USD)",
+    'price_below': "price crosses below threshold (USD)",
+    'percent_move': "a bar of the rule's timeframe moves at least threshold percent"
+}
+SENTIMENT_KINDS = {
+    'sentiment_above': "sentiment score crosses above threshold (0-100)",
+    'sentiment_below': "sentiment score crosses below threshold (0-100)",
+    'sentiment_delta': "sentiment score changes by at least threshold points between readings"
+}
+RULE_KINDS = {**PRICE_KINDS, **SENTIMENT_KINDS}
+
+
+class AlertRule:
+    """A stored alert rule"""
+
+    __slots__ = ("id", "client_id", "symbol", "kind", "threshold", "timeframe", "cooldown", "last_triggered_at")
+
+    def __init__(self, id, client_id, symbol, kind, threshold, timeframe, cooldown, last_triggered_at):
+        self.id = id
+        self.client_id = client_id
+        self.symbol = symbol
+        self.kind = kind
+        self.threshold = threshold
+        self.timeframe = timeframe
+        self.cooldown = cooldown
+        self.last_triggered_at = last_triggered_at
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class AlertEngine(SQLiteStore):
+    """
+    Stores alert rules and evaluates them incrementally as bars and sentiment points arrive
+
+    Rules are indexed by symbol, so an update only touches the rules for the symbol that
+    changed. Triggered alerts are written to an event log that every worker's push
+    streams read from, so subscribers get alerts whichever worker evaluated them.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS alert_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            timeframe TEXT,
+            cooldown REAL NOT NULL,
+            created_at REAL NOT NULL,
+            last_triggered_at REAL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS alert_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rule_id INTEGER NOT NULL,
+            client_id TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            value REAL,
+            message TEXT NOT NULL,
+            triggered_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS alert_events_client ON alert_events (client_id, id)",
+    )
+
+    def __init__(self, path: str = None, sentiment_store=None, bar_store=None, bar_aggregator=None):
+        """
+        Args:
+            path: SQLite file for rules and events
+            sentiment_store: Shared SentimentStore the previous sentiment reading is read from
+            bar_store: Shared BarStore, the fallback for the previous close
+            bar_aggregator: BarAggregator whose last closed bar is the previous close
+        """
+        super().__init__(path or os.getenv('ALERTS_DB_PATH') or data_path("alerts.db"))
+
+        # Previous readings come from the shared stores rather than this worker's memory, so a
+        # crossing is seen whichever worker got each reading, and a restart doesn't re-fire rules
+        self.sentiment_store = sentiment_store
+        self.bar_store = bar_store
+        self.bar_aggregator = bar_aggregator
+
+        # symbol -> {rule_id: AlertRule}
+        self._index = {}
+        self._index_lock = threading.Lock()
+        self._index_checked_at = 0
+        self._index_signature = None
+        # Other workers may add/remove rules; that is checked for at least this often
+        self.reload_interval = float(os.getenv('ALERTS_RELOAD_INTERVAL', 10))
+
+        # Evaluations running in worker threads
+        self._tasks = set()
+
+        # One event per local push stream, all set as soon as this worker records an alert
+        self._subscribers = set()
+        self._loop = None
+
+    def bind_loop(self, loop):
+        """Remember the event loop so alerts fired from other threads can wake the push streams"""
+        self._loop = loop
+
+    # Rule management
+
+    def add_rule(self, client_id: str, symbol: str, kind: str, threshold: float,
+                 timeframe: str = None, cooldown: float = 300):
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Unknown alert kind '{kind}'. Expected one of: {', '.join(RULE_KINDS)}")
+        if kind == 'percent_move' and not timeframe:
+            timeframe = '1h'
+
+        cursor = self.execute(
+            "INSERT INTO alert_rules (client_id, symbol, kind, threshold, timeframe, cooldown, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (client_id, symbol.upper(), kind, threshold, timeframe, cooldown, time.time())
+        )
+        rule = AlertRule(cursor.lastrowid, client_id, symbol.upper(), kind, threshold, timeframe, cooldown, None)
+        with self._index_lock:
+            self._index.setdefault(rule.symbol, {})[rule.id] = rule
+        self._invalidate_index()
+        return rule
+
+    def remove_rule(self, rule_id: int, client_id: str = None):
+        sql = "DELETE FROM alert_rules WHERE id = ?"
+        params = [rule_id]
+        if client_id:
+            sql += " AND client_id = ?"
+            params.append(client_id)
+        removed = self.execute(sql, params).rowcount > 0
+
+        with self._index_lock:
+            for rules in self._index.values():
+                rules.pop(rule_id, None)
+        self._invalidate_index()
+        return removed
+
+    def list_rules(self, client_id: str = None):
+        sql = "SELECT id, client_id, symbol, kind, threshold, timeframe, cooldown, last_triggered_at FROM alert_rules"
+        params = []
+        if client_id:
+            sql += " WHERE client_id = ?"
+            params.append(client_id)
+        return [AlertRule(*row).to_dict() for row in self.query(sql + " ORDER BY id", params)]
+
+    def _refresh_index(self):
+        """Reload the rule index when rules were added or removed by any worker (runs off the event loop)"""
+        if time.time() - self._index_checked_at < self.reload_interval:
+            return
+        self._index_checked_at = time.time()
+
+        # Ids only grow, so the count and the highest id change with every add or delete
+        signature = tuple(self.query("SELECT COUNT(*), MAX(id) FROM alert_rules")[0])
+        if signature == self._index_signature:
+            return
+
+        rows = self.query(
+            "SELECT id, client_id, symbol, kind, threshold, timeframe, cooldown, last_triggered_at FROM alert_rules"
+        )
+        index = {}
+        for row in rows:
+            rule = AlertRule(*row)
+            index.setdefault(rule.symbol, {})[rule.id] = rule
+        with self._index_lock:
+            self._index = index
+            self._index_signature = signature
+
+    def _invalidate_index(self):
+        self._index_checked_at = 0
+
+    def _rules_for(self, symbol: str):
+        with self._index_lock:
+            return list(self._index.get(symbol, {}).values())
+
+    # Evaluation
+
+    def on_bar(self, symbol: str, timeframe: str, bar: dict):
+        """BarAggregator listener: evaluate price rules for the symbol whose bar just closed"""
+        self._offload(self._evaluate_bar, symbol, timeframe, dict(bar))
+
+    def on_sentiment(self, symbol: str, score: float, timestamp: float):
+        """SentimentStore listener: evaluate sentiment rules for the symbol that just got a new score"""
+        self._offload(self._evaluate_sentiment, symbol, score, timestamp)
+
+    def _offload(self, evaluate, *args):
+        """Evaluate in a worker thread when called on the event loop (it reads and writes SQLite), else inline"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._evaluate(evaluate, *args)
+            return
+
+        self._loop = self._loop or loop
+        task = loop.create_task(asyncio.to_thread(self._evaluate, evaluate, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _evaluate(self, evaluate, *args):
+        try:
+            self._refresh_index()
+            evaluate(*args)
+        except Exception as e:
+            print(f"Error evaluating alerts: {e}")
+
+    def _previous_close(self, symbol: str, timestamp: int):
+        """Close before the bar starting at timestamp: the last closed 1m bar, else the latest stored daily close"""
+        if self.bar_aggregator:
+            for bar in reversed(self.bar_aggregator.get_bars(symbol, '1m', limit=3, include_current=False)):
+                if bar["timestamp"] < timestamp:
+                    return bar["close"]
+        if self.bar_store:
+            stored = self.bar_store.get_bars(symbol, "day", until=timestamp, limit=1)
+            if stored and timestamp - stored[-1]["timestamp"] <= 2 * 86400 * 1000:
+                return stored[-1]["close"]
+        return None
+
+    def _previous_sentiment(self, symbol: str, timestamp: float):
+        """Score stored before the one recorded at timestamp, by whichever worker recorded it"""
+        if not self.sentiment_store:
+            return None
+        # The newest stored record at or before timestamp is the reading being evaluated
+        records = [record for record in self.sentiment_store.latest(symbol, 3) if record[0] <= timestamp]
+        return records[-2][1] if len(records) >= 2 else None
+
+    def _evaluate_bar(self, symbol: str, timeframe: str, bar: dict):
+        rules = [rule for rule in self._rules_for(symbol) if rule.kind in PRICE_KINDS]
+        if not rules:
+            return
+        price = bar["close"]
+
+        # Crossings are evaluated once per bar on the finest timeframe
+        if timeframe == '1m':
+            previous = self._previous_close(symbol, bar["timestamp"])
+            for rule in rules:
+                if previous is None:
+                    continue
+                if rule.kind == 'price_above' and previous < rule.threshold <= price:
+                    self._trigger(rule, price, f"{symbol} crossed above ${rule.threshold:,.2f} (now ${price:,.2f})")
+                elif rule.kind == 'price_below' and previous > rule.threshold >= price:
+                    self._trigger(rule, price, f"{symbol} crossed below ${rule.threshold:,.2f} (now ${price:,.2f})")
+
+        for rule in rules:
+            if rule.kind == 'percent_move' and rule.timeframe == timeframe and bar["open"]:
+                move = (bar["close"] - bar["open"]) / bar["open"] * 100
+                if abs(move) >= rule.threshold:
+                    self._trigger(rule, move, f"{symbol} moved {move:+.2f}% over the last {timeframe} bar")
+
+    def _evaluate_sentiment(self, symbol: str, score: float, timestamp: float):
+        rules = [rule for rule in self._rules_for(symbol) if rule.kind in SENTIMENT_KINDS]
+        if not rules:
+            return
+        previous = self._previous_sentiment(symbol, timestamp)
+
+        for rule in rules:
+            if rule.kind == 'sentiment_delta' and previous is not None:
+                delta = score - previous
+                if abs(delta) >= rule.threshold:
+                    self._trigger(rule, score, f"{symbol} sentiment moved {delta:+.0f} points to {score:.0f}")
+            elif rule.kind == 'sentiment_above' and (previous is None or previous < rule.threshold) and score >= rule.threshold:
+                self._trigger(rule, score, f"{symbol} sentiment rose to {score:.0f} (above {rule.threshold:.0f})")
+            elif rule.kind == 'sentiment_below' and (previous is None or previous > rule.threshold) and score <= rule.threshold:
+                self._trigger(rule, score, f"{symbol} sentiment fell to {score:.0f} (below {rule.threshold:.0f})")
+
+    def _trigger(self, rule: AlertRule, value: float, message: str):
+        now = time.time()
+
+        # The conditional update makes exactly one worker win each trigger, and enforces the cooldown
+        won = self.execute(
+            "UPDATE alert_rules SET last_triggered_at = ? "
+            "WHERE id = ? AND (last_triggered_at IS NULL OR last_triggered_at <= ?)",
+            (now, rule.id, now - rule.cooldown)
+        ).rowcount > 0
+        if not won:
+            return
+
+        rule.last_triggered_at = now
+        self.execute(
+            "INSERT INTO alert_events (rule_id, client_id, symbol, kind, value, message, triggered_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (rule.id, rule.client_id, rule.symbol, rule.kind, value, message, now)
+        )
+        print(f"Alert {rule.id} for {rule.client_id}: {message}")
+        self._notify()
+
+    def _notify(self):
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake_subscribers()
+        else:
+            self._loop.call_soon_threadsafe(self._wake_subscribers)
+
+    def _wake_subscribers(self):
+        for wake in list(self._subscribers):
+            wake.set()
+
+    # Delivery
+
+    def events_after(self, client_id: str, last_id: int, limit: int = 100):
+        rows = self.query(
+            "SELECT id, rule_id, symbol, kind, value, message, triggered_at FROM alert_events "
+            "WHERE client_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (client_id, last_id, limit)
+        )
+        return [
+            {
+                "id": row[0], "rule_id": row[1], "symbol": row[2], "kind": row[3],
+                "value": row[4], "message": row[5], "triggered_at": row[6]
+            }
+            for row in rows
+        ]
+
+    def latest_event_id(self, client_id: str):
+        row = self.query("SELECT MAX(id) FROM alert_events WHERE client_id = ?", (client_id,))
+        return row[0][0] or 0
+
+    async def stream(self, client_id: str, last_id: int = None, poll_interval: float = 1.0, keepalive: float = 15):
+        """Yield Server-Sent Events for a client's alerts, resuming after last_id if given"""
+        if last_id is None:
+            last_id = await asyncio.to_thread(self.latest_event_id, client_id)
+        last_sent = time.time()
+
+        # Our own wake-up, so one stream clearing it can't swallow another's notification
+        wake = asyncio.Event()
+        self._subscribers.add(wake)
+        try:
+            while True:
+                # Cleared before querying: an alert recorded during the query wakes the next wait
+                wake.clear()
+                events = await asyncio.to_thread(self.events_after, client_id, last_id)
+                for event in events:
+                    last_id = event["id"]
+                    yield f"id: {event['id']}\nevent: alert\ndata: {json.dumps(event)}\n\n"
+                    last_sent = time.time()
+
+                if time.time() - last_sent >= keepalive:
+                    yield ": keepalive\n\n"
+                    last_sent = time.time()
+
+                # Local triggers wake us immediately; polling picks up other workers' alerts
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._subscribers.discard(wake)
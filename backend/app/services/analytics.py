@@ -0,0 +1,163 @@
+# analytics.py
+
+import math
+
+DAY_MS = 86400 * 1000
+
+
+def _rolling_sum(values, window: int):
+    """Sum of each trailing window along axis 0 (row i covers rows i..i+window-1)"""
+    import numpy as np
+
+    cumulative = np.cumsum(values, axis=0)
+    cumulative = np.concatenate([np.zeros((1,) + values.shape[1:]), cumulative], axis=0)
+    return cumulative[window:] - cumulative[:-window]
+
+
+def _round(value, digits: int = 4):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return round(float(value), digits)
+
+
+def compare_symbols(bar_store, symbols, benchmark: str = "BTC", window: int = 30,
+                    lookback_days: int = 365, series_points: int = 30):
+    """
+    Correlation, beta, relative strength and drawdown for a set of symbols
+
+    Works on the aligned matrix of stored daily closes, so every statistic for every
+    symbol comes out of a handful of vectorized NumPy operations.
+
+    Args:
+        bar_store: BarStore with daily bars
+        symbols: Symbols to compare
+        benchmark: Symbol used for beta and relative strength
+        window: Rolling window in days
+        lookback_days: How much history to use
+        series_points: How many recent points of rolling correlation to return
+
+    Returns:
+        Compact numeric summary dictionary
+    """
+    import numpy as np
+
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    benchmark = benchmark.upper()
+    columns = symbols + ([benchmark] if benchmark not in symbols else [])
+
+    series = {symbol: bar_store.close_series(symbol, "day") for symbol in columns}
+
+    missing = [symbol for symbol, (timestamps, _) in series.items() if len(timestamps) < 2]
+    if missing:
+        return {"error": f"Not enough stored daily bars for: {', '.join(missing)}", "missing": missing}
+
+    # Align every series on the timestamps they all share
+    common = series[columns[0]][0]
+    for symbol in columns[1:]:
+        common = np.intersect1d(common, series[symbol][0])
+    if len(common):
+        common = common[common >= common[-1] - lookback_days * DAY_MS]
+
+    if len(common) < 3:
+        return {"error": "Not enough overlapping history between the symbols", "missing": []}
+
+    prices = np.column_stack([
+        series[symbol][1][np.searchsorted(series[symbol][0], common)] for symbol in columns
+    ])
+    returns = np.diff(np.log(prices), axis=0)
+    observations = returns.shape[0]
+    window = max(2, min(window, observations))
+    bench_index = columns.index(benchmark)
+
+    # Full-period correlation matrix and the same over the latest window
+    correlation = np.corrcoef(returns, rowvar=False)
+    recent = returns[-window:]
+    recent_correlation = np.corrcoef(recent, rowvar=False)
+
+    # Rolling correlation with the benchmark, from rolling sums of x, y, x^2, y^2, xy
+    bench = returns[:, [bench_index]]
+    n = float(window)
+    sum_x = _rolling_sum(returns, window)
+    sum_y = _rolling_sum(bench, window)
+    sum_xx = _rolling_sum(returns ** 2, window)
+    sum_yy = _rolling_sum(bench ** 2, window)
+    sum_xy = _rolling_sum(returns * bench, window)
+    cov = sum_xy / n - (sum_x / n) * (sum_y / n)
+    var_x = sum_xx / n - (sum_x / n) ** 2
+    var_y = sum_yy / n - (sum_y / n) ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rolling_corr = cov / np.sqrt(var_x * var_y)
+        rolling_beta = cov / var_y
+
+    # Drawdowns from the running peak
+    running_peak = np.maximum.accumulate(prices, axis=0)
+    drawdowns = prices / running_peak - 1
+
+    # Relative strength: window return of each symbol against the benchmark's
+    window_return = prices[-1] / prices[-window - 1] - 1
+    relative_strength = (1 + window_return) / (1 + window_return[bench_index])
+    volatility = returns[-window:].std(axis=0, ddof=1) * math.sqrt(365)
+
+    rolling_timestamps = common[window:][-series_points:]
+    results = []
+    for index, symbol in enumerate(columns):
+        if symbol == benchmark and symbol not in symbols:
+            continue
+        results.append({
+            "symbol": symbol,
+            "last_close": _round(prices[-1, index], 6),
+            "window_return": _round(window_return[index]),
+            "total_return": _round(prices[-1, index] / prices[0, index] - 1),
+            "annualized_volatility": _round(volatility[index]),
+            "beta": _round(rolling_beta[-1, index]),
+            "correlation_with_benchmark": _round(rolling_corr[-1, index]),
+            "relative_strength": _round(relative_strength[index]),
+            "max_drawdown": _round(drawdowns[:, index].min()),
+            "current_drawdown": _round(drawdowns[-1, index]),
+            "rolling_correlation": [_round(value) for value in rolling_corr[-series_points:, index]]
+        })
+
+    ranking = sorted(
+        (item for item in results if item["relative_strength"] is not None),
+        key=lambda item: item["relative_strength"],
+        reverse=True
+    )
+
+    return {
+        "symbols": symbols,
+        "benchmark": benchmark,
+        "window_days": window,
+        "observations": observations,
+        "start": int(common[0]),
+        "end": int(common[-1]),
+        "rolling_timestamps": [int(timestamp) for timestamp in rolling_timestamps],
+        "correlation_matrix": {
+            a: {b: _round(correlation[i, j]) for j, b in enumerate(columns)} for i, a in enumerate(columns)
+        },
+        "recent_correlation_matrix": {
+            a: {b: _round(recent_correlation[i, j]) for j, b in enumerate(columns)} for i, a in enumerate(columns)
+        },
+        "metrics": results,
+        "relative_strength_ranking": [item["symbol"] for item in ranking]
+    }
+
+
+FORMATTED_METRICS = ("window_return", "relative_strength", "beta", "correlation_with_benchmark",
+                     "annualized_volatility", "max_drawdown")
+
+
+def format_comparison(summary):
+    """Comparison summary as short factual lines, for answers that skip the LLM takeaway"""
+    lines = [f"Last {summary['window_days']} days against {summary['benchmark']}:"]
+    for item in summary["metrics"]:
+        if any(item[key] is None for key in FORMATTED_METRICS):
+            lines.append(f"{item['symbol']}: not enough overlapping history")
+            continue
+        lines.append(
+            f"{item['symbol']}: return {item['window_return']:+.1%}, relative strength {item['relative_strength']:.2f}, "
+            f"beta {item['beta']:.2f}, correlation {item['correlation_with_benchmark']:.2f}, "
+            f"volatility {item['annualized_volatility']:.0%}, max drawdown {item['max_drawdown']:.0%}"
+        )
+    if summary["relative_strength_ranking"]:
+        lines.append(f"Strongest to weakest: {', '.join(summary['relative_strength_ranking'])}")
+    return "\n".join(lines)
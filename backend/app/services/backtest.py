@@ -0,0 +1,226 @@
+# backtest.py
+
+import os
+import re
+import time
+from dotenv import load_dotenv
+from services.storage import SQLiteStore, data_path
+
+load_dotenv()
+
+ACTION_DIRECTIONS = {'buy': 1, 'hold': 0, 'sell': -1}
+
+PRICE = r'\$\s?(\d[\d,]*(?:\.\d+)?)\s*([kK])?'
+RANGE_PATTERN = re.compile(PRICE + r'\s*(?:-|–|—|to|and)\s*' + PRICE)
+PRICE_PATTERN = re.compile(PRICE)
+ACTION_PATTERN = re.compile(r'\b(buy|sell|hold)(?:ing)?\b', re.IGNORECASE)
+
+
+def _price(number: str, thousands: str):
+    value = float(number.replace(',', ''))
+    return value * 1000 if thousands else value
+
+
+def parse_prediction(text: str):
+    """
+    Pull the structured parts out of a prediction/strategy response
+
+    Returns:
+        Dictionary with low, high, point (floats or None) and action ('buy', 'sell', 'hold' or None)
+    """
+    low = high = point = None
+
+    range_match = RANGE_PATTERN.search(text)
+    if range_match:
+        low = _price(range_match.group(1), range_match.group(2))
+        high = _price(range_match.group(3), range_match.group(4))
+        low, high = min(low, high), max(low, high)
+
+    # Most likely price point, usually on its own line
+    for line in text.splitlines():
+        if 'most likely' in line.lower():
+            price_match = PRICE_PATTERN.search(line)
+            if price_match:
+                point = _price(price_match.group(1), price_match.group(2))
+                break
+    if point is None and low is not None:
+        point = (low + high) / 2
+
+    # Prefer the explicit recommendation line, then the opening paragraph, then anywhere
+    action = None
+    lines = text.splitlines()
+    recommendation_lines = (
+        [line for line in lines if 'recommendation' in line.lower()] +
+        [line for line in lines if 'recommend' in line.lower()]
+    )
+    opening_paragraph = text.strip().split('\n\n')[0] if text.strip() else ''
+    for candidate in recommendation_lines + [opening_paragraph, text]:
+        action_match = ACTION_PATTERN.search(candidate)
+        if action_match:
+            action = action_match.group(1).lower()
+            break
+
+    return {"low": low, "high": high, "point": point, "action": action}
+
+
+class BacktestStore(SQLiteStore):
+    """Stores every prediction/strategy call and scores them against stored daily bars"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            model TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            horizon_days REAL NOT NULL,
+            entry_price REAL,
+            low REAL,
+            high REAL,
+            point REAL,
+            action TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS predictions_symbol ON predictions (symbol, created_at)",
+    )
+
+    def __init__(self, bar_store, path: str = None):
+        super().__init__(path or os.getenv('BACKTEST_DB_PATH') or data_path("backtest.db"))
+        self.bar_store = bar_store
+
+        # Round-trip fee charged on every buy/sell call, and the move a 'hold' call may tolerate
+        self.fee = float(os.getenv('BACKTEST_FEE', 0.001))
+        self.hold_band = float(os.getenv('BACKTEST_HOLD_BAND', 0.02))
+        # How far past the horizon the first available bar may be and still count
+        self.tolerance_days = float(os.getenv('BACKTEST_TOLERANCE_DAYS', 2))
+
+    def record_prediction(self, symbol: str, text: str, kind: str, model: str, timeframe: str,
+                          horizon_days: float, entry_price: float = None, created_at: float = None):
+        """Parse a model response and store it for later scoring"""
+        parsed = parse_prediction(text)
+        self.execute(
+            "INSERT INTO predictions (symbol, kind, model, timeframe, created_at, horizon_days, "
+            "entry_price, low, high, point, action) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                symbol.upper(), kind, model, timeframe,
+                created_at if created_at is not None else time.time(), horizon_days,
+                entry_price, parsed["low"], parsed["high"], parsed["point"], parsed["action"]
+            )
+        )
+        return parsed
+
+    def evaluate(self, symbol: str = None, model: str = None, timeframe: str = None, kind: str = None):
+        """
+        Score every matured prediction in one vectorized pass
+
+        Returns:
+            Dictionary with an overall summary and one summary per (symbol, model, timeframe)
+        """
+        import numpy as np
+
+        sql = ("SELECT symbol, model, timeframe, created_at, horizon_days, entry_price, low, high, point, action "
+               "FROM predictions WHERE created_at + horizon_days * 86400 <= ?")
+        params = [time.time()]
+        for column, value in (("symbol", symbol), ("model", model), ("timeframe", timeframe), ("kind", kind)):
+            if value:
+                sql += f" AND {column} = ?"
+                params.append(value.upper() if column == "symbol" else value)
+        rows = self.query(sql, params)
+
+        if not rows:
+            return {"overall": self._empty_summary(), "groups": []}
+
+        symbols = np.array([row[0] for row in rows])
+        group_keys = np.array([f"{row[0]}|{row[1]}|{row[2]}" for row in rows])
+        numeric = np.array([row[3:9] for row in rows], dtype=np.float64)
+        created, horizon, entry, low, high, point = numeric.T
+        direction = np.array([ACTION_DIRECTIONS.get(row[9], 0) for row in rows], dtype=np.float64)
+        has_action = np.array([row[9] is not None for row in rows])
+
+        # Close of the first stored bar at or after each prediction's horizon
+        target_ms = ((created + horizon * 86400) * 1000).astype(np.int64)
+        tolerance_ms = int(self.tolerance_days * 86400 * 1000)
+        exit_price = np.full(len(rows), np.nan)
+        for sym in np.unique(symbols):
+            mask = symbols == sym
+            bar_times, closes = self.bar_store.close_series(sym)
+            if len(bar_times) == 0:
+                continue
+            positions = np.searchsorted(bar_times, target_ms[mask], side="left")
+            clipped = np.minimum(positions, len(bar_times) - 1)
+            found = (positions < len(bar_times)) & (bar_times[clipped] - target_ms[mask] <= tolerance_ms)
+            exit_price[mask] = np.where(found, closes[clipped], np.nan)
+
+        scored = ~np.isnan(exit_price) & ~np.isnan(entry) & (entry > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            realized = (exit_price - entry) / entry
+            has_range = scored & ~np.isnan(low) & ~np.isnan(high)
+            hit = has_range & (exit_price >= low) & (exit_price <= high)
+            has_point = scored & ~np.isnan(point)
+            abs_pct_error = np.where(has_point, np.abs(point - exit_price) / exit_price, 0.0)
+
+            # Simulated PnL: long on buy, short on sell, flat on hold, fee on every trade
+            trades = scored & has_action & (direction != 0)
+            pnl = np.where(scored & has_action, direction * realized - self.fee * (direction != 0), 0.0)
+            pnl = np.where(np.isnan(pnl), 0.0, pnl)
+            correct = np.where(
+                direction == 0,
+                np.abs(realized) <= self.hold_band,
+                np.sign(realized) == direction
+            ) & scored & has_action
+
+        unique_keys, inverse = np.unique(group_keys, return_inverse=True)
+        groups_count = len(unique_keys)
+
+        def per_group(values):
+            return np.bincount(inverse, weights=values.astype(np.float64), minlength=groups_count)
+
+        totals = {
+            "predictions": np.bincount(inverse, minlength=groups_count).astype(np.float64),
+            "scored": per_group(scored),
+            "with_range": per_group(has_range),
+            "hits": per_group(hit),
+            "with_point": per_group(has_point),
+            "abs_pct_error": per_group(abs_pct_error),
+            "with_action": per_group(scored & has_action),
+            "correct": per_group(correct),
+            "trades": per_group(trades),
+            "wins": per_group(trades & (pnl > 0)),
+            "pnl": per_group(pnl)
+        }
+
+        groups = []
+        for index, key in enumerate(unique_keys):
+            group_symbol, group_model, group_timeframe = key.split("|")
+            summary = self._summarize({name: values[index] for name, values in totals.items()})
+            groups.append({"symbol": group_symbol, "model": group_model, "timeframe": group_timeframe, **summary})
+
+        overall = self._summarize({name: values.sum() for name, values in totals.items()})
+        return {"overall": overall, "groups": groups}
+
+    @staticmethod
+    def _ratio(numerator, denominator):
+        return round(float(numerator / denominator), 4) if denominator else None
+
+    def _summarize(self, totals):
+        return {
+            "predictions": int(totals["predictions"]),
+            "scored": int(totals["scored"]),
+            "hit_rate": self._ratio(totals["hits"], totals["with_range"]),
+            "mean_abs_pct_error": self._ratio(totals["abs_pct_error"], totals["with_point"]),
+            "direction_accuracy": self._ratio(totals["correct"], totals["with_action"]),
+            "trades": int(totals["trades"]),
+            "win_rate": self._ratio(totals["wins"], totals["trades"]),
+            "total_pnl": round(float(totals["pnl"]), 4),
+            "mean_pnl_per_trade": self._ratio(totals["pnl"], totals["trades"])
+        }
+
+    def _empty_summary(self):
+        return self._summarize({
+            name: 0.0 for name in (
+                "predictions", "scored", "with_range", "hits", "with_point", "abs_pct_error",
+                "with_action", "correct", "trades", "wins", "pnl"
+            )
+        })
@@ -0,0 +1,117 @@
+# bar_store.py
+
+import os
+from dotenv import load_dotenv
+from services.storage import SQLiteStore, data_path
+
+load_dotenv()
+
+
+def bar_to_dict(bar):
+    """Normalize a Polygon Agg object (or an equivalent dict) to a plain OHLCV dict"""
+    if isinstance(bar, dict):
+        get = bar.get
+    else:
+        get = lambda name: getattr(bar, name, None)
+
+    return {
+        "timestamp": int(get("timestamp")),
+        "open": get("open"),
+        "high": get("high"),
+        "low": get("low"),
+        "close": get("close"),
+        "volume": get("volume") or 0
+    }
+
+
+def latest_close(bars):
+    """Close of the most recent bar in a market data list, or None"""
+    closes = [
+        (bar["timestamp"], bar["close"])
+        for bar in (bar_to_dict(bar) for bar in bars or [])
+        if bar["close"] is not None
+    ]
+    return max(closes)[1] if closes else None
+
+
+class BarStore(SQLiteStore):
+    """Local OHLCV history (timestamps in epoch milliseconds, as Polygon returns them)"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS bars (
+            symbol TEXT NOT NULL,
+            timespan TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            PRIMARY KEY (symbol, timespan, timestamp)
+        ) WITHOUT ROWID
+        """,
+    )
+
+    def __init__(self, path: str = None):
+        super().__init__(path or os.getenv('BAR_STORE_PATH') or data_path("bars.db"))
+
+    def record_bars(self, symbol: str, bars, timespan: str = "day"):
+        """Upsert bars (Polygon Agg objects or dicts) for a symbol"""
+        rows = []
+        for bar in bars or []:
+            bar = bar_to_dict(bar)
+            rows.append((
+                symbol.upper(), timespan, bar["timestamp"],
+                bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"]
+            ))
+
+        if rows:
+            self.executemany(
+                "INSERT OR REPLACE INTO bars (symbol, timespan, timestamp, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def get_bars(self, symbol: str, timespan: str = "day", since: int = None, until: int = None, limit: int = None):
+        """Return stored bars as dicts in time order; since/until are epoch milliseconds"""
+        sql = "SELECT timestamp, open, high, low, close, volume FROM bars WHERE symbol = ? AND timespan = ?"
+        params = [symbol.upper(), timespan]
+        if since is not None:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND timestamp <= ?"
+            params.append(until)
+
+        if limit:
+            # Most recent `limit` bars, still returned oldest first
+            sql = f"SELECT * FROM ({sql} ORDER BY timestamp DESC LIMIT ?) ORDER BY timestamp"
+            params.append(limit)
+        else:
+            sql += " ORDER BY timestamp"
+
+        return [
+            {"timestamp": row[0], "open": row[1], "high": row[2], "low": row[3], "close": row[4], "volume": row[5]}
+            for row in self.query(sql, params)
+        ]
+
+    def close_series(self, symbol: str, timespan: str = "day", since: int = None):
+        """Return (timestamps, closes) as NumPy arrays for vectorized analytics"""
+        import numpy as np
+
+        sql = "SELECT timestamp, close FROM bars WHERE symbol = ? AND timespan = ? AND close IS NOT NULL"
+        params = [symbol.upper(), timespan]
+        if since is not None:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        rows = self.query(sql + " ORDER BY timestamp", params)
+
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        data = np.array(rows, dtype=np.float64)
+        return data[:, 0].astype(np.int64), data[:, 1]
+
+    def symbols(self, timespan: str = "day"):
+        return [row[0] for row in self.query("SELECT DISTINCT symbol FROM bars WHERE timespan = ?", (timespan,))]
@@ -0,0 +1,406 @@
+# cache_backend.py
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from dotenv import load_dotenv
+from services.records import pack_record, to_plain
+from services.storage import data_path, connect_sqlite
+
+load_dotenv()
+
+
+class CacheBackend(ABC):
+    """Base interface for the analysis cache and follow-up context storage"""
+
+    def __init__(self, lock_ttl: float = 300, lock_poll_interval: float = 0.25):
+        # Cross-process locks expire after lock_ttl seconds so a crashed worker can't block a key forever
+        self.lock_ttl = lock_ttl
+        self.lock_poll_interval = lock_poll_interval
+
+        # In-process flights, so concurrent requests in one worker share a single task
+        self._flights = FlightGroup()
+
+        # namespace -> CompactRecord type its dict values are stored as (in-process backends)
+        self._record_types = {}
+
+    @abstractmethod
+    def get(self, namespace: str, key: str, default=None):
+        """The value stored for key, or default if it is missing or expired"""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value, ttl: float = None):
+        """Store value under key, expiring after ttl seconds (None keeps it until deleted)"""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        """Remove key if it is present"""
+
+    @abstractmethod
+    def keys(self, namespace: str):
+        """Keys of a namespace that have not expired"""
+
+    @abstractmethod
+    def items(self, namespace: str):
+        """Live (key, value, expires_at) entries of a namespace, for snapshots"""
+
+    @abstractmethod
+    def restore(self, namespace: str, key: str, value, expires_at: float = None):
+        """Put back an entry with its original absolute expiry"""
+
+    @abstractmethod
+    def acquire_lock(self, name: str, ttl: float):
+        """Try to take a named lock without blocking. Returns a release token, or None if it is held"""
+
+    @abstractmethod
+    def release_lock(self, name: str, token: str):
+        """Release a lock taken with acquire_lock, unless it has since expired and been taken by someone else"""
+
+    def use_records(self, namespace: str, record_type):
+        """Store dict values of namespace as compact, read-only records where the backend holds objects"""
+        self._record_types[namespace] = record_type
+
+    def namespace(self, name: str, ttl: float = None):
+        """Dict-like view over one namespace of this backend"""
+        return CacheNamespace(self, name, ttl)
+
+    def in_flight(self, namespace: str, key: str):
+        """Whether a single_flight computation for key is running in this process"""
+        return self._flights.in_flight(f"{namespace}:{key}")
+
+    async def single_flight(self, namespace: str, key: str, compute, ttl: float = None, keep_alive: bool = False):
+        """
+        Return the cached value for key, computing it at most once across all workers
+
+        Args:
+            namespace: Cache namespace the result is stored in
+            key: Cache key inside the namespace
+            compute: Zero-argument coroutine function producing the value
+            ttl: Optional expiry in seconds for the stored value
+            keep_alive: Keep computing even if every waiter is cancelled (e.g. prefetch work)
+
+        Returns:
+            The cached or freshly computed value
+        """
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+
+        return await self._flights.run(
+            f"{namespace}:{key}",
+            lambda: self._run_flight(namespace, key, compute, ttl),
+            keep_alive=keep_alive
+        )
+
+    async def _run_flight(self, namespace: str, key: str, compute, ttl: float):
+        """Take the cross-process lock for key, then compute unless another worker already did"""
+        lock_name = f"flight:{namespace}:{key}"
+        token = self.acquire_lock(lock_name, self.lock_ttl)
+
+        # Another worker is computing this key - wait for its result or for its lease to expire
+        while token is None:
+            await asyncio.sleep(self.lock_poll_interval)
+            value = self.get(namespace, key)
+            if value is not None:
+                return value
+            token = self.acquire_lock(lock_name, self.lock_ttl)
+
+        try:
+            value = self.get(namespace, key)
+            if value is not None:
+                return value
+
+            value = await compute()
+            self.set(namespace, key, value, ttl)
+            return value
+        finally:
+            self.release_lock(lock_name, token)
+
+
+class _Flight:
+    """An in-process computation shared by every request waiting on the same key"""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+        self.keep_alive = False
+
+
+class FlightGroup:
+    """Coalesces concurrent in-process calls for the same key into one task, without caching the result"""
+
+    def __init__(self):
+        self._flights = {}
+
+    def in_flight(self, key: str):
+        return key in self._flights
+
+    def _finish(self, key: str, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def run(self, key: str, compute, keep_alive: bool = False):
+        """
+        Await compute() for key, joining the task already running for it if there is one
+
+        The task is cancelled once every waiter has been cancelled, unless some waiter
+        asked for keep_alive.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(compute()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, flight=flight: self._finish(key, flight))
+        flight.keep_alive = flight.keep_alive or keep_alive
+
+        # Shield the shared task so one cancelled waiter doesn't cancel it for everyone else
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.keep_alive and not flight.task.done():
+                print(f"No requests left waiting on {key}, cancelling its computation")
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+
+class CacheNamespace(MutableMapping):
+    """Dict-like view over one namespace, so existing dict-based code keeps working"""
+
+    def __init__(self, backend: CacheBackend, name: str, ttl: float = None):
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+
+    def __getitem__(self, key):
+        value = self.backend.get(self.name, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.backend.set(self.name, key, value, self.ttl)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.backend.delete(self.name, key)
+
+    def __contains__(self, key):
+        return self.backend.get(self.name, key) is not None
+
+    def __iter__(self):
+        return iter(self.backend.keys(self.name))
+
+    def __len__(self):
+        return len(self.backend.keys(self.name))
+
+    async def single_flight(self, key: str, compute, keep_alive: bool = False):
+        """Compute and store key at most once across workers"""
+        return await self.backend.single_flight(self.name, key, compute, self.ttl, keep_alive=keep_alive)
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Process-local backend. Fast, but every worker holds its own copy"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._data = {}
+        self._locks = {}
+        self._mutex = threading.Lock()
+
+    def get(self, namespace: str, key: str, default=None):
+        with self._mutex:
+            entry = self._data.get(namespace, {}).get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[namespace][key]
+                return default
+            return value
+
+    def _pack(self, namespace: str, value):
+        record_type = self._record_types.get(namespace)
+        return pack_record(record_type, value) if record_type else value
+
+    def set(self, namespace: str, key: str, value, ttl: float = None):
+        expires_at = time.time() + ttl if ttl else None
+        value = self._pack(namespace, value)
+        with self._mutex:
+            self._data.setdefault(namespace, {})[key] = (value, expires_at)
+
+    def delete(self, namespace: str, key: str):
+        with self._mutex:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def keys(self, namespace: str):
+        now = time.time()
+        with self._mutex:
+            return [
+                key for key, (_, expires_at) in self._data.get(namespace, {}).items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def items(self, namespace: str):
+        now = time.time()
+        with self._mutex:
+            return [
+                (key, to_plain(value), expires_at) for key, (value, expires_at) in self._data.get(namespace, {}).items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def restore(self, namespace: str, key: str, value, expires_at: float = None):
+        value = self._pack(namespace, value)
+        with self._mutex:
+            self._data.setdefault(namespace, {})[key] = (value, expires_at)
+
+    def acquire_lock(self, name: str, ttl: float):
+        now = time.time()
+        with self._mutex:
+            held = self._locks.get(name)
+            if held and held[1] > now:
+                return None
+            token = uuid.uuid4().hex
+            self._locks[name] = (token, now + ttl)
+            return token
+
+    def release_lock(self, name: str, token: str):
+        with self._mutex:
+            held = self._locks.get(name)
+            if held and held[0] == token:
+                del self._locks[name]
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Backend shared by every worker on the host through a WAL-mode SQLite file"""
+
+    def __init__(self, path: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path or os.getenv('CACHE_DB_PATH') or data_path("cache.db")
+        self._conn = None
+        self._conn_pid = None
+        self._mutex = threading.Lock()
+
+    def _db(self):
+        """Return this process's connection (connections must not cross a fork)"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = connect_sqlite(self.path)
+            self._conn_pid = os.getpid()
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS locks (
+                    name TEXT PRIMARY KEY,
+                    token TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        return self._conn
+
+    def get(self, namespace: str, key: str, default=None):
+        with self._mutex:
+            row = self._db().execute(
+                "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+
+        if row is None:
+            return default
+
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(namespace, key)
+            return default
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value, ttl: float = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._mutex:
+            self._db().execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, default=str), expires_at)
+            )
+
+    def delete(self, namespace: str, key: str):
+        with self._mutex:
+            self._db().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def keys(self, namespace: str):
+        with self._mutex:
+            rows = self._db().execute(
+                "SELECT key FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, time.time())
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def items(self, namespace: str):
+        with self._mutex:
+            rows = self._db().execute(
+                "SELECT key, value, expires_at FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, time.time())
+            ).fetchall()
+        return [(key, json.loads(value), expires_at) for key, value, expires_at in rows]
+
+    def restore(self, namespace: str, key: str, value, expires_at: float = None):
+        with self._mutex:
+            self._db().execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, default=str), expires_at)
+            )
+
+    def acquire_lock(self, name: str, ttl: float):
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._mutex:
+            db = self._db()
+            # BEGIN IMMEDIATE serializes lock takers across processes
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT expires_at FROM locks WHERE name = ?", (name,)).fetchone()
+                if row is not None and row[0] > now:
+                    db.execute("COMMIT")
+                    return None
+                db.execute(
+                    "INSERT OR REPLACE INTO locks (name, token, expires_at) VALUES (?, ?, ?)",
+                    (name, token, now + ttl)
+                )
+                db.execute("COMMIT")
+                return token
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def release_lock(self, name: str, token: str):
+        with self._mutex:
+            self._db().execute("DELETE FROM locks WHERE name = ? AND token = ?", (name, token))
+
+
+def create_cache_backend():
+    """Build the cache backend selected by the CACHE_BACKEND environment variable ('memory' or 'sqlite')"""
+    backend_type = os.getenv('CACHE_BACKEND', 'memory').lower()
+    lock_ttl = float(os.getenv('CACHE_LOCK_TTL', 300))
+
+    if backend_type == 'sqlite':
+        backend = SQLiteCacheBackend(lock_ttl=lock_ttl)
+        print(f"Using shared SQLite cache backend at {backend.path}")
+        return backend
+
+    if backend_type != 'memory':
+        print(f"Unknown CACHE_BACKEND '{backend_type}', falling back to in-memory cache")
+    return MemoryCacheBackend(lock_ttl=lock_ttl)
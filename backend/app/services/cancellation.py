@@ -0,0 +1,59 @@
+# cancellation.py
+
+import asyncio
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Status code reported (and logged) when the client went away before we finished
+CLIENT_CLOSED_REQUEST = 499
+
+
+class ClientDisconnected(Exception):
+    """Raised when the HTTP client disconnected while its pipeline was still running"""
+
+
+async def run_until_disconnected(request, coro, poll_interval: float = None):
+    """
+    Run a pipeline coroutine, cancelling it as soon as the HTTP client disconnects
+
+    Cancellation propagates into the pipeline's subtasks, so stages that have not
+    started yet never run. Work shared through single_flight() keeps running as long
+    as another request is still waiting on it.
+
+    Args:
+        request: Starlette request used to watch for the disconnect
+        coro: Coroutine running the pipeline
+        poll_interval: Seconds between disconnect checks (DISCONNECT_POLL_INTERVAL, default 0.5)
+
+    Returns:
+        The coroutine's result
+
+    Raises:
+        ClientDisconnected: If the client went away first
+    """
+    if poll_interval is None:
+        poll_interval = float(os.getenv('DISCONNECT_POLL_INTERVAL', 0.5))
+
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+
+            if await request.is_disconnected():
+                print(f"Client disconnected from {request.url.path}, cancelling pipeline")
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    print(f"Pipeline raised while cancelling: {e}")
+                raise ClientDisconnected(request.url.path)
+    finally:
+        # The handler itself was cancelled (e.g. server shutdown) - don't leave the pipeline behind
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,196 @@
+# chat.py
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+UNKNOWN_SYMBOL_REPLY = (
+    "I'm not sure which cryptocurrency you're asking about. "
+    "Could you mention a specific crypto symbol like BTC, ETH, or SOL?"
+)
+
+
+class ChatOrchestrator:
+    """
+    Answers one chat turn server-side: routes the message, then runs only the stages it needs
+
+    A new symbol asked about generally costs the one pipeline run whose combined
+    analysis is the answer, instead of a blocking analysis followed by a follow-up
+    round trip; predictions, strategies and policy questions skip the full pipeline.
+    """
+
+    def __init__(self, container):
+        self.container = container
+        self.max_turns = int(os.getenv('CHAT_SESSION_TURNS', 20))
+        self.sessions = container.cache_backend.namespace(
+            "sessions", ttl=float(os.getenv('CHAT_SESSION_TTL', 86400)) or None
+        )
+
+    def load_session(self, session_id: str = None):
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            session = {"id": session_id or uuid.uuid4().hex, "current_symbol": None, "turns": []}
+        return session
+
+    async def save_session(self, session_id: str, message: str, reply: dict):
+        """
+        Append one exchange to the stored session
+
+        The session is reloaded under a cross-worker lock, so messages answered
+        concurrently (here or on another worker) all keep their turns.
+        """
+        lock = f"chat-session:{session_id}"
+        token = self.container.cache_backend.acquire_lock(lock, ttl=5)
+        for _ in range(50):
+            if token is not None:
+                break
+            await asyncio.sleep(0.02)
+            token = self.container.cache_backend.acquire_lock(lock, ttl=5)
+        try:
+            session = self.load_session(session_id)
+            session["turns"] = (session["turns"] + [
+                {"role": "user", "content": message, "at": time.time()},
+                {"role": "assistant", "content": reply["content"], "symbol": reply["symbol"], "intent": reply["intent"]}
+            ])[-self.max_turns:]
+            if reply["symbol"]:
+                session["current_symbol"] = reply["symbol"]
+            self.sessions[session_id] = session
+        finally:
+            if token is not None:
+                self.container.cache_backend.release_lock(lock, token)
+
+    async def _followup(self, symbol: str, message: str):
+        """Answer a question against the symbol's analysis, running the pipeline only if none is cached"""
+        analysis_system = self.container.analysis_system
+        
+        # Retrieval for the question runs alongside the analysis; handle_followup then hits its cache
+        cached, _ = await asyncio.gather(
+            self.container.ensure_analysis(symbol),
+            self.container.sentiment_agent.retrieve_context(symbol, message)
+        )
+
+        if symbol not in analysis_system.context:
+            analysis_system.context[symbol] = {
+                "market": cached["market_analysis"],
+                "sentiment": cached["sentiment_analysis"],
+                "sentiment_score": cached.get("sentiment_score", 50),
+                "sources": cached.get("sources", [])
+            }
+        result = await analysis_system.handle_followup(symbol, message)
+        return result["response"], result
+
+    async def _run_intent(self, route: dict, message: str, notify):
+        """Run the stages for a routed message; returns (content, result with sentiment/sources)"""
+        analysis_system = self.container.analysis_system
+        symbol = route["symbol"]
+        intent = route["intent"]
+
+        if intent == "compare" and len(route["symbols"]) >= 2:
+            await notify("status", {"stage": "compare", "symbols": route["symbols"]})
+            summary = await analysis_system.compare_assets(route["symbols"], synthesize=route["synthesize"])
+            if "error" in summary:
+                return summary["error"], {}
+            if route["synthesize"]:
+                return summary["synthesis"], {}
+            from services.analytics import format_comparison
+            return format_comparison(summary), {}
+
+        if intent == "predict":
+            await notify("status", {"stage": "predict", "timeframe": route["timeframe"]})
+            result = await analysis_system.predict_price_movement(symbol, route["timeframe"] or "month")
+            return result["prediction"], result
+
+        if intent == "strategy":
+            await notify("status", {"stage": "strategy"})
+            result = await analysis_system.optimal_trading_strategy(symbol, message)
+            return result["strategy"], result
+
+        if intent == "policy":
+            await notify("status", {"stage": "policy"})
+            result = await analysis_system.analyze_policy_impact(symbol, message)
+            return result["impact_analysis"], result
+
+        if intent == "analyze":
+            # The combined analysis is the answer; no extra follow-up call (under load, even a stale one)
+            await notify("status", {"stage": "analyze"})
+            cached = self.container.cached_analysis(symbol, allow_stale=self.container.admission.under_pressure)
+            if cached is None:
+                cached = await self.container.ensure_analysis(symbol)
+            return cached["combined_analysis"], cached
+
+        await notify("status", {"stage": "followup"})
+        return await self._followup(symbol, message)
+
+    async def respond(self, message: str, session_id: str = None, notify=None):
+        """
+        Answer one user message
+
+        Args:
+            message: User message
+            session_id: Existing session id, or None to start a new session
+            notify: Optional async callback(event, data) for progress events
+
+        Returns:
+            Reply dictionary (content, symbol, intent, sentiment_score, sources, session_id)
+        """
+        async def no_events(event, data):
+            pass
+
+        notify = notify or no_events
+        session = self.load_session(session_id)
+        route = self.container.router.route(message, session["current_symbol"])
+        await notify("route", {
+            "session_id": session["id"],
+            "symbol": route["symbol"],
+            "symbols": route["symbols"],
+            "intent": route["intent"]
+        })
+
+        if not route["symbol"]:
+            content, result = UNKNOWN_SYMBOL_REPLY, {}
+        else:
+            content, result = await self._run_intent(route, message, notify)
+
+        reply = {
+            "session_id": session["id"],
+            "symbol": route["symbol"],
+            "symbols": route["symbols"],
+            "intent": route["intent"],
+            "content": content,
+            "sentiment_score": result.get("sentiment_score", 50),
+            "sources": result.get("sources", []),
+            "sources_count": result.get("sources_count", 0)
+        }
+        await self.save_session(session["id"], message, reply)
+        return reply
+
+    async def stream(self, message: str, session_id: str = None):
+        """Yield Server-Sent Events: route, status updates, then the message (or an error)"""
+        queue = asyncio.Queue()
+
+        async def notify(event, data):
+            await queue.put((event, data))
+
+        async def run():
+            try:
+                reply = await self.respond(message, session_id, notify)
+                await queue.put(("message", reply))
+            except Exception as e:
+                print(f"Error handling chat message: {e}")
+                await queue.put(("error", {"detail": str(e)}))
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event, data = await queue.get()
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                if event in ("message", "error"):
+                    break
+        finally:
+            # The client went away mid-answer: stop the pipeline too
+            task.cancel()
@@ -0,0 +1,68 @@
+# conditional.py
+
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from services.fingerprint import analysis_version
+
+
+def analysis_etag(analysis):
+    # A stale analysis is served with a different body ("stale": true), so it gets its own tag
+    return f'"{analysis_version(analysis)}{"-stale" if analysis.get("stale") else ""}"'
+
+
+def validator_headers(analysis):
+    """ETag and (when the generation time is known) Last-Modified headers for an analysis"""
+    headers = {"ETag": analysis_etag(analysis), "Cache-Control": "no-cache"}
+    if analysis.get("generated_at"):
+        headers["Last-Modified"] = formatdate(analysis["generated_at"], usegmt=True)
+    return headers
+
+
+def is_not_modified(request, analysis):
+    """
+    Whether the client's copy is current
+
+    If-None-Match wins over If-Modified-Since, as in RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etag = analysis_etag(analysis)
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and analysis.get("generated_at"):
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(analysis["generated_at"]) <= since
+    return False
+
+
+def analysis_response(request, analysis):
+    """304 with validators only if the client's copy is current, else the analysis as JSON"""
+    headers = validator_headers(analysis)
+    if is_not_modified(request, analysis):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(jsonable_encoder(analysis), headers=headers)
+
+
+def analysis_status(symbol: str, analysis, computing: bool = False):
+    """Existence and freshness of a symbol's analysis, without its content"""
+    if analysis is None:
+        return {"symbol": symbol, "exists": False, "computing": computing}
+
+    generated_at = analysis.get("generated_at")
+    return {
+        "symbol": symbol,
+        "exists": True,
+        "computing": computing,
+        "stale": bool(analysis.get("stale")),
+        "version": analysis_version(analysis),
+        "etag": analysis_etag(analysis),
+        "generated_at": generated_at,
+        "age_seconds": round(time.time() - generated_at, 1) if generated_at else None
+    }
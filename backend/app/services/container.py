@@ -0,0 +1,374 @@
+# container.py
+
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from services.cache_backend import create_cache_backend
+from services.fingerprint import analysis_version
+from services.records import AnalysisRecord, ContextRecord, StageRecord
+
+load_dotenv()
+
+
+class AgentContainer:
+    """Lazily builds one shared set of clients and agents per worker process"""
+
+    def __init__(self, cache_backend=None):
+        self.cache_backend = cache_backend or create_cache_backend()
+        self.analysis_ttl = float(os.getenv('ANALYSIS_CACHE_TTL', 0)) or None
+
+        # Hold cached analyses, follow-up context and stage outputs as slotted records sharing
+        # their texts and sources (chat sessions are mutated in place, so they stay dicts)
+        if os.getenv('CACHE_COMPACT_RECORDS', '1') != '0':
+            self.cache_backend.use_records("analysis", AnalysisRecord)
+            self.cache_backend.use_records("context", ContextRecord)
+            self.cache_backend.use_records("stages", StageRecord)
+
+        # Cache for analysis results
+        self.analysis_cache = self.cache_backend.namespace("analysis", ttl=self.analysis_ttl)
+
+        self._openai_client = None
+        self._sentiment_store = None
+        self._news_collector = None
+        self._tweet_collector = None
+        self._ingestion = None
+        self._router = None
+        self._chat = None
+        self._prefetcher = None
+        self._reports = None
+        self._admission = None
+        self._bar_store = None
+        self._bar_aggregator = None
+        self.market_stream_service = None
+        self.cache_snapshotter = None
+        self._backtest_store = None
+        self._alert_engine = None
+        # This worker's event loop (set by the app lifespan), for alerts fired from threads
+        self.loop = None
+        self._data_agent = None
+        self._sentiment_agent = None
+        self._analysis_system = None
+        self._lock = threading.RLock()
+
+    @property
+    def openai_client(self):
+        """Single OpenAI client shared by every agent"""
+        if self._openai_client is None:
+            with self._lock:
+                if self._openai_client is None:
+                    from openai import OpenAI
+                    self._openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        return self._openai_client
+
+    @property
+    def sentiment_store(self):
+        """Append-only store of every sentiment score produced by this host"""
+        if self._sentiment_store is None:
+            with self._lock:
+                if self._sentiment_store is None:
+                    from services.sentiment_store import SentimentStore
+                    store = SentimentStore()
+                    store.listeners.append(self._alert_on_sentiment)
+                    self._sentiment_store = store
+        return self._sentiment_store
+
+    @property
+    def news_collector(self):
+        """Incremental NewsAPI collector backed by the local article store"""
+        if self._news_collector is None:
+            with self._lock:
+                if self._news_collector is None:
+                    from services.news_collector import NewsCollector
+                    self._news_collector = NewsCollector()
+        return self._news_collector
+
+    @property
+    def tweet_collector(self):
+        """Incremental Twitter recent-search collector backed by the local tweet store"""
+        if self._tweet_collector is None:
+            with self._lock:
+                if self._tweet_collector is None:
+                    from services.tweet_collector import TweetCollector
+                    self._tweet_collector = TweetCollector()
+        return self._tweet_collector
+
+    @property
+    def ingestion(self):
+        """Background chunking/embedding pipeline feeding the sentiment vector store"""
+        if self._ingestion is None:
+            with self._lock:
+                if self._ingestion is None:
+                    from services.ingestion import IngestionPipeline
+                    self._ingestion = IngestionPipeline(lambda: self.sentiment_agent.vector_db)
+        return self._ingestion
+
+    async def stop_ingestion(self):
+        if self._ingestion is not None:
+            await self._ingestion.stop()
+
+    @property
+    def router(self):
+        """Symbol resolver and intent classifier shared by every chat entry point"""
+        if self._router is None:
+            with self._lock:
+                if self._router is None:
+                    from services.router import create_router
+                    polygon = self.data_agent.polygon if os.getenv('SYMBOL_REGISTRY_POLYGON') == '1' else None
+                    self._router = create_router(polygon_client=polygon)
+        return self._router
+
+    @property
+    def chat(self):
+        """Server-side chat orchestration with per-session state"""
+        if self._chat is None:
+            with self._lock:
+                if self._chat is None:
+                    from services.chat import ChatOrchestrator
+                    self._chat = ChatOrchestrator(self)
+        return self._chat
+
+    @property
+    def prefetcher(self):
+        """Background warm-ups for symbols users are about to ask about"""
+        if self._prefetcher is None:
+            with self._lock:
+                if self._prefetcher is None:
+                    from services.prefetch import Prefetcher
+                    self._prefetcher = Prefetcher(self)
+        return self._prefetcher
+
+    @property
+    def reports(self):
+        """Batch report jobs: analyses with bounded concurrency, rendered in a process pool"""
+        if self._reports is None:
+            with self._lock:
+                if self._reports is None:
+                    from services.reports import ReportService
+                    self._reports = ReportService(self)
+        return self._reports
+
+    async def stop_reports(self):
+        if self._reports is not None:
+            await self._reports.stop()
+
+    @property
+    def admission(self):
+        """Global and per-client caps on concurrently running LLM pipelines"""
+        if self._admission is None:
+            with self._lock:
+                if self._admission is None:
+                    from services.admission import AdmissionController
+                    self._admission = AdmissionController()
+        return self._admission
+
+    @property
+    def bar_store(self):
+        """Local OHLCV history shared by every worker on the host"""
+        if self._bar_store is None:
+            with self._lock:
+                if self._bar_store is None:
+                    from services.bar_store import BarStore
+                    self._bar_store = BarStore()
+        return self._bar_store
+
+    @property
+    def bar_aggregator(self):
+        """In-memory 1m/5m/1h/1d bars rolled up from the live trade stream"""
+        if self._bar_aggregator is None:
+            with self._lock:
+                if self._bar_aggregator is None:
+                    from services.market_stream import BarAggregator
+                    aggregator = BarAggregator(bar_store=self.bar_store)
+                    aggregator.listeners.append(self._alert_on_bar)
+                    self._bar_aggregator = aggregator
+        return self._bar_aggregator
+
+    def start_market_stream(self):
+        """Start streaming trades into the bar aggregator if MARKET_STREAM is configured"""
+        from services.market_stream import create_market_stream
+        self.market_stream_service = create_market_stream(self.bar_aggregator)
+        if self.market_stream_service:
+            self.market_stream_service.start()
+
+    async def stop_market_stream(self):
+        if self.market_stream_service:
+            await self.market_stream_service.stop()
+            self.market_stream_service = None
+
+    def start_cache_snapshots(self):
+        """Restore the hot caches from the last snapshot, then keep snapshotting them
+
+        CACHE_SNAPSHOT=auto (default) only does this for the in-memory backend, since the
+        SQLite backend already survives restarts; 1 forces it on, 0 turns it off.
+        """
+        from services.cache_backend import MemoryCacheBackend
+        from services.snapshot import CacheSnapshotter
+        
+        mode = os.getenv('CACHE_SNAPSHOT', 'auto').lower()
+        if mode == '0' or (mode == 'auto' and not isinstance(self.cache_backend, MemoryCacheBackend)):
+            return
+        self.cache_snapshotter = CacheSnapshotter(self.cache_backend)
+        self.cache_snapshotter.restore()
+        self.cache_snapshotter.start()
+
+    async def stop_cache_snapshots(self):
+        if self.cache_snapshotter:
+            await self.cache_snapshotter.stop()
+            self.cache_snapshotter = None
+
+    @property
+    def alert_engine(self):
+        """Alert rules, evaluated as new bars and sentiment points arrive"""
+        if self._alert_engine is None:
+            with self._lock:
+                if self._alert_engine is None:
+                    from services.alerts import AlertEngine
+                    engine = AlertEngine(
+                        sentiment_store=self.sentiment_store,
+                        bar_store=self.bar_store,
+                        bar_aggregator=self.bar_aggregator
+                    )
+                    engine.bind_loop(self.loop)
+                    self._alert_engine = engine
+        return self._alert_engine
+
+    # The stores forward to the alert engine, which is only built once the first bar or score arrives
+
+    def _alert_on_bar(self, symbol: str, timeframe: str, bar: dict):
+        self.alert_engine.on_bar(symbol, timeframe, bar)
+
+    def _alert_on_sentiment(self, symbol: str, score: float, timestamp: float):
+        self.alert_engine.on_sentiment(symbol, score, timestamp)
+
+    @property
+    def backtest_store(self):
+        if self._backtest_store is None:
+            with self._lock:
+                if self._backtest_store is None:
+                    from services.backtest import BacktestStore
+                    self._backtest_store = BacktestStore(self.bar_store)
+        return self._backtest_store
+
+    @property
+    def data_agent(self):
+        if self._data_agent is None:
+            with self._lock:
+                if self._data_agent is None:
+                    from agents.data_agent import DataAgent
+                    self._data_agent = DataAgent(
+                        client=self.openai_client,
+                        bar_store=self.bar_store,
+                        market_stream=self.bar_aggregator
+                    )
+        return self._data_agent
+
+    @property
+    def sentiment_agent(self):
+        if self._sentiment_agent is None:
+            with self._lock:
+                if self._sentiment_agent is None:
+                    from agents.sentiment_agent import SentimentAgent
+                    self._sentiment_agent = SentimentAgent(
+                        openai_client=self.openai_client,
+                        sentiment_store=self.sentiment_store,
+                        news_collector=self.news_collector,
+                        tweet_collector=self.tweet_collector,
+                        ingestion=self.ingestion,
+                        retrieval_cache=self.cache_backend.namespace(
+                            "retrieval", ttl=float(os.getenv('RETRIEVAL_CACHE_TTL', 600)) or None
+                        )
+                    )
+        return self._sentiment_agent
+
+    @property
+    def analysis_system(self):
+        """Main agent wired to the shared data/sentiment agents and the shared context store"""
+        if self._analysis_system is None:
+            with self._lock:
+                if self._analysis_system is None:
+                    from agents.main_agent import CryptoAnalysisSystem
+                    self._analysis_system = CryptoAnalysisSystem(
+                        context=self.cache_backend.namespace("context", ttl=self.analysis_ttl),
+                        data_agent=self.data_agent,
+                        sentiment_agent=self.sentiment_agent,
+                        client=self.openai_client,
+                        backtest_store=self.backtest_store,
+                        stage_cache=self.cache_backend.namespace(
+                            "stages", ttl=float(os.getenv('ANALYSIS_STAGE_MAX_AGE', 6 * 3600)) or None
+                        )
+                    )
+        return self._analysis_system
+
+    def cached_analysis(self, symbol: str, allow_stale: bool = False):
+        """The cached analysis for symbol without running anything, or None
+
+        With allow_stale (used under load), an analysis is reassembled from the last
+        stage outputs even after the analysis cache entry expired; it is marked stale.
+        """
+        cached = self.analysis_cache.get(symbol)
+        if cached is not None or not allow_stale:
+            return cached
+        
+        # Read the stage outputs straight from the backend; no need to build the agents for this
+        market, sentiment, combined = (
+            self.cache_backend.get("stages", f"{symbol}:{stage}") for stage in ("market", "sentiment", "combined")
+        )
+        if not (market and sentiment and combined):
+            return None
+        return {
+            "symbol": symbol,
+            "market_analysis": market["output"],
+            "sentiment_analysis": sentiment["output"]["text"],
+            "combined_analysis": combined["output"],
+            "sentiment_score": sentiment["output"]["sentiment_score"],
+            "sources": sentiment["output"]["sources"],
+            "sources_count": sentiment["output"]["sources_count"],
+            "refreshed_stages": [],
+            "stale": True
+        }
+
+    async def ensure_analysis(self, symbol: str):
+        """Return the cached analysis for symbol, running the full pipeline (once across workers) if needed"""
+        cached = self.analysis_cache.get(symbol)
+        if cached is not None:
+            return cached
+        
+        async def run_analysis():
+            result = await self.analysis_system.get_complete_analysis(symbol)
+            
+            analysis = {
+                "symbol": symbol,
+                "market_analysis": result.get("market_analysis", ""),
+                "sentiment_analysis": result.get("sentiment_analysis", ""),
+                "combined_analysis": result.get("combined_analysis", ""),
+                "sentiment_score": result.get("sentiment_score", 50),
+                "sources": result.get("sources", []),
+                "sources_count": result.get("sources_count", 0),
+                "refreshed_stages": result.get("refreshed_stages", []),
+                "generated_at": time.time()
+            }
+            # Versioned once here so conditional requests never re-hash the texts
+            analysis["version"] = analysis_version(analysis)
+            return analysis
+        
+        # Only one worker runs the pipeline for a symbol; the others wait for its cached result
+        return await self.analysis_cache.single_flight(symbol, run_analysis)
+
+    def analysis_in_flight(self, symbol: str):
+        """Whether this worker is currently running the analysis pipeline for symbol"""
+        return self.cache_backend.in_flight("analysis", symbol)
+
+    def warm_up(self):
+        """Build everything up front (useful with --preload so forked workers share the pages)"""
+        return self.analysis_system
+
+    def close(self):
+        """Release client resources held by this worker"""
+        if self._news_collector is not None:
+            self._news_collector.close()
+        if self._openai_client is not None:
+            try:
+                self._openai_client.close()
+            except Exception as e:
+                print(f"Error closing OpenAI client: {e}")
@@ -0,0 +1,108 @@
+# dedup.py
+
+import hashlib
+import math
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+URL_PATTERN = re.compile(r'https?://\S+')
+WORD_PATTERN = re.compile(r'[a-z0-9$#]+')
+
+# 64-bit fingerprints split into 8 bands of 8 bits: any two fingerprints within
+# 7 bits of each other must agree on at least one band, so banding finds every such pair
+BANDS = 8
+BAND_BITS = 8
+
+
+def _tokens(text: str):
+    text = URL_PATTERN.sub(' ', (text or '').lower())
+    return WORD_PATTERN.findall(text)
+
+
+def simhash(text: str, shingle_size: int = 1):
+    """64-bit SimHash over word shingles; near-duplicate texts get fingerprints a few bits apart
+
+    Single words work best for headlines and tweets, where one inserted word would
+    change most of the longer shingles.
+    """
+    words = _tokens(text)
+    if len(words) >= shingle_size:
+        features = [' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    else:
+        features = words
+
+    counts = [0] * 64
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            counts[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit in range(64):
+        if counts[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def cluster_weight(count: int):
+    """Prompt/score weight for a cluster: grows with log2 of its size, so mass copies can't dominate"""
+    return round(1 + math.log2(count), 2) if count > 1 else 1.0
+
+
+def collapse_near_duplicates(items, text_of, rank_of=None, max_distance: int = None):
+    """
+    Group near-duplicate items into clusters
+
+    Args:
+        items: Articles, tweets or any other records
+        text_of: Function returning the text to fingerprint for an item
+        rank_of: Optional function; the highest-ranked member becomes the representative
+                 (defaults to the first item seen)
+        max_distance: Maximum Hamming distance between fingerprints in one cluster
+                      (DEDUP_MAX_DISTANCE, default and maximum 7)
+
+    Returns:
+        List of {"representative", "count", "weight", "members"} in order of first appearance
+    """
+    if max_distance is None:
+        max_distance = min(int(os.getenv('DEDUP_MAX_DISTANCE', 7)), BANDS - 1)
+
+    items = list(items)
+    fingerprints = [simhash(text_of(item)) for item in items]
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Only items sharing a band are compared, instead of every pair
+    band_mask = (1 << BAND_BITS) - 1
+    buckets = {}
+    for index, fingerprint in enumerate(fingerprints):
+        for band in range(BANDS):
+            key = (band, fingerprint >> (band * BAND_BITS) & band_mask)
+            for other in buckets.get(key, ()):
+                if find(index) != find(other) and bin(fingerprint ^ fingerprints[other]).count('1') <= max_distance:
+                    parent[find(index)] = find(other)
+            buckets.setdefault(key, []).append(index)
+
+    groups = {}
+    for index in range(len(items)):
+        groups.setdefault(find(index), []).append(index)
+
+    clusters = []
+    for indexes in sorted(groups.values(), key=lambda group: group[0]):
+        members = [items[i] for i in indexes]
+        representative = max(members, key=rank_of) if rank_of else members[0]
+        clusters.append({
+            "representative": representative,
+            "count": len(members),
+            "weight": cluster_weight(len(members)),
+            "members": members
+        })
+    return clusters
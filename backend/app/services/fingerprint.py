@@ -0,0 +1,85 @@
+# fingerprint.py
+
+import hashlib
+import os
+from dotenv import load_dotenv
+from services.bar_store import bar_to_dict
+
+load_dotenv()
+
+
+def market_fingerprint(bars):
+    """Bar timestamps and closes; compared with a move threshold rather than for equality"""
+    bars = [bar_to_dict(bar) for bar in bars or []]
+    return {
+        "timestamps": [bar["timestamp"] for bar in bars],
+        "closes": [bar["close"] for bar in bars]
+    }
+
+
+def market_changed(old, new, move_threshold: float = None):
+    """
+    True if the bars differ materially from the ones a cached analysis was built on
+
+    A new bar (or a dropped one) is always material; otherwise some close has to have
+    moved at least move_threshold (ANALYSIS_MOVE_THRESHOLD, default 0.02 = 2%) away
+    from the reference close, so small ticks never trigger a rerun.
+    """
+    if move_threshold is None:
+        move_threshold = float(os.getenv('ANALYSIS_MOVE_THRESHOLD', 0.02))
+    if not old or old.get("timestamps") != new["timestamps"]:
+        return True
+
+    for reference, close in zip(old["closes"], new["closes"]):
+        if not reference or abs(close / reference - 1) >= move_threshold:
+            return True
+    return False
+
+
+def ids_fingerprint(**groups):
+    """Sorted, de-duplicated ID lists per group, e.g. ids_fingerprint(articles=urls, tweets=ids)"""
+    return {name: sorted({str(item) for item in ids if item}) for name, ids in groups.items()}
+
+
+def ids_changed(old, new, threshold: float = None):
+    """
+    True if any group gained enough new IDs to matter
+
+    A group changes materially when the share of its current IDs that were not in the
+    reference set reaches threshold (ANALYSIS_MATERIAL_CHANGE, default 0.25). Items
+    ageing out of a rolling window are not counted as a change.
+    """
+    if threshold is None:
+        threshold = float(os.getenv('ANALYSIS_MATERIAL_CHANGE', 0.25))
+    if not old or set(old) != set(new):
+        return True
+
+    for name, ids in new.items():
+        if not ids:
+            continue
+        added = len(set(ids) - set(old[name]))
+        if added and added / len(ids) >= threshold:
+            return True
+    return False
+
+
+def text_fingerprint(*parts):
+    """Digest of a stage's inputs that are already text (e.g. upstream stage outputs)"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update((part or "").encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def analysis_version(analysis):
+    """Content version of an analysis: changes only when what the client would see changes"""
+    if analysis.get("version"):
+        return analysis["version"]
+    return text_fingerprint(
+        analysis.get("market_analysis"),
+        analysis.get("sentiment_analysis"),
+        analysis.get("combined_analysis"),
+        str(analysis.get("sentiment_score")),
+        *(source.get("url") for source in analysis.get("sources") or [])
+    )[:16]
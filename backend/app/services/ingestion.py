@@ -0,0 +1,233 @@
+# ingestion.py
+
+import asyncio
+import hashlib
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tokenizer of the embedding model (text-embedding-ada-002 / text-embedding-3-*)
+EMBEDDING_ENCODING = os.getenv('EMBEDDING_ENCODING', 'cl100k_base')
+CHUNK_TOKENS = int(os.getenv('INGEST_CHUNK_TOKENS', 512))
+CHUNK_OVERLAP = int(os.getenv('INGEST_CHUNK_OVERLAP', 64))
+
+# Per-request embedding limits: inputs per call and total tokens per call
+MAX_BATCH_INPUTS = int(os.getenv('INGEST_MAX_BATCH_INPUTS', 1000))
+MAX_BATCH_TOKENS = int(os.getenv('INGEST_MAX_BATCH_TOKENS', 250000))
+
+_encoders = {}
+
+
+def _encoder(name: str):
+    """tiktoken encoding, or None when tiktoken (or its encoding file) is unavailable"""
+    if name not in _encoders:
+        try:
+            import tiktoken
+            _encoders[name] = tiktoken.get_encoding(name)
+        except Exception:
+            _encoders[name] = None
+    return _encoders[name]
+
+
+def split_tokens(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP,
+                 encoding: str = EMBEDDING_ENCODING):
+    """
+    Split text into overlapping windows of at most chunk_tokens tokens
+
+    Without tiktoken, windows are cut on whitespace at roughly 4 characters per token.
+
+    Returns:
+        List of (chunk, token_count)
+    """
+    step = max(1, chunk_tokens - overlap)
+    enc = _encoder(encoding)
+    if enc is not None:
+        tokens = enc.encode(text, disallowed_special=())
+        return [
+            (enc.decode(tokens[start:start + chunk_tokens]), len(tokens[start:start + chunk_tokens]))
+            for start in range(0, max(1, len(tokens) - overlap), step)
+            if tokens[start:start + chunk_tokens]
+        ]
+
+    words = text.split()
+    words_per_token = 0.75
+    size = max(1, int(chunk_tokens * words_per_token))
+    word_step = max(1, int(step * words_per_token))
+    chunks = []
+    for start in range(0, max(1, len(words) - int(overlap * words_per_token)), word_step):
+        chunk = " ".join(words[start:start + size])
+        if chunk:
+            chunks.append((chunk, len(chunk) // 4 + 1))
+    return chunks
+
+
+def article_documents(symbol: str, articles):
+    """Turn NewsAPI-shaped articles into (doc_id, text, metadata) documents"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    documents = []
+    for article in articles:
+        title = article.get('title') or ''
+        text = f"TITLE: {title}\nDESCRIPTION: {article.get('description') or ''}\nCONTENT: {article.get('content') or ''}"
+        key = article.get('url') or title
+        documents.append((
+            f"{symbol}:{hashlib.sha1(key.encode()).hexdigest()[:16]}",
+            text,
+            {
+                "symbol": symbol,
+                "date": today,
+                "title": title,
+                "url": article.get('url') or "",
+                "published_at": article.get('publishedAt') or ""
+            }
+        ))
+    return documents
+
+
+def chunk_documents(documents, chunk_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP,
+                    encoding: str = EMBEDDING_ENCODING):
+    """
+    Chunk documents by tokens (CPU-bound; runs in the ingestion process pool)
+
+    Chunk ids are derived from the document id, so re-ingesting an article upserts
+    its chunks instead of duplicating them.
+
+    Returns:
+        List of (chunk_id, text, metadata, token_count)
+    """
+    chunks = []
+    for doc_id, text, metadata in documents:
+        for index, (chunk, token_count) in enumerate(split_tokens(text, chunk_tokens, overlap, encoding)):
+            chunks.append((f"{doc_id}:{index}", chunk, {**metadata, "chunk": index}, token_count))
+    return chunks
+
+
+def write_groups(chunks, max_inputs: int = MAX_BATCH_INPUTS, max_tokens: int = MAX_BATCH_TOKENS):
+    """Group chunks so each group is one embedding request and one vector store write"""
+    group, group_tokens = [], 0
+    for chunk in chunks:
+        if group and (len(group) >= max_inputs or group_tokens + chunk[3] > max_tokens):
+            yield group
+            group, group_tokens = [], 0
+        group.append(chunk)
+        group_tokens += chunk[3]
+    if group:
+        yield group
+
+
+def write_chunks(vector_db, chunks):
+    """Embed and upsert chunks in grouped writes; returns the number of writes"""
+    writes = 0
+    for group in write_groups(chunks):
+        vector_db.add_texts(
+            [chunk[1] for chunk in group],
+            metadatas=[chunk[2] for chunk in group],
+            ids=[chunk[0] for chunk in group]
+        )
+        writes += 1
+    return writes
+
+
+class IngestionPipeline:
+    """
+    Background vector store ingestion
+
+    Articles submitted from any symbol's analysis are buffered for INGEST_FLUSH_INTERVAL
+    seconds, chunked by tokens in a process pool, embedded in batches sized to the
+    provider's limits and written to the vector store in grouped upserts. Submitting
+    never blocks, so sentiment requests never wait on ingestion.
+    """
+
+    def __init__(self, get_vector_db):
+        """
+        Args:
+            get_vector_db: Callable returning the vector store (or None); called off the event loop
+        """
+        self.get_vector_db = get_vector_db
+        self.flush_interval = float(os.getenv('INGEST_FLUSH_INTERVAL', 2))
+        self.max_pending = int(os.getenv('INGEST_MAX_PENDING', 2000))
+        self.workers = int(os.getenv('INGEST_WORKERS', 2))
+
+        self._pending = []
+        self._wakeup = None
+        self._task = None
+        self._pool = None
+
+    def submit(self, symbol: str, articles):
+        """Queue articles for ingestion and return immediately"""
+        documents = article_documents(symbol, articles)
+        if not documents:
+            return 0
+
+        self._pending.extend(documents)
+        if len(self._pending) > self.max_pending:
+            dropped = len(self._pending) - self.max_pending
+            del self._pending[:dropped]
+            print(f"Ingestion backlog full, dropped {dropped} oldest articles")
+
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return len(documents)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Let articles from other symbols' analyses join this batch
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            batch, self._pending = self._pending, []
+            try:
+                await self._ingest(batch)
+            except Exception as e:
+                print(f"Error ingesting articles into vector database: {e}")
+
+    async def _chunk(self, documents):
+        if self.workers > 0:
+            try:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                return await asyncio.get_running_loop().run_in_executor(self._pool, chunk_documents, documents)
+            except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+                print(f"Chunking process pool unavailable, chunking in a thread: {e}")
+                self._pool = None
+                self.workers = 0
+        return await asyncio.to_thread(chunk_documents, documents)
+
+    async def _ingest(self, documents):
+        if not documents:
+            return
+        vector_db = await asyncio.to_thread(self.get_vector_db)
+        if vector_db is None:
+            return
+
+        started = time.time()
+        chunks = await self._chunk(documents)
+        writes = await asyncio.to_thread(write_chunks, vector_db, chunks)
+        print(f"Ingested {len(chunks)} chunks from {len(documents)} articles in {writes} writes ({time.time() - started:.1f}s)")
+
+    async def stop(self):
+        """Stop the background task, ingest what is still queued and shut the pool down"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        batch, self._pending = self._pending, []
+        try:
+            await self._ingest(batch)
+        except Exception as e:
+            print(f"Error ingesting articles into vector database: {e}")
+
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.shutdown)
+            self._pool = None
@@ -0,0 +1,260 @@
+# market_stream.py
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bar timeframes kept in memory: name -> (seconds, ring buffer capacity)
+TIMEFRAMES = {
+    '1m': (60, 1440),
+    '5m': (300, 2016),
+    '1h': (3600, 720),
+    '1d': (86400, 365)
+}
+
+
+class BarAggregator:
+    """Rolls individual trades into 1m/5m/1h/1d OHLCV bars, kept in per-symbol ring buffers"""
+
+    def __init__(self, bar_store=None, timeframes: dict = None):
+        self.timeframes = timeframes or TIMEFRAMES
+        self.bar_store = bar_store
+
+        # (symbol, timeframe) -> deque of closed bars, and (symbol, timeframe) -> the bar being built
+        self._closed = {}
+        self._current = {}
+        self._last_trade = {}
+        # symbol -> time.monotonic() when this worker received its latest trade; replayed
+        # trades carry old timestamps, so freshness is judged by arrival, not trade time
+        self._received = {}
+
+        # (symbol, timeframe, bucket_start) of bars this worker only saw from partway through
+        # (the stream started or reconnected mid-bucket): their open, high, low and volume are incomplete
+        self._partial = set()
+        self._lock = threading.Lock()
+
+        # Callbacks run as listener(symbol, timeframe, bar) whenever a bar closes
+        self.listeners = []
+
+    def add_trade(self, symbol: str, price: float, size: float, timestamp_ms: int):
+        """Fold one trade into every timeframe's current bar"""
+        symbol = symbol.upper()
+        closed_bars = []
+
+        with self._lock:
+            self._last_trade[symbol] = (price, timestamp_ms)
+            self._received[symbol] = time.monotonic()
+
+            for timeframe, (seconds, capacity) in self.timeframes.items():
+                key = (symbol, timeframe)
+                bucket_start = timestamp_ms // (seconds * 1000) * seconds * 1000
+                bar = self._current.get(key)
+
+                if bar is None or bucket_start > bar["timestamp"]:
+                    if bar is not None:
+                        closed = self._closed.setdefault(key, deque(maxlen=capacity))
+                        if len(closed) == capacity:
+                            self._partial.discard((symbol, timeframe, closed[0]["timestamp"]))
+                        closed.append(bar)
+                        closed_bars.append((timeframe, bar, (symbol, timeframe, bar["timestamp"]) in self._partial))
+
+                    # Only a bucket that directly follows one we were already building was seen from its start
+                    if bar is None or bucket_start != bar["timestamp"] + seconds * 1000:
+                        self._partial.add((symbol, timeframe, bucket_start))
+                    self._current[key] = {
+                        "timestamp": bucket_start,
+                        "open": price,
+                        "high": price,
+                        "low": price,
+                        "close": price,
+                        "volume": size
+                    }
+                elif bucket_start == bar["timestamp"]:
+                    bar["high"] = max(bar["high"], price)
+                    bar["low"] = min(bar["low"], price)
+                    bar["close"] = price
+                    bar["volume"] += size
+                # Trades for buckets that already closed arrive too late to matter and are dropped
+
+        for timeframe, bar, partial in closed_bars:
+            self._on_bar_closed(symbol, timeframe, bar, partial)
+
+    def _on_bar_closed(self, symbol: str, timeframe: str, bar: dict, partial: bool = False):
+        # Finished daily bars also go to the bar store, so backtests and analytics see them;
+        # a partial one would overwrite the complete REST bar, so it is never stored
+        if timeframe == '1d' and self.bar_store and not partial:
+            try:
+                self.bar_store.record_bars(symbol, [bar], "day")
+            except Exception as e:
+                print(f"Error storing streamed {symbol} bar: {e}")
+
+        for listener in self.listeners:
+            try:
+                listener(symbol, timeframe, bar)
+            except Exception as e:
+                print(f"Error in bar listener: {e}")
+
+    def get_bars(self, symbol: str, timeframe: str = '1d', limit: int = None, include_current: bool = True):
+        """Return bars oldest first, including the still-open bar unless include_current is False"""
+        key = (symbol.upper(), timeframe)
+        with self._lock:
+            closed = self._closed.get(key, ())
+            # Copy only the bars that will be returned
+            start = max(0, len(closed) - limit) if limit else 0
+            bars = [dict(closed[index]) for index in range(start, len(closed))]
+            current = self._current.get(key)
+            if include_current and current is not None:
+                bars.append(dict(current))
+        return bars[-limit:] if limit else bars
+
+    def partial_timestamps(self, symbol: str, timeframe: str = '1d'):
+        """Start times of the symbol's bars that were only seen from partway through their bucket"""
+        symbol = symbol.upper()
+        with self._lock:
+            return {start for key_symbol, key_timeframe, start in self._partial
+                    if key_symbol == symbol and key_timeframe == timeframe}
+
+    def last_price(self, symbol: str):
+        """(price, timestamp_ms) of the latest trade, or None"""
+        with self._lock:
+            return self._last_trade.get(symbol.upper())
+
+    def is_fresh(self, symbol: str, max_age: float = None):
+        """True if a trade for symbol arrived within max_age seconds (STREAM_STALE_SECONDS, default 120)"""
+        if max_age is None:
+            max_age = float(os.getenv('STREAM_STALE_SECONDS', 120))
+        with self._lock:
+            received = self._received.get(symbol.upper())
+        return received is not None and time.monotonic() - received <= max_age
+
+
+class PolygonTradeSource:
+    """Live crypto trades from the Polygon websocket feed"""
+
+    def __init__(self, symbols, api_key: str = None):
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.api_key = api_key or os.getenv('POLYGON_API_KEY')
+        self._client = None
+
+    async def run(self, on_trade):
+        from polygon import WebSocketClient
+        from polygon.websocket.models import Market
+
+        subscriptions = [f"XT.{symbol}-USD" for symbol in self.symbols] or ["XT.*"]
+        self._client = WebSocketClient(api_key=self.api_key, market=Market.Crypto, subscriptions=subscriptions)
+
+        async def process(messages):
+            for message in messages:
+                pair = getattr(message, "pair", None)
+                if not pair or not pair.endswith("-USD"):
+                    continue
+                on_trade(pair[:-4], message.price, message.size or 0, message.timestamp)
+
+        print(f"Streaming trades for {', '.join(self.symbols) or 'all pairs'} from Polygon")
+        await self._client.connect(process)
+
+    async def close(self):
+        if self._client:
+            await self._client.close()
+
+
+class ReplayTradeSource:
+    """
+    Replays trades from a JSON-lines file, one {"symbol", "price", "size", "timestamp"} object per line
+
+    A local stand-in for the websocket feed in tests and development. speed=0 replays as fast
+    as possible; speed=1 follows the recorded timestamps in real time.
+    """
+
+    def __init__(self, path: str, speed: float = 0):
+        self.path = path
+        self.speed = speed
+
+    async def run(self, on_trade):
+        print(f"Replaying trades from {self.path}")
+        previous_timestamp = None
+
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                trade = json.loads(line)
+                timestamp = int(trade["timestamp"])
+
+                if self.speed and previous_timestamp is not None and timestamp > previous_timestamp:
+                    await asyncio.sleep((timestamp - previous_timestamp) / 1000 / self.speed)
+                else:
+                    # Let other tasks run between trades even at full speed
+                    await asyncio.sleep(0)
+                previous_timestamp = timestamp
+
+                on_trade(trade["symbol"], float(trade["price"]), float(trade.get("size", 0)), timestamp)
+
+    async def close(self):
+        pass
+
+
+class MarketStreamService:
+    """Runs a trade source in the background and feeds it into a BarAggregator"""
+
+    def __init__(self, aggregator: BarAggregator, source, reconnect_delay: float = 5):
+        self.aggregator = aggregator
+        self.source = source
+        self.reconnect_delay = reconnect_delay
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.source.run(self.aggregator.add_trade)
+                if isinstance(self.source, ReplayTradeSource):
+                    print("Trade replay finished")
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Market stream error: {e}. Reconnecting in {self.reconnect_delay}s")
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.source.close()
+
+
+def create_market_stream(aggregator: BarAggregator):
+    """
+    Build the stream service selected by MARKET_STREAM ('polygon', 'replay' or 'off')
+
+    MARKET_STREAM_SYMBOLS is a comma-separated watchlist; MARKET_REPLAY_PATH and
+    MARKET_REPLAY_SPEED configure the replay source.
+    """
+    mode = os.getenv('MARKET_STREAM', 'off').lower()
+    symbols = [s.strip() for s in os.getenv('MARKET_STREAM_SYMBOLS', 'BTC,ETH,SOL').split(',') if s.strip()]
+
+    if mode == 'polygon':
+        return MarketStreamService(aggregator, PolygonTradeSource(symbols))
+    if mode == 'replay':
+        path = os.getenv('MARKET_REPLAY_PATH')
+        if not path:
+            print("MARKET_STREAM=replay needs MARKET_REPLAY_PATH; streaming disabled")
+            return None
+        speed = float(os.getenv('MARKET_REPLAY_SPEED', 0))
+        return MarketStreamService(aggregator, ReplayTradeSource(path, speed))
+    return None
@@ -0,0 +1,274 @@
+# news_collector.py
+
+import asyncio
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import requests
+from dotenv import load_dotenv
+from services.storage import SQLiteStore, data_path
+
+load_dotenv()
+
+NEWS_API_URL = "https://newsapi.org/v2/everything"
+
+
+def _parse_published(value: str):
+    """NewsAPI timestamps look like 2024-05-01T12:34:56Z"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+class NewsStore(SQLiteStore):
+    """Local rolling corpus of news articles per symbol, plus a 'last seen' cursor per symbol"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS articles (
+            symbol TEXT NOT NULL,
+            url TEXT NOT NULL,
+            published_at TEXT,
+            published_ts REAL NOT NULL,
+            source_name TEXT,
+            title TEXT,
+            description TEXT,
+            content TEXT,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (symbol, url)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS articles_recent ON articles (symbol, published_ts)",
+        """
+        CREATE TABLE IF NOT EXISTS news_cursors (
+            symbol TEXT PRIMARY KEY,
+            last_published_at TEXT,
+            last_fetch REAL NOT NULL DEFAULT 0
+        )
+        """,
+    )
+
+    def __init__(self, path: str = None):
+        super().__init__(path or os.getenv('NEWS_DB_PATH') or data_path("news.db"))
+
+    def claim_fetch(self, symbol: str, min_interval: float):
+        """
+        Atomically claim the right to fetch symbol
+
+        Returns:
+            The claim's timestamp (pass it to release_fetch if the fetch fails), or None
+            if any worker fetched symbol within min_interval
+        """
+        now = time.time()
+        self.execute("INSERT OR IGNORE INTO news_cursors (symbol, last_fetch) VALUES (?, 0)", (symbol,))
+        claimed = self.execute(
+            "UPDATE news_cursors SET last_fetch = ? WHERE symbol = ? AND last_fetch <= ?",
+            (now, symbol, now - min_interval)
+        ).rowcount > 0
+        return now if claimed else None
+
+    def release_fetch(self, symbol: str, claimed_at: float):
+        """Undo a claim whose fetch failed, so the next request can retry right away"""
+        self.execute("UPDATE news_cursors SET last_fetch = 0 WHERE symbol = ? AND last_fetch = ?", (symbol, claimed_at))
+
+    def cursor(self, symbol: str):
+        rows = self.query("SELECT last_published_at FROM news_cursors WHERE symbol = ?", (symbol,))
+        return rows[0][0] if rows else None
+
+    def save_articles(self, symbol: str, articles, advance_cursor: bool = True):
+        """
+        Insert articles not seen before; returns the newly stored ones
+
+        Only pass advance_cursor when articles hold everything published since the cursor:
+        the next fetch starts from the newest article saved here, so anything older that
+        was missed would never be asked for again.
+        """
+        now = time.time()
+        new_articles = []
+        latest = self.cursor(symbol)
+
+        with self._mutex:
+            known = {
+                row[0] for row in self._db().execute(
+                    f"SELECT url FROM articles WHERE symbol = ? AND url IN ({','.join('?' * len(articles))})",
+                    [symbol] + [article.get('url') for article in articles]
+                )
+            } if articles else set()
+
+        rows = []
+        for article in articles:
+            # Articles already stored by an earlier, incomplete fetch still count towards the cursor
+            published_at = article.get('publishedAt')
+            if published_at and (latest is None or published_at > latest):
+                latest = published_at
+
+            url = article.get('url')
+            if not url or url in known:
+                continue
+            known.add(url)
+            rows.append((
+                symbol, url, published_at, _parse_published(published_at),
+                (article.get('source') or {}).get('name'),
+                article.get('title'), article.get('description'), article.get('content'), now
+            ))
+            new_articles.append({**article, "fetched_at": now})
+
+        if rows:
+            self.executemany(
+                "INSERT OR IGNORE INTO articles (symbol, url, published_at, published_ts, source_name, "
+                "title, description, content, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        if latest and advance_cursor:
+            self.execute("UPDATE news_cursors SET last_published_at = ? WHERE symbol = ?", (latest, symbol))
+        return new_articles
+
+    def recent(self, symbol: str, hours: float = 48, limit: int = 50):
+        """Newest articles first, in NewsAPI's article shape"""
+        rows = self.query(
+            "SELECT url, published_at, source_name, title, description, content, fetched_at FROM articles "
+            "WHERE symbol = ? AND published_ts >= ? ORDER BY published_ts DESC LIMIT ?",
+            (symbol, time.time() - hours * 3600, limit)
+        )
+        return [
+            {
+                "url": row[0],
+                "publishedAt": row[1],
+                "source": {"name": row[2]},
+                "title": row[3],
+                "description": row[4],
+                "content": row[5],
+                "fetched_at": row[6]
+            }
+            for row in rows
+        ]
+
+    def prune(self, older_than_hours: float):
+        self.execute("DELETE FROM articles WHERE published_ts < ?", (time.time() - older_than_hours * 3600,))
+
+
+class NewsCollector:
+    """
+    Incremental NewsAPI collector
+
+    Only asks for articles published after the last one seen for a symbol, fetches
+    backlog pages concurrently, and rate-limits each symbol across all workers, so
+    quota use follows the number of new articles rather than the number of requests.
+    """
+
+    def __init__(self, api_key: str = None, store: NewsStore = None):
+        self.api_key = api_key or os.getenv('NEWS_API_KEY')
+        self.store = store or NewsStore()
+        # Pages are fetched from several threads at once; requests.Session isn't thread-safe
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+        self.page_size = int(os.getenv('NEWS_PAGE_SIZE', 100))
+        self.max_pages = int(os.getenv('NEWS_MAX_PAGES', 5))
+        self.min_interval = float(os.getenv('NEWS_MIN_FETCH_INTERVAL', 300))
+        self.initial_lookback_hours = float(os.getenv('NEWS_INITIAL_LOOKBACK_HOURS', 48))
+        self.retention_hours = float(os.getenv('NEWS_RETENTION_HOURS', 24 * 14))
+
+    def _session(self):
+        """This thread's HTTP session (each keeps its own connection pool)"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+
+    def _fetch_page(self, symbol: str, since: str, page: int):
+        params = {
+            'q': f"{symbol} cryptocurrency",
+            'apiKey': self.api_key,
+            'language': 'en',
+            'sortBy': 'publishedAt',
+            'pageSize': self.page_size,
+            'page': page,
+            'from': since
+        }
+        response = self._session().get(NEWS_API_URL, params=params, timeout=15)
+        if response.status_code != 200:
+            try:
+                message = response.json().get('message')
+            except ValueError:
+                message = response.reason
+            return {'status': 'error', 'message': f"HTTP {response.status_code}: {message}"}
+        return response.json()
+
+    def _save(self, symbol: str, articles, complete: bool):
+        new_articles = self.store.save_articles(symbol, articles, advance_cursor=complete)
+        self.store.prune(self.retention_hours)
+        return new_articles
+
+    async def collect(self, symbol: str):
+        """
+        Fetch articles newer than the symbol's cursor; returns the newly stored articles
+
+        The cursor only moves once every page since it was fetched: after a failed page, or
+        a backlog beyond NEWS_MAX_PAGES, the next collect asks from the old cursor again.
+        """
+        symbol = symbol.upper()
+        # Store calls can wait on another worker's write lock, so they stay off the event loop
+        claimed_at = await asyncio.to_thread(self.store.claim_fetch, symbol, self.min_interval)
+        if claimed_at is None:
+            return []
+
+        since = await asyncio.to_thread(self.store.cursor, symbol)
+        if not since:
+            since = (datetime.now(timezone.utc) - timedelta(hours=self.initial_lookback_hours)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        try:
+            first = await asyncio.to_thread(self._fetch_page, symbol, since, 1)
+            if first.get('status') != 'ok':
+                print(f"News API error: {first.get('message')}")
+                await asyncio.to_thread(self.store.release_fetch, symbol, claimed_at)
+                return []
+
+            articles = first.get('articles', [])
+            total = first.get('totalResults', len(articles))
+            needed = math.ceil(total / self.page_size)
+            pages = min(needed, self.max_pages)
+            complete = pages == needed
+
+            # Backlog: fetch the remaining pages concurrently
+            if pages > 1:
+                responses = await asyncio.gather(
+                    *[asyncio.to_thread(self._fetch_page, symbol, since, page) for page in range(2, pages + 1)],
+                    return_exceptions=True
+                )
+                for response in responses:
+                    if isinstance(response, dict) and response.get('status') == 'ok':
+                        articles.extend(response.get('articles', []))
+                    else:
+                        complete = False
+                        error = response if isinstance(response, Exception) else response.get('message')
+                        print(f"Error fetching news page: {error}")
+
+            new_articles = await asyncio.to_thread(self._save, symbol, articles, complete)
+            print(f"Fetched {len(articles)} news articles about {symbol} since {since}, {len(new_articles)} new"
+                  f"{'' if complete else ' (incomplete, cursor kept)'}")
+            return new_articles
+
+        except Exception as e:
+            print(f"Error collecting news: {e}")
+            await asyncio.to_thread(self.store.release_fetch, symbol, claimed_at)
+            return []
+
+    def corpus(self, symbol: str, hours: float = None, limit: int = 50):
+        """Deduplicated rolling corpus for analyses (NEWS_CORPUS_HOURS, default 48)"""
+        if hours is None:
+            hours = float(os.getenv('NEWS_CORPUS_HOURS', 48))
+        return self.store.recent(symbol.upper(), hours=hours, limit=limit)
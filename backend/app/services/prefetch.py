@@ -0,0 +1,123 @@
+# prefetch.py
+
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Prefetcher:
+    """
+    Low-priority warm-ups for symbols a user is likely to ask about next
+
+    A warm-up runs the market and sentiment stages, so bars, news, tweets and the
+    sentiment snapshot are cached before the question is sent. It shares stage tasks
+    with real requests: cancelling a prefetch never cancels work a request has joined.
+    Each warm-up runs in a background admission slot, so it never takes capacity from
+    interactive requests; under pressure new prefetches are turned away, and one that
+    can't get a slot within PREFETCH_ADMISSION_TIMEOUT seconds is dropped.
+    """
+
+    def __init__(self, container):
+        self.container = container
+        self.max_concurrency = int(os.getenv('PREFETCH_CONCURRENCY', 2))
+        self.max_pending = int(os.getenv('PREFETCH_MAX_PENDING', 20))
+        # A symbol warmed this recently is not warmed again
+        self.cooldown = float(os.getenv('PREFETCH_COOLDOWN', 120))
+        self.max_warmed = int(os.getenv('PREFETCH_MAX_WARMED', 1000))
+        self.admission_timeout = float(os.getenv('PREFETCH_ADMISSION_TIMEOUT', 5))
+
+        self._semaphore = None
+        self._tasks = {}      # symbol -> {"task", "clients"}
+        self._clients = {}    # client_id -> symbol it is prefetching
+        self._warmed = {}     # symbol -> time of the last completed warm-up, oldest first
+
+    def schedule(self, symbol: str, client_id: str = None):
+        """
+        Start warming symbol in the background
+
+        A client prefetches one symbol at a time: moving on to another symbol cancels
+        its previous prefetch.
+
+        Returns:
+            'scheduled', 'running', 'cached', 'warm' or 'busy'
+        """
+        symbol = symbol.upper()
+        if client_id and self._clients.get(client_id) not in (None, symbol):
+            self.cancel(client_id)
+
+        if self.container.analysis_cache.get(symbol) is not None:
+            return "cached"
+        if time.time() - self._warmed.get(symbol, 0) < self.cooldown:
+            return "warm"
+
+        entry = self._tasks.get(symbol)
+        if entry is None:
+            if len(self._tasks) >= self.max_pending or self.container.admission.under_pressure:
+                return "busy"
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            entry = {"task": asyncio.create_task(self._warm(symbol)), "clients": set()}
+            self._tasks[symbol] = entry
+            entry["task"].add_done_callback(lambda _, entry=entry: self._finish(symbol, entry))
+            status = "scheduled"
+        else:
+            status = "running"
+
+        if client_id:
+            entry["clients"].add(client_id)
+            self._clients[client_id] = symbol
+        return status
+
+    def cancel(self, client_id: str):
+        """Drop a client's prefetch; the warm-up stops once no client wants it"""
+        symbol = self._clients.pop(client_id, None)
+        entry = self._tasks.get(symbol)
+        if entry is None:
+            return False
+
+        entry["clients"].discard(client_id)
+        if not entry["clients"] and not entry["task"].done():
+            entry["task"].cancel()
+        return True
+
+    def _finish(self, symbol: str, entry):
+        if self._tasks.get(symbol) is entry:
+            del self._tasks[symbol]
+        for client_id in entry["clients"]:
+            if self._clients.get(client_id) == symbol:
+                del self._clients[client_id]
+
+    def _mark_warmed(self, symbol: str):
+        """Record a warm-up, forgetting ones past the cooldown (or beyond max_warmed) so the map stays small"""
+        now = time.time()
+        self._warmed.pop(symbol, None)
+        self._warmed[symbol] = now
+        for oldest in list(self._warmed):
+            if now - self._warmed[oldest] < self.cooldown and len(self._warmed) <= self.max_warmed:
+                break
+            del self._warmed[oldest]
+
+    async def _warm(self, symbol: str):
+        admission = self.container.admission
+        try:
+            async with self._semaphore:
+                try:
+                    slot = await asyncio.wait_for(admission.acquire_background("prefetch"), self.admission_timeout)
+                except asyncio.TimeoutError:
+                    print(f"Prefetch of {symbol} dropped: no pipeline slot free")
+                    return
+                try:
+                    started = time.time()
+                    refreshed = await self.container.analysis_system.prefetch(symbol)
+                    self._mark_warmed(symbol)
+                    print(f"Prefetched {symbol} in {time.time() - started:.1f}s (refreshed: {', '.join(refreshed) or 'none'})")
+                finally:
+                    admission.release("prefetch", slot)
+        except asyncio.CancelledError:
+            print(f"Prefetch of {symbol} cancelled")
+            raise
+        except Exception as e:
+            print(f"Error prefetching {symbol}: {e}")
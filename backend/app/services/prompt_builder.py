@@ -0,0 +1,225 @@
+# prompt_builder.py
+
+import os
+import re
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from services.bar_store import bar_to_dict
+
+load_dotenv()
+
+# Context window per model family (prefix match, longest first)
+MODEL_CONTEXT = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+
+TRIM_MARKER = " [...]"
+
+_encoders = {}
+
+
+def _encoding(model: str):
+    """tiktoken encoding for model, or None when tiktoken is unavailable"""
+    if model not in _encoders:
+        try:
+            import tiktoken
+            try:
+                _encoders[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoders[model] = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoders[model] = None
+    return _encoders[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4"):
+    """Token count of text for model (about 4 characters per token without tiktoken)"""
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def context_window(model: str):
+    for prefix in sorted(MODEL_CONTEXT, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_CONTEXT[prefix]
+    return 8192
+
+
+def trim_to_tokens(text: str, max_tokens: int, model: str = "gpt-4", keep: str = "head"):
+    """
+    Cut text to at most max_tokens, at a line or sentence boundary where possible
+
+    Args:
+        keep: 'head' keeps the beginning, 'tail' keeps the most recent lines (e.g. bars)
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    if keep == "tail":
+        kept = []
+        for line in reversed(text.splitlines()):
+            if count_tokens("\n".join([line] + kept), model) > max_tokens:
+                break
+            kept.insert(0, line)
+        return "\n".join(kept)
+
+    budget = max(0, max_tokens - count_tokens(TRIM_MARKER, model))
+    enc = _encoding(model)
+    head = enc.decode(enc.encode(text, disallowed_special=())[:budget]) if enc else text[:budget * 4]
+
+    # Back off to the last sentence or line end, unless that throws away most of the text
+    cut = max(head.rfind("\n"), head.rfind(". "))
+    if cut > len(head) * 0.6:
+        head = head[:cut + 1]
+    return head.rstrip() + TRIM_MARKER
+
+
+def _first_sentence(line: str):
+    """The line up to its first sentence end, not counting a leading list marker like '1.'"""
+    marker = re.match(r"^(\d+[.)]|[-*•])\s+", line)
+    start = marker.end() if marker else 0
+    return line[:start] + re.split(r"(?<=[.!?])\s", line[start:], maxsplit=1)[0]
+
+
+def summarize_extract(text: str, max_tokens: int, model: str = "gpt-4"):
+    """
+    Extractive summary: headings, numbered points and the first sentence of each paragraph
+
+    No LLM call, so summarizing never adds latency; falls back to trimming if the
+    extract is still over budget.
+    """
+    kept = []
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        lines = [line.strip() for line in paragraph.splitlines() if line.strip()]
+        for index, line in enumerate(lines):
+            if index == 0 or line.endswith(":") or line.startswith("#") or re.match(r"^(\d+[.)]|[-*•])\s", line):
+                kept.append(_first_sentence(line))
+    return trim_to_tokens("\n".join(kept), max_tokens, model)
+
+
+def format_bars(bars):
+    """Compact one-line-per-bar rendering of market data (far fewer tokens than the raw objects)"""
+    lines = []
+    try:
+        for bar in (bar_to_dict(bar) for bar in bars or []):
+            day = datetime.fromtimestamp(bar["timestamp"] / 1000, timezone.utc).strftime("%Y-%m-%d")
+            lines.append(
+                f"{day} open {bar['open']} high {bar['high']} low {bar['low']} "
+                f"close {bar['close']} volume {bar['volume']}"
+            )
+    except (TypeError, ValueError):
+        return str(bars)
+    return "\n".join(lines) if lines else str(bars)
+
+
+class PromptBuilder:
+    """
+    Assemble a prompt from named sections that fits a token budget
+
+    Sections are measured in tokens. When the total exceeds the budget, optional
+    sections are reduced lowest priority first: summarized or trimmed down to what
+    fits, or dropped outright if even their min_tokens would not fit. Required
+    sections (instructions, the user's question) are never touched.
+
+    The budget is the model's context window minus PROMPT_OUTPUT_RESERVE tokens
+    for the reply, capped at PROMPT_MAX_TOKENS (smaller prompts answer faster).
+    """
+
+    def __init__(self, model: str = "gpt-4", budget: int = None):
+        self.model = model
+        reserve = int(os.getenv('PROMPT_OUTPUT_RESERVE', 1024))
+        cap = int(os.getenv('PROMPT_MAX_TOKENS', 3000))
+        self.budget = budget or min(context_window(model) - reserve, cap)
+        self.sections = []
+        self.report = None
+
+    def add(self, name: str, body: str, heading: str = None, priority: int = 0, required: bool = False,
+            mode: str = "trim", min_tokens: int = 50):
+        """
+        Add a section; sections appear in the prompt in the order they were added
+
+        Args:
+            name: Section name used in the report
+            body: Section text
+            heading: Optional heading line kept above the body (dropped with it)
+            priority: Higher is more valuable; the lowest priorities are cut first
+            required: Never reduce this section
+            mode: 'trim' (keep the beginning), 'tail' (keep the last lines) or 'summarize'
+            min_tokens: Below this the section is not worth keeping and is dropped instead
+        """
+        self.sections.append({
+            "name": name,
+            "heading": heading,
+            "body": str(body or "").strip(),
+            "priority": priority,
+            "required": required,
+            "mode": mode,
+            "min_tokens": min_tokens
+        })
+        return self
+
+    def _render(self, section):
+        if not section["body"]:
+            return ""
+        return f"{section['heading']}\n{section['body']}" if section["heading"] else section["body"]
+
+    def _reduce(self, section, target: int):
+        body_target = target - count_tokens(section["heading"] or "", self.model)
+        if section["mode"] == "summarize":
+            return summarize_extract(section["body"], body_target, self.model), "summarized"
+        if section["mode"] == "tail":
+            return trim_to_tokens(section["body"], body_target, self.model, keep="tail"), "trimmed"
+        return trim_to_tokens(section["body"], body_target, self.model), "trimmed"
+
+    def build(self):
+        """Render the prompt within budget; the cut-by-section report is left in self.report"""
+        for section in self.sections:
+            section["tokens_before"] = section["tokens"] = count_tokens(self._render(section), self.model)
+            section["action"] = "kept"
+        total_before = sum(section["tokens"] for section in self.sections)
+        total = total_before
+
+        optional = [section for section in self.sections if not section["required"] and section["tokens"]]
+        for section in sorted(optional, key=lambda section: section["priority"]):
+            overflow = total - self.budget
+            if overflow <= 0:
+                break
+
+            target = section["tokens"] - overflow
+            if target < section["min_tokens"]:
+                section["body"], section["action"] = "", "dropped"
+            else:
+                section["body"], section["action"] = self._reduce(section, target)
+            section["tokens"] = count_tokens(self._render(section), self.model)
+            total = sum(section["tokens"] for section in self.sections)
+
+        self.report = {
+            "model": self.model,
+            "budget": self.budget,
+            "tokens_before": total_before,
+            "tokens": total,
+            "sections": [
+                {
+                    "name": section["name"],
+                    "priority": section["priority"],
+                    "tokens_before": section["tokens_before"],
+                    "tokens": section["tokens"],
+                    "action": section["action"]
+                }
+                for section in self.sections
+            ]
+        }
+        cut = [f"{s['name']} {s['action']} ({s['tokens_before']}->{s['tokens']})" for s in self.report["sections"] if s["action"] != "kept"]
+        print(f"Prompt {total}/{self.budget} tokens (was {total_before}){': ' + ', '.join(cut) if cut else ''}")
+
+        return "\n\n".join(text for text in (self._render(section) for section in self.sections) if text)
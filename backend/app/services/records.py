@@ -0,0 +1,208 @@
+# records.py
+
+import hashlib
+import os
+import sys
+import threading
+import weakref
+import zlib
+from collections.abc import Mapping
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Strings at least this long are pooled and shared between every record holding them
+SHARE_MIN_CHARS = int(os.getenv('CACHE_SHARE_MIN_CHARS', 256))
+
+# Pooled texts at least this long are kept zlib-compressed at rest (0 turns compression off)
+COMPRESS_MIN_CHARS = int(os.getenv('CACHE_COMPRESS_MIN_CHARS', 0))
+
+_MISSING = object()
+_pool_lock = threading.Lock()
+_texts = weakref.WeakValueDictionary()
+_sources = weakref.WeakValueDictionary()
+
+
+class SharedText:
+    """One pooled copy of a long text, optionally compressed"""
+
+    __slots__ = ("_data", "__weakref__")
+
+    def __init__(self, text: str):
+        if COMPRESS_MIN_CHARS and len(text) >= COMPRESS_MIN_CHARS:
+            self._data = zlib.compress(text.encode("utf-8"), 6)
+        else:
+            self._data = text
+
+    def __str__(self):
+        if isinstance(self._data, bytes):
+            return zlib.decompress(self._data).decode("utf-8")
+        return self._data
+
+
+def shared_text(text: str):
+    """The pooled SharedText for text, so identical analyses are held once"""
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    with _pool_lock:
+        shared = _texts.get(key)
+        if shared is None:
+            shared = SharedText(text)
+            _texts[key] = shared
+        return shared
+
+
+class Source(Mapping):
+    """
+    A source link, held once for every symbol and cache entry that cites it
+
+    Fields the original dict didn't have stay absent, and None stays None.
+    """
+
+    __slots__ = ("name", "title", "url", "__weakref__")
+
+    KEYS = ("name", "title", "url")
+
+    def __init__(self, name, title, url):
+        for key, value in zip(self.KEYS, (name, title, url)):
+            setattr(self, key, sys.intern(value) if isinstance(value, str) else value)
+
+    def __getitem__(self, key):
+        value = getattr(self, key) if key in self.KEYS else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (key for key in self.KEYS if getattr(self, key) is not _MISSING)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self}
+
+
+def shared_source(source: dict):
+    key = tuple(source.get(field, _MISSING) for field in Source.KEYS)
+    with _pool_lock:
+        shared = _sources.get(key)
+        if shared is None:
+            shared = Source(*key)
+            _sources[key] = shared
+        return shared
+
+
+class Sources(tuple):
+    """Tuple of shared Source records standing in for a list of source dicts"""
+
+    __slots__ = ()
+
+
+def _is_source_list(value):
+    return (
+        isinstance(value, list) and value and
+        all(isinstance(item, dict) and set(item) <= set(Source.KEYS) and
+            all(isinstance(field, (str, type(None))) for field in item.values())
+            for item in value)
+    )
+
+
+class CompactRecord(Mapping):
+    """
+    Read-only, dict-compatible record with one slot per known key
+
+    Long strings are pooled, short ones interned and source lists replaced by shared
+    Source records; the sharing is in how values are held at rest. Reading a key
+    builds plain values (str, list of fresh dicts), so code written against the
+    original dicts, JSON encoding and callers that modify what they read keep working.
+    """
+
+    __slots__ = ()
+
+    FIELDS = ()
+
+    def __init__(self, values: dict):
+        for field in self.FIELDS:
+            setattr(self, field, pack_value(values[field]) if field in values else _MISSING)
+
+    @classmethod
+    def fits(cls, value):
+        return isinstance(value, dict) and set(value) <= set(cls.FIELDS)
+
+    def __getitem__(self, key):
+        value = getattr(self, key, _MISSING) if key in self.FIELDS else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return unpack_value(value)
+
+    def __iter__(self):
+        return (field for field in self.FIELDS if getattr(self, field) is not _MISSING)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(self)})"
+
+    def to_dict(self):
+        """Deep plain-dict copy (for snapshots and JSON)"""
+        return {key: to_plain(getattr(self, key)) for key in self}
+
+
+class SentimentRecord(CompactRecord):
+    __slots__ = ("text", "sentiment_score", "sources", "sources_count", "duplicates_collapsed")
+    FIELDS = __slots__
+
+
+class AnalysisRecord(CompactRecord):
+    __slots__ = ("symbol", "market_analysis", "sentiment_analysis", "combined_analysis", "sentiment_score",
+                 "sources", "sources_count", "refreshed_stages", "stale", "generated_at", "version")
+    FIELDS = __slots__
+
+
+class ContextRecord(CompactRecord):
+    __slots__ = ("market", "sentiment", "sentiment_score", "sources")
+    FIELDS = __slots__
+
+
+class StageRecord(CompactRecord):
+    __slots__ = ("fingerprint", "output")
+    FIELDS = __slots__
+
+
+# Nested dicts that are packed into records wherever they appear
+NESTED_RECORDS = (SentimentRecord,)
+
+
+def pack_value(value):
+    if isinstance(value, str):
+        return shared_text(value) if len(value) >= SHARE_MIN_CHARS else sys.intern(value)
+    if _is_source_list(value):
+        return Sources(shared_source(source) for source in value)
+    if isinstance(value, dict):
+        for record_type in NESTED_RECORDS:
+            if record_type.fits(value):
+                return record_type(value)
+    return value
+
+
+def unpack_value(value):
+    if isinstance(value, SharedText):
+        return str(value)
+    if isinstance(value, Sources):
+        # Fresh dicts on every read: the pooled Source records must never be modified through them
+        return [source.to_dict() for source in value]
+    return value
+
+
+def to_plain(value):
+    if isinstance(value, CompactRecord):
+        return value.to_dict()
+    return unpack_value(value)
+
+
+def pack_record(record_type, value):
+    """value as a record_type record, or unchanged if it has keys the record doesn't know"""
+    if record_type.fits(value):
+        return record_type(value)
+    return value
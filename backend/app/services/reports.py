@@ -0,0 +1,522 @@
+# reports.py
+
+import asyncio
+import html
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from dotenv import load_dotenv
+from services.storage import SQLiteStore, data_path
+
+load_dotenv()
+
+# Which parts of each symbol's analysis a template includes
+TEMPLATES = {
+    "summary": ("combined",),
+    "full": ("combined", "market", "sentiment", "sources"),
+}
+
+FORMATS = {"markdown": "md", "html": "html", "pdf": "pdf"}
+
+MEDIA_TYPES = {"markdown": "text/markdown", "html": "text/html", "pdf": "application/pdf"}
+
+FINISHED = ("done", "failed", "cancelled")
+
+ACTIVE = ("queued", "running", "rendering")
+
+
+def _plain(text: str):
+    """Strip the markdown emphasis LLM answers use, for formats that can't show it"""
+    return re.sub(r"\*\*|__|^#+\s*", "", text or "", flags=re.MULTILINE)
+
+
+def report_blocks(report):
+    """Flatten report data into (style, text) blocks shared by every renderer"""
+    blocks = [
+        ("h1", report["title"]),
+        ("meta", f"Generated {report['generated_at']} - {len(report['symbols'])} assets - {report['template']} template"),
+    ]
+    for entry in report["symbols"]:
+        blocks.append(("h2", entry["symbol"]))
+        if entry.get("error"):
+            blocks.append(("p", f"Analysis failed: {entry['error']}"))
+            continue
+
+        blocks.append(("meta", f"Sentiment score: {entry.get('sentiment_score', 50)}/100"))
+        parts = TEMPLATES[report["template"]]
+        if "combined" in parts:
+            blocks.append(("p", entry.get("combined") or ""))
+        if "market" in parts:
+            blocks += [("h3", "Technical analysis"), ("p", entry.get("market") or "")]
+        if "sentiment" in parts:
+            blocks += [("h3", "Sentiment analysis"), ("p", entry.get("sentiment") or "")]
+        if "sources" in parts and entry.get("sources"):
+            blocks.append(("h3", "Sources"))
+            blocks += [
+                ("li", f"{source.get('name', '')}: {source.get('title', '')}", source.get("url"))
+                for source in entry["sources"]
+            ]
+    blocks.append(("meta", "All market analysis is for informational purposes only."))
+    return blocks
+
+
+def render_markdown(report):
+    lines = []
+    for block in report_blocks(report):
+        style, text = block[0], block[1]
+        if style == "h1":
+            lines.append(f"# {text}\n")
+        elif style == "h2":
+            lines.append(f"## {text}\n")
+        elif style == "h3":
+            lines.append(f"### {text}\n")
+        elif style == "meta":
+            lines.append(f"_{text}_\n")
+        elif style == "li":
+            lines.append(f"- [{text}]({block[2]})" if block[2] else f"- {text}")
+        else:
+            lines.append(f"{text.strip()}\n")
+    return "\n".join(lines).encode("utf-8")
+
+
+def render_html(report):
+    body = []
+    for block in report_blocks(report):
+        style, text = block[0], html.escape(block[1])
+        if style in ("h1", "h2", "h3"):
+            body.append(f"<{style}>{text}</{style}>")
+        elif style == "meta":
+            body.append(f'<p class="meta">{text}</p>')
+        elif style == "li":
+            body.append(f'<li><a href="{html.escape(block[2])}">{text}</a></li>' if block[2] else f"<li>{text}</li>")
+        else:
+            text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+            body += [f"<p>{paragraph.strip().replace(chr(10), '<br>')}</p>" for paragraph in re.split(r"\n\s*\n", text) if paragraph.strip()]
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{html.escape(report['title'])}</title>"
+        "<style>body{font-family:-apple-system,sans-serif;max-width:800px;margin:2rem auto;color:#333;line-height:1.5}"
+        ".meta{color:#888;font-size:.9rem}h2{border-bottom:1px solid #eee;padding-bottom:.3rem}</style>"
+        f"</head><body>{''.join(body)}</body></html>"
+    ).encode("utf-8")
+
+
+def render_pdf(report):
+    """
+    Minimal text PDF (A4, built-in Helvetica fonts) so PDF export needs no extra dependency
+
+    Characters outside Latin-1 are replaced.
+    """
+    width, height, margin = 595, 842, 50
+    styles = {"h1": (18, "F2"), "h2": (14, "F2"), "h3": (12, "F2"), "meta": (9, "F1"), "li": (10, "F1"), "p": (10, "F1")}
+
+    pages, lines, y = [], [], height - margin
+
+    def new_page():
+        nonlocal lines, y
+        pages.append(lines)
+        lines, y = [], height - margin
+
+    for block in report_blocks(report):
+        style = block[0]
+        size, font = styles[style]
+        text = _plain(block[1])
+        if style == "li":
+            text = f"- {text}"
+        if style in ("h2", "h3"):
+            y -= size * 0.6
+
+        # Helvetica averages about half an em per character
+        max_chars = int((width - 2 * margin) / (size * 0.5))
+        for paragraph in text.split("\n"):
+            words, line = paragraph.split(), ""
+            wrapped = []
+            for word in words:
+                if line and len(line) + 1 + len(word) > max_chars:
+                    wrapped.append(line)
+                    line = word
+                else:
+                    line = f"{line} {word}" if line else word
+            wrapped.append(line)
+            for text_line in wrapped:
+                if y - size * 1.4 < margin:
+                    new_page()
+                y -= size * 1.4
+                escaped = text_line.encode("latin-1", "replace").decode("latin-1")
+                escaped = escaped.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+                lines.append(f"BT /{font} {size} Tf {margin} {y:.1f} Td ({escaped}) Tj ET")
+        y -= size * 0.5
+    new_page()
+
+    # Objects: 1 catalog, 2 page tree, 3-4 fonts, then a page and a content stream per page
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for page_lines in pages:
+        stream = "\n".join(page_lines).encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {len(objects) + 2} 0 R >>"
+        )
+        page_ids.append(len(objects))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + (obj if isinstance(obj, bytes) else obj.encode("latin-1")) + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+RENDERERS = {"markdown": render_markdown, "html": render_html, "pdf": render_pdf}
+
+
+def write_artifact(path: str, fmt: str, report):
+    """Render a report and write it atomically (runs in the render process pool); returns its size"""
+    content = RENDERERS[fmt](report)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return len(content)
+
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ReportStore(SQLiteStore):
+    """Report jobs and their progress, shared by every worker on the host"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id TEXT PRIMARY KEY,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            status TEXT NOT NULL,
+            template TEXT NOT NULL,
+            format TEXT NOT NULL,
+            symbols TEXT NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            artifact_path TEXT,
+            artifact_size INTEGER,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            owner_pid INTEGER,
+            heartbeat_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS report_jobs_created ON report_jobs (created_at)",
+    )
+
+    COLUMNS = ("id", "created_at", "updated_at", "status", "template", "format", "symbols", "completed",
+               "failed", "error", "artifact_path", "artifact_size", "cancel_requested", "owner_pid", "heartbeat_at")
+
+    def __init__(self, path: str = None):
+        super().__init__(path or os.getenv('REPORTS_DB_PATH') or data_path("reports.db"))
+
+    def create(self, symbols, template: str, fmt: str):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.execute(
+            "INSERT INTO report_jobs (id, created_at, updated_at, status, template, format, symbols, owner_pid, heartbeat_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, now, now, template, fmt, json.dumps(symbols), os.getpid(), now)
+        )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.execute(f"UPDATE report_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def record_symbol(self, job_id: str, failed: bool = False):
+        """Count one more analyzed symbol"""
+        self.execute(
+            "UPDATE report_jobs SET completed = completed + 1, failed = failed + ?, updated_at = ? WHERE id = ?",
+            (1 if failed else 0, time.time(), job_id)
+        )
+
+    def heartbeat(self, job_id: str):
+        """Mark the job as alive; returns whether a cancel has been requested from any worker"""
+        self.execute("UPDATE report_jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+        return self.cancel_requested(job_id)
+
+    def cancel_requested(self, job_id: str):
+        rows = self.query("SELECT cancel_requested FROM report_jobs WHERE id = ?", (job_id,))
+        return bool(rows and rows[0][0])
+
+    def request_cancel(self, job_id: str):
+        """Flag an unfinished job for cancellation; False if it already finished"""
+        placeholders = ", ".join("?" for _ in ACTIVE)
+        cursor = self.execute(
+            f"UPDATE report_jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status IN ({placeholders})",
+            (time.time(), job_id, *ACTIVE)
+        )
+        return cursor.rowcount > 0
+
+    def fail_stale(self, stale_after: float, job_id: str = None):
+        """
+        Mark unfinished jobs whose worker is gone as failed
+
+        A job is stale when its heartbeat is older than stale_after seconds or its
+        owner process no longer exists (all workers share the host).
+        """
+        placeholders = ", ".join("?" for _ in ACTIVE)
+        sql = f"SELECT id, owner_pid, heartbeat_at FROM report_jobs WHERE status IN ({placeholders})"
+        params = ACTIVE
+        if job_id is not None:
+            sql += " AND id = ?"
+            params += (job_id,)
+
+        now = time.time()
+        stale = [
+            row[0] for row in self.query(sql, params)
+            if (row[2] or 0) < now - stale_after or not _process_alive(row[1])
+        ]
+        for stale_id in stale:
+            self.execute(
+                f"UPDATE report_jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ? AND status IN ({placeholders})",
+                ("The worker running this report stopped", now, stale_id, *ACTIVE)
+            )
+        return stale
+
+    def get(self, job_id: str):
+        rows = self.query(f"SELECT {', '.join(self.COLUMNS)} FROM report_jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(zip(self.COLUMNS, rows[0]))
+        job["symbols"] = json.loads(job["symbols"])
+        job["total"] = len(job["symbols"])
+        return job
+
+    def expired(self, older_than: float):
+        """Jobs created before older_than, oldest first"""
+        rows = self.query("SELECT id, artifact_path FROM report_jobs WHERE created_at < ?", (older_than,))
+        return [{"id": row[0], "artifact_path": row[1]} for row in rows]
+
+    def delete(self, job_id: str):
+        self.execute("DELETE FROM report_jobs WHERE id = ?", (job_id,))
+
+
+class ReportService:
+    """
+    Batch report jobs for whole watchlists
+
+    A job runs each symbol through the container's analysis (cached results and
+    unchanged stages are reused) with at most REPORT_ANALYSIS_CONCURRENCY analyses
+    at a time across all jobs, each admitted at background priority so reports never
+    crowd out interactive requests, then renders the artifact in a process pool and
+    stores it under the data directory for download. Job state lives in SQLite, so any
+    worker can report progress for, or cancel, a job another worker is running; the
+    owning worker heartbeats its jobs, and jobs whose worker died are marked failed.
+    """
+
+    def __init__(self, container, store: ReportStore = None):
+        self.container = container
+        self.store = store or ReportStore()
+        self.directory = os.getenv('REPORTS_DIR') or data_path("reports")
+        self.analysis_concurrency = int(os.getenv('REPORT_ANALYSIS_CONCURRENCY', 3))
+        self.max_jobs = int(os.getenv('REPORT_MAX_JOBS', 2))
+        self.render_workers = int(os.getenv('REPORT_RENDER_WORKERS', 2))
+        self.retention = float(os.getenv('REPORT_RETENTION_DAYS', 7)) * 86400
+        self.poll_interval = float(os.getenv('REPORT_POLL_INTERVAL', 1))
+        self.heartbeat_interval = float(os.getenv('REPORT_HEARTBEAT_INTERVAL', 5))
+        self.stale_after = float(os.getenv('REPORT_STALE_SECONDS', 60))
+
+        self._analysis_slots = None
+        self._job_slots = None
+        self._pool = None
+        self._tasks = {}
+
+        # Jobs left unfinished by workers that have since died
+        stale = self.store.fail_stale(self.stale_after)
+        if stale:
+            print(f"Marked {len(stale)} orphaned report jobs as failed")
+
+    def submit(self, symbols, template: str = "summary", fmt: str = "markdown"):
+        """Queue a report job and return it immediately"""
+        if template not in TEMPLATES:
+            raise ValueError(f"Unknown template '{template}' (use {', '.join(TEMPLATES)})")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format '{fmt}' (use {', '.join(FORMATS)})")
+
+        self.prune()
+        if self._analysis_slots is None:
+            self._analysis_slots = asyncio.Semaphore(self.analysis_concurrency)
+            self._job_slots = asyncio.Semaphore(self.max_jobs)
+
+        job = self.store.create(symbols, template, fmt)
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda _, job_id=job["id"]: self._tasks.pop(job_id, None))
+        return job
+
+    def get(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is not None and job["status"] in ACTIVE and job_id not in self._tasks:
+            if self.store.fail_stale(self.stale_after, job_id):
+                job = self.store.get(job_id)
+        return job
+
+    def cancel(self, job_id: str):
+        """Cancel a job on whichever worker runs it; False if it already finished"""
+        if not self.store.request_cancel(job_id):
+            return False
+        # The owning worker stops at its next check; here it can stop right away
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            task.cancel()
+        return True
+
+    def _check_cancelled(self, job_id: str):
+        if self.store.cancel_requested(job_id):
+            task = self._tasks.get(job_id)
+            if task is not None:
+                task.cancel()
+            raise asyncio.CancelledError()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self.store.heartbeat(job_id):
+                task = self._tasks.get(job_id)
+                if task is not None:
+                    task.cancel()
+                return
+
+    async def _analysis(self, symbol: str):
+        """Cached analysis, or a fresh one run in a background admission slot"""
+        cached = self.container.cached_analysis(symbol)
+        if cached is not None:
+            return cached
+        admission = self.container.admission
+        started = await admission.acquire_background("reports")
+        try:
+            return await self.container.ensure_analysis(symbol)
+        finally:
+            admission.release("reports", started)
+
+    async def _analyze(self, job_id: str, symbol: str):
+        async with self._analysis_slots:
+            # Checked between symbols, so a cancel from any worker stops the job
+            self._check_cancelled(job_id)
+            try:
+                analysis = await self._analysis(symbol)
+                entry = {
+                    "symbol": symbol,
+                    "combined": analysis["combined_analysis"],
+                    "market": analysis["market_analysis"],
+                    "sentiment": analysis["sentiment_analysis"],
+                    "sentiment_score": analysis.get("sentiment_score", 50),
+                    "sources": analysis.get("sources", [])
+                }
+            except Exception as e:
+                print(f"Error analyzing {symbol} for report {job_id}: {e}")
+                entry = {"symbol": symbol, "error": str(e)}
+
+        self.store.record_symbol(job_id, failed="error" in entry)
+        return entry
+
+    async def _render(self, path: str, fmt: str, report):
+        if self.render_workers > 0:
+            try:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.render_workers)
+                return await asyncio.get_running_loop().run_in_executor(self._pool, write_artifact, path, fmt, report)
+            except (BrokenProcessPool, OSError) as e:
+                print(f"Report render pool unavailable, rendering in a thread: {e}")
+                self._pool = None
+                self.render_workers = 0
+        return await asyncio.to_thread(write_artifact, path, fmt, report)
+
+    async def _run(self, job):
+        job_id = job["id"]
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            async with self._job_slots:
+                self._check_cancelled(job_id)
+                self.store.update(job_id, status="running")
+                started = time.time()
+                entries = await asyncio.gather(*(self._analyze(job_id, symbol) for symbol in job["symbols"]))
+
+                self.store.update(job_id, status="rendering")
+                report = {
+                    "title": f"Crypto report: {', '.join(job['symbols'][:5])}{'...' if len(job['symbols']) > 5 else ''}",
+                    "generated_at": datetime.now().strftime("%B %d, %Y %H:%M"),
+                    "template": job["template"],
+                    "symbols": list(entries)
+                }
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"{job_id}.{FORMATS[job['format']]}")
+                size = await self._render(path, job["format"], report)
+
+                self.store.update(job_id, status="done", artifact_path=path, artifact_size=size)
+                print(f"Report {job_id} ({len(entries)} symbols, {job['format']}) done in {time.time() - started:.1f}s")
+        except asyncio.CancelledError:
+            self.store.update(job_id, status="cancelled")
+            raise
+        except Exception as e:
+            print(f"Error generating report {job_id}: {e}")
+            self.store.update(job_id, status="failed", error=str(e))
+        finally:
+            heartbeat.cancel()
+
+    async def events(self, job_id: str):
+        """Yield Server-Sent Events with the job's progress until it finishes (polls the shared store)"""
+        last = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'detail': f'No report job {job_id}'})}\n\n"
+                return
+
+            progress = {key: job[key] for key in ("id", "status", "completed", "failed", "total", "error")}
+            if progress != last:
+                event = "done" if job["status"] in FINISHED else "progress"
+                yield f"event: {event}\ndata: {json.dumps(progress)}\n\n"
+                last = progress
+            if job["status"] in FINISHED:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def prune(self):
+        """Delete jobs and artifacts older than REPORT_RETENTION_DAYS"""
+        for job in self.store.expired(time.time() - self.retention):
+            if job["artifact_path"] and os.path.exists(job["artifact_path"]):
+                os.remove(job["artifact_path"])
+            self.store.delete(job["id"])
+
+    async def stop(self):
+        """Cancel this worker's running jobs and shut the render pool down"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.shutdown)
+            self._pool = None
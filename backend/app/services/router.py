@@ -0,0 +1,403 @@
+# router.py
+
+import json
+import os
+import re
+import time
+from dotenv import load_dotenv
+from services.storage import data_path
+
+load_dotenv()
+
+# Seed registry: (symbol, name, aliases). Extended at runtime from a JSON registry file
+# (SYMBOL_REGISTRY_PATH) that can be generated from Polygon's crypto reference data.
+SEED_ASSETS = [
+    ("BTC", "Bitcoin", ["btc", "xbt", "sats", "satoshi", "satoshis"]),
+    ("ETH", "Ethereum", ["ether", "eth2"]),
+    ("USDT", "Tether", ["tether usd"]),
+    ("BNB", "BNB", ["binance coin", "binance smart chain"]),
+    ("SOL", "Solana", []),
+    ("USDC", "USD Coin", ["usd coin"]),
+    ("XRP", "XRP", ["ripple"]),
+    ("DOGE", "Dogecoin", ["doge coin"]),
+    ("ADA", "Cardano", []),
+    ("TRX", "TRON", []),
+    ("AVAX", "Avalanche", []),
+    ("SHIB", "Shiba Inu", ["shiba"]),
+    ("DOT", "Polkadot", []),
+    ("LINK", "Chainlink", ["chain link"]),
+    ("TON", "Toncoin", ["the open network"]),
+    ("BCH", "Bitcoin Cash", ["bcash"]),
+    ("LTC", "Litecoin", []),
+    ("NEAR", "NEAR Protocol", []),
+    ("MATIC", "Polygon", ["polygon matic"]),
+    ("POL", "POL", ["polygon ecosystem token"]),
+    ("UNI", "Uniswap", []),
+    ("ICP", "Internet Computer", []),
+    ("DAI", "Dai", []),
+    ("ETC", "Ethereum Classic", []),
+    ("APT", "Aptos", []),
+    ("XLM", "Stellar", ["stellar lumens", "lumens"]),
+    ("XMR", "Monero", []),
+    ("ATOM", "Cosmos", ["cosmos hub"]),
+    ("FIL", "Filecoin", []),
+    ("HBAR", "Hedera", ["hedera hashgraph"]),
+    ("ARB", "Arbitrum", []),
+    ("OP", "Optimism", []),
+    ("VET", "VeChain", []),
+    ("MKR", "Maker", ["makerdao"]),
+    ("INJ", "Injective", []),
+    ("SUI", "Sui", []),
+    ("AAVE", "Aave", []),
+    ("GRT", "The Graph", []),
+    ("ALGO", "Algorand", []),
+    ("SEI", "Sei", []),
+    ("RUNE", "THORChain", []),
+    ("STX", "Stacks", []),
+    ("IMX", "Immutable", ["immutable x"]),
+    ("FTM", "Fantom", []),
+    ("EGLD", "MultiversX", ["elrond"]),
+    ("SAND", "The Sandbox", ["sandbox"]),
+    ("MANA", "Decentraland", []),
+    ("AXS", "Axie Infinity", ["axie"]),
+    ("THETA", "Theta Network", []),
+    ("XTZ", "Tezos", []),
+    ("EOS", "EOS", []),
+    ("FLOW", "Flow", []),
+    ("CRV", "Curve", ["curve dao", "curve finance"]),
+    ("LDO", "Lido DAO", ["lido"]),
+    ("KAS", "Kaspa", []),
+    ("PEPE", "Pepe", []),
+    ("WIF", "dogwifhat", []),
+    ("BONK", "Bonk", []),
+    ("TAO", "Bittensor", []),
+    ("RNDR", "Render", ["render token"]),
+    ("ZEC", "Zcash", []),
+    ("DASH", "Dash", []),
+    ("COMP", "Compound", []),
+    ("SNX", "Synthetix", []),
+    ("1INCH", "1inch", []),
+    ("CRO", "Cronos", ["crypto.com coin"]),
+    ("QNT", "Quant", []),
+    ("CHZ", "Chiliz", []),
+    ("ENS", "Ethereum Name Service", []),
+    ("JUP", "Jupiter", []),
+]
+
+# Tickers and names that are ordinary English words. As tickers they only count when
+# written in capitals or with a $ prefix ("$one", "LINK"); as names they are not matched.
+COMMON_WORDS = {
+    "a", "ai", "all", "am", "an", "and", "any", "are", "as", "at", "be", "best", "big", "bit", "but", "by",
+    "can", "cat", "coin", "comp", "compound", "cool", "dash", "day", "do", "dog", "dot", "eat", "ever", "flow",
+    "for", "fun", "gas", "get", "go", "good", "has", "have", "he", "hi", "high", "hold", "how", "i", "if",
+    "in", "is", "it", "just", "key", "link", "low", "make", "maker", "max", "me", "more", "my", "near",
+    "new", "next", "no", "not", "now", "of", "ok", "on", "one", "or", "out", "pay", "play", "quant", "render",
+    "sand", "sandbox", "see", "sell", "should", "so", "stacks", "sun", "the", "this", "time", "to", "ton", "top",
+    "up", "us", "usd", "via", "was", "we", "well", "what", "when", "why", "win", "with", "you",
+}
+
+# Intent phrases; "prefix" phrases also match longer words ("predict" -> "prediction")
+INTENT_PHRASES = {
+    "predict": [("predict", True), ("forecast", True), ("price target", False), ("will it reach", False),
+                ("where will", False), ("how high", False), ("how low", False)],
+    "strategy": [("when should i", False), ("strateg", True), ("timing", False), ("best time", False),
+                 ("maximize", True), ("maximise", True), ("should i buy", False), ("should i sell", False),
+                 ("should i hold", False), ("entry point", False), ("exit point", False)],
+    "policy": [("policy", False), ("policies", False), ("regulat", True), ("impact", True), ("affect", True),
+               ("legislation", False), ("ban", False), ("sec", False), ("law", False), ("laws", False)],
+    "compare": [("compare", True), ("comparison", False), ("vs", False), ("versus", False),
+                ("correlat", True), ("relative strength", False), ("outperform", True)],
+    "analyze": [("what's happening", False), ("whats happening", False), ("what is happening", False),
+                ("analy", True), ("overview", False), ("outlook", False), ("tell me about", False),
+                ("how is", False), ("how's", False)],
+}
+
+# Comparisons asking for a judgement get the LLM takeaway; the rest are answered from the numbers
+SYNTHESIS_PATTERN = re.compile(
+    r"\b(better|best|worse|worth|prefer\w*|recommend\w*|should|explain\w*|why|summar\w*|takeaway|opinion|think)\b"
+)
+
+# Ties go to the more specific intent
+INTENT_PRIORITY = ["predict", "strategy", "policy", "compare", "analyze"]
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every occurrence of every pattern in one pass over the text"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._own = [[]]
+        self._out = [[]]
+        self._built = False
+
+    def add(self, pattern: str, value):
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+                self._out.append([])
+                self._goto[node][ch] = next_node
+            node = next_node
+        self._own[node].append((len(pattern), value))
+        self._built = False
+
+    def build(self):
+        """Compute failure links breadth-first"""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+            self._out[node] = list(self._own[node])
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._own[child] + self._out[self._fail[child]]
+        self._built = True
+
+    def finditer(self, text: str):
+        """Yield (start, end, value) for every pattern occurrence"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for index, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, value in out[node]:
+                yield index - length + 1, index + 1, value
+
+
+def _is_word_char(ch: str):
+    return ch.isalnum() or ch == "_"
+
+
+def _lower_keeping_offsets(text: str):
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters lowercase to two code points; leave those alone so offsets still line up
+    return "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+def load_registry_file(path: str):
+    """Read [{"symbol", "name", "aliases"}] entries from a JSON registry file"""
+    with open(path) as f:
+        entries = json.load(f)
+    return [(entry["symbol"], entry.get("name") or entry["symbol"], entry.get("aliases", [])) for entry in entries]
+
+
+def fetch_polygon_registry(polygon_client):
+    """Every active crypto base asset Polygon quotes against USD, as registry entries"""
+    entries = {}
+    for ticker in polygon_client.list_tickers(market="crypto", active=True, limit=1000):
+        symbol = getattr(ticker, "base_currency_symbol", None)
+        if not symbol or getattr(ticker, "currency_symbol", None) != "USD":
+            continue
+        entries.setdefault(symbol.upper(), (symbol.upper(), ticker.base_currency_name or symbol.upper(), []))
+    return list(entries.values())
+
+
+def save_registry_file(entries, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump([{"symbol": s, "name": n, "aliases": list(a)} for s, n, a in entries], f)
+    os.replace(tmp_path, path)
+
+
+class SymbolRouter:
+    """
+    Resolves asset mentions and classifies the intent of a chat message
+
+    Symbols, names and aliases of every registered asset are compiled into a single
+    Aho-Corasick automaton, so resolution is one pass over the message regardless of
+    registry size. Matches must sit on word boundaries ("ETH" never matches "METHOD").
+    """
+
+    def __init__(self, assets=None):
+        self.assets = {}
+        self._symbols = AhoCorasick()
+        self._intents = AhoCorasick()
+
+        self.add_assets(SEED_ASSETS if assets is None else assets)
+
+        for intent, phrases in INTENT_PHRASES.items():
+            for phrase, prefix in phrases:
+                self._intents.add(phrase, (intent, prefix))
+        self._intents.build()
+
+    def add_assets(self, assets, strict_tickers: bool = False):
+        """Register (symbol, name, aliases) entries; the first registration of a symbol or alias wins
+
+        With strict_tickers, the tickers only match in capitals or with a $ prefix. That
+        suits long-tail registries, whose thousands of tickers include many ordinary words.
+        """
+        taken = {pattern for entry in self.assets.values() for pattern in entry["patterns"]}
+        for symbol, name, aliases in assets:
+            symbol = symbol.upper()
+            entry = self.assets.setdefault(symbol, {"symbol": symbol, "name": name, "patterns": set()})
+
+            ticker = symbol.lower()
+            if ticker not in taken:
+                # Short or word-like tickers need capitals or a $ prefix to count
+                strict = strict_tickers or len(ticker) <= 2 or ticker in COMMON_WORDS
+                self._symbols.add(ticker, (symbol, "ticker", strict))
+                entry["patterns"].add(ticker)
+                taken.add(ticker)
+
+            for alias in [name, *aliases]:
+                alias = alias.lower().strip()
+                if not alias or alias in taken or alias in COMMON_WORDS:
+                    continue
+                self._symbols.add(alias, (symbol, "name", False))
+                entry["patterns"].add(alias)
+                taken.add(alias)
+
+        self._symbols.build()
+
+    def resolve(self, text: str):
+        """
+        Find asset mentions in text
+
+        Returns:
+            List of {"symbol", "name", "match", "start", "end"} in order of appearance,
+            keeping the longest match where mentions overlap ("bitcoin cash" over "bitcoin")
+        """
+        lowered = _lower_keeping_offsets(text)
+        candidates = []
+        for start, end, (symbol, kind, strict) in self._symbols.finditer(lowered):
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            if strict and not (text[start:end].isupper() or (start > 0 and text[start - 1] == "$")):
+                continue
+            candidates.append((start, end, symbol))
+
+        # Leftmost-longest, non-overlapping
+        candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        mentions = []
+        last_end = -1
+        for start, end, symbol in candidates:
+            if start < last_end:
+                continue
+            mentions.append({
+                "symbol": symbol,
+                "name": self.assets[symbol]["name"],
+                "match": text[start:end],
+                "start": start,
+                "end": end
+            })
+            last_end = end
+        return mentions
+
+    def classify(self, text: str, symbol_count: int = 0):
+        """
+        Classify a message as predict / strategy / policy / compare / analyze / followup
+
+        Returns:
+            Dictionary with intent, confidence (share of matched phrases) and matched phrases
+        """
+        lowered = _lower_keeping_offsets(text)
+        scores = {}
+        matched = []
+        for start, end, (intent, prefix) in self._intents.finditer(lowered):
+            if start > 0 and _is_word_char(lowered[start - 1]):
+                continue
+            if not prefix and end < len(lowered) and _is_word_char(lowered[end]):
+                continue
+            scores[intent] = scores.get(intent, 0) + 1
+            matched.append(lowered[start:end])
+
+        # Two or more assets in one question is a comparison unless something more specific matched
+        if symbol_count >= 2 and not any(scores.get(intent) for intent in ("predict", "strategy", "policy")):
+            scores["compare"] = scores.get("compare", 0) + 1
+
+        if not scores:
+            return {"intent": "followup", "confidence": 0.0, "matched": []}
+
+        best = max(INTENT_PRIORITY, key=lambda intent: (scores.get(intent, 0), -INTENT_PRIORITY.index(intent)))
+        return {
+            "intent": best,
+            "confidence": round(scores[best] / sum(scores.values()), 2),
+            "matched": matched
+        }
+
+    @staticmethod
+    def timeframe(text: str):
+        """Prediction timeframe mentioned in text: 'week', 'month' (default) or '3months'"""
+        lowered = text.lower()
+        if re.search(r'\b(3|three)[ -]?months?\b|\bquarter\b', lowered):
+            return "3months"
+        if re.search(r'\bweek\b|\b7 days\b', lowered):
+            return "week"
+        return "month"
+
+    def route(self, text: str, current_symbol: str = None):
+        """
+        Resolve symbols and intent for a chat message
+
+        Args:
+            text: User message
+            current_symbol: Symbol the conversation is already about, used when none is mentioned
+
+        Returns:
+            Routing decision dictionary
+        """
+        started = time.perf_counter()
+        mentions = self.resolve(text)
+        symbols = list(dict.fromkeys(mention["symbol"] for mention in mentions))
+        intent = self.classify(text, len(symbols))
+
+        symbol = symbols[0] if symbols else (current_symbol.upper() if current_symbol else None)
+        return {
+            "symbol": symbol,
+            "symbols": symbols,
+            "symbol_from_context": not symbols and symbol is not None,
+            "intent": intent["intent"],
+            "confidence": intent["confidence"],
+            "matched": intent["matched"],
+            "timeframe": self.timeframe(text) if intent["intent"] == "predict" else None,
+            "synthesize": intent["intent"] == "compare" and bool(SYNTHESIS_PATTERN.search(text.lower())),
+            "mentions": mentions,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+
+
+def create_router(polygon_client=None):
+    """
+    Router over the seed registry plus the registry file, if any
+
+    SYMBOL_REGISTRY_PATH (default data/symbols.json) is loaded when it exists. With
+    SYMBOL_REGISTRY_POLYGON=1 and no file yet, it is first built from Polygon's crypto tickers.
+    """
+    router = SymbolRouter()
+    path = os.getenv('SYMBOL_REGISTRY_PATH') or data_path("symbols.json")
+
+    if not os.path.exists(path) and polygon_client and os.getenv('SYMBOL_REGISTRY_POLYGON') == '1':
+        try:
+            save_registry_file(fetch_polygon_registry(polygon_client), path)
+        except Exception as e:
+            print(f"Error fetching symbol registry from Polygon: {e}")
+
+    if os.path.exists(path):
+        try:
+            entries = load_registry_file(path)
+            router.add_assets(entries, strict_tickers=True)
+            print(f"Loaded {len(entries)} assets into the symbol router")
+        except Exception as e:
+            print(f"Error loading symbol registry {path}: {e}")
+    return router
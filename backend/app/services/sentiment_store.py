@@ -0,0 +1,243 @@
+# sentiment_store.py
+
+import json
+import math
+import os
+import re
+import struct
+import threading
+import time
+from dotenv import load_dotenv
+from services.storage import data_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-worker development only
+    fcntl = None
+
+load_dotenv()
+
+# One fixed-size record per score: timestamp (s), score (0-100), news count, tweet count, model id
+RECORD = struct.Struct("<IBHHB")
+
+# Appends from different workers can interleave slightly out of order; range scans widen by this many records
+ORDER_SLACK = 64
+
+
+class SentimentStore:
+    """
+    Append-only sentiment time series, one binary file of 10-byte records per symbol
+
+    At one point per minute that is about 14 KB per symbol per day, so months of
+    history for hundreds of symbols fits comfortably on local disk.
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.getenv('SENTIMENT_STORE_DIR') or data_path("sentiment")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._models_path = os.path.join(self.directory, "models.json")
+        self._models = None
+        self._lock = threading.Lock()
+
+        # Callbacks run as listener(symbol, score, timestamp) after every append
+        self.listeners = []
+
+    def _series_path(self, symbol: str):
+        safe_symbol = re.sub(r'[^A-Z0-9_-]', '_', symbol.upper())
+        return os.path.join(self.directory, f"{safe_symbol}.bin")
+
+    def _load_models(self):
+        if os.path.exists(self._models_path):
+            with open(self._models_path) as f:
+                return json.load(f)
+        return {}
+
+    def _model_id(self, model: str):
+        """Map a model name to its one-byte id, registering it on first use"""
+        with self._lock:
+            if self._models is not None and model in self._models:
+                return self._models[model]
+
+            # Registration is a read-modify-write of models.json shared by every worker,
+            # so it happens under an exclusive lock on a sidecar file
+            with open(f"{self._models_path}.lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Another worker may have registered models since we last looked
+                    self._models = self._load_models()
+                    if model not in self._models:
+                        if len(self._models) >= 255:
+                            raise ValueError("Sentiment store supports at most 255 distinct models")
+                        self._models[model] = max(self._models.values(), default=0) + 1
+                        tmp_path = f"{self._models_path}.{os.getpid()}.tmp"
+                        with open(tmp_path, "w") as f:
+                            json.dump(self._models, f)
+                        os.replace(tmp_path, self._models_path)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return self._models[model]
+
+    def _model_names(self):
+        with self._lock:
+            self._models = self._load_models()
+            return {model_id: name for name, model_id in self._models.items()}
+
+    def append(self, symbol: str, score: float, news_count: int = 0, tweet_count: int = 0,
+               model: str = "unknown", timestamp: float = None):
+        """Record one sentiment score"""
+        timestamp = int(timestamp if timestamp is not None else time.time())
+        record = RECORD.pack(
+            timestamp,
+            max(0, min(100, int(round(score)))),
+            min(news_count, 0xFFFF),
+            min(tweet_count, 0xFFFF),
+            self._model_id(model)
+        )
+
+        # O_APPEND keeps small writes from different workers from clobbering each other
+        with open(self._series_path(symbol), "ab") as f:
+            f.write(record)
+
+        for listener in self.listeners:
+            try:
+                listener(symbol.upper(), score, timestamp)
+            except Exception as e:
+                print(f"Error in sentiment listener: {e}")
+
+    def read(self, symbol: str, since: float = None, until: float = None):
+        """Return the (timestamp, score, news_count, tweet_count, model_id) records in [since, until]"""
+        path = self._series_path(symbol)
+        if not os.path.exists(path):
+            return []
+
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            count = f.tell() // RECORD.size
+            start = self._find_first(f, count, since) if since is not None else 0
+            f.seek(start * RECORD.size)
+            data = f.read((count - start) * RECORD.size)
+
+        records = [
+            record for record in RECORD.iter_unpack(data)
+            if (since is None or record[0] >= since) and (until is None or record[0] <= until)
+        ]
+        records.sort(key=lambda record: record[0])
+        return records
+
+    def latest(self, symbol: str, count: int = 1):
+        """The last count records by timestamp, written by any worker (oldest first)"""
+        path = self._series_path(symbol)
+        if not os.path.exists(path):
+            return []
+
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            total = f.tell() // RECORD.size
+            start = max(0, total - count - ORDER_SLACK)
+            f.seek(start * RECORD.size)
+            data = f.read((total - start) * RECORD.size)
+        return sorted(RECORD.iter_unpack(data), key=lambda record: record[0])[-count:]
+
+    def _find_first(self, f, count: int, since: float):
+        """Binary search for the first record at or after since"""
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            f.seek(mid * RECORD.size)
+            timestamp = RECORD.unpack(f.read(RECORD.size))[0]
+            if timestamp < since:
+                low = mid + 1
+            else:
+                high = mid
+        return max(0, low - ORDER_SLACK)
+
+    def history(self, symbol: str, since: float = None, until: float = None,
+                window: float = 3600, half_life: float = 86400):
+        """
+        Summarize a symbol's stored sentiment without any LLM calls
+
+        Args:
+            symbol: Cryptocurrency symbol
+            since: Start of the range (unix seconds), default 7 days ago
+            until: End of the range (unix seconds), default now
+            window: Bucket size in seconds for the downsampled series
+            half_life: Half-life in seconds for the exponentially time-decayed aggregate
+
+        Returns:
+            Dictionary with downsampled buckets and decayed aggregates
+        """
+        now = time.time()
+        until = until if until is not None else now
+        since = since if since is not None else until - 7 * 86400
+        records = self.read(symbol, since, until)
+        model_names = self._model_names()
+
+        buckets = []
+        current = None
+        for timestamp, score, news_count, tweet_count, model_id in records:
+            bucket_start = int(timestamp // window * window)
+            if current is None or current["start"] != bucket_start:
+                current = {
+                    "start": bucket_start,
+                    "count": 0,
+                    "sum": 0,
+                    "min": score,
+                    "max": score,
+                    "last": score,
+                    "news_count": 0,
+                    "tweet_count": 0
+                }
+                buckets.append(current)
+            current["count"] += 1
+            current["sum"] += score
+            current["min"] = min(current["min"], score)
+            current["max"] = max(current["max"], score)
+            current["last"] = score
+            current["news_count"] += news_count
+            current["tweet_count"] += tweet_count
+
+        for bucket in buckets:
+            bucket["mean"] = round(bucket.pop("sum") / bucket["count"], 2)
+
+        # Exponential time decay: a point half_life old counts half as much as one from right now
+        decay = math.log(2) / half_life
+        weight_sum = 0.0
+        weighted_score = 0.0
+        for timestamp, score, _, _, _ in records:
+            weight = math.exp(-decay * max(0.0, until - timestamp))
+            weight_sum += weight
+            weighted_score += weight * score
+
+        # Same decay over twice the half-life gives a slower baseline to compare against
+        slow_decay = decay / 2
+        slow_sum = sum(math.exp(-slow_decay * max(0.0, until - record[0])) for record in records)
+        slow_score = sum(
+            math.exp(-slow_decay * max(0.0, until - record[0])) * record[1] for record in records
+        )
+
+        decayed_score = round(weighted_score / weight_sum, 2) if weight_sum else None
+        baseline_score = round(slow_score / slow_sum, 2) if slow_sum else None
+
+        models = {}
+        for record in records:
+            name = model_names.get(record[4], "unknown")
+            models[name] = models.get(name, 0) + 1
+
+        return {
+            "symbol": symbol.upper(),
+            "since": int(since),
+            "until": int(until),
+            "window_seconds": int(window),
+            "half_life_seconds": int(half_life),
+            "points": len(records),
+            "latest_score": records[-1][1] if records else None,
+            "latest_timestamp": records[-1][0] if records else None,
+            "decayed_score": decayed_score,
+            "baseline_score": baseline_score,
+            "trend": round(decayed_score - baseline_score, 2) if decayed_score is not None else None,
+            "models": models,
+            "buckets": buckets
+        }
@@ -0,0 +1,165 @@
+# simulation.py
+
+import hashlib
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from services.analytics import DAY_MS
+
+load_dotenv()
+
+SIM_PATHS = int(os.getenv('SIMULATION_PATHS', 20000))
+SIM_LOOKBACK_DAYS = int(os.getenv('SIMULATION_LOOKBACK_DAYS', 365))
+SIM_MIN_HISTORY = int(os.getenv('SIMULATION_MIN_HISTORY', 30))
+SIM_MAX_HORIZON = int(os.getenv('SIMULATION_MAX_HORIZON', 730))
+
+PERCENTILES = (5, 25, 50, 75, 95)
+CHECKPOINT_DAYS = (7, 14, 30, 60, 90, 180, 365)
+MOVE_LEVELS = (0.1, 0.2)
+
+# Paths simulated per chunk, so long horizons never hold a full paths x days matrix
+CHUNK_CELLS = 2_000_000
+
+
+def _round(value, digits: int = 4):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return round(float(value), digits)
+
+
+def simulation_seed(symbol: str, last_timestamp: int, horizon_days: int, method: str):
+    """Seed derived from the inputs: the same bars and horizon always give the same numbers"""
+    key = f"{symbol}:{last_timestamp}:{horizon_days}:{method}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+
+def simulate_prices(timestamps, closes, horizon_days: int, symbol: str = "", method: str = "bootstrap",
+                    paths: int = SIM_PATHS, lookback_days: int = SIM_LOOKBACK_DAYS, seed: int = None):
+    """
+    Monte Carlo price bands from stored daily closes
+
+    'bootstrap' resamples historical daily log returns (keeps fat tails); 'gbm' draws
+    normal returns with the historical drift and volatility. Every path is generated
+    in a few vectorized NumPy operations per chunk.
+
+    Args:
+        timestamps: Daily bar timestamps (ms), ascending
+        closes: Daily closes matching timestamps
+        horizon_days: Days to simulate ahead
+        symbol: Symbol, used for the default seed and the output
+        method: 'bootstrap' or 'gbm'
+        paths: Number of simulated paths
+        lookback_days: Calibration history
+        seed: Random seed; derived from symbol, last bar and horizon if omitted
+
+    Returns:
+        Compact numeric summary dictionary (with "error" if there is too little history)
+    """
+    import numpy as np
+
+    if method not in ("bootstrap", "gbm"):
+        raise ValueError(f"Unknown simulation method '{method}'")
+    horizon_days = max(1, min(int(horizon_days), SIM_MAX_HORIZON))
+
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    closes = np.asarray(closes, dtype=np.float64)
+    if len(timestamps):
+        keep = (timestamps >= timestamps[-1] - lookback_days * DAY_MS) & (closes > 0)
+        timestamps, closes = timestamps[keep], closes[keep]
+    if len(closes) < SIM_MIN_HISTORY + 1:
+        return {"error": f"Not enough stored daily bars to simulate {symbol or 'this symbol'} ({len(closes)})"}
+
+    returns = np.diff(np.log(closes))
+    drift = returns.mean()
+    volatility = returns.std(ddof=1)
+    last_close = closes[-1]
+
+    if seed is None:
+        seed = simulation_seed(symbol, int(timestamps[-1]), horizon_days, method)
+    rng = np.random.default_rng(seed)
+
+    checkpoints = sorted({day for day in CHECKPOINT_DAYS if day < horizon_days} | {horizon_days})
+    checkpoint_index = np.array(checkpoints) - 1
+    at_checkpoints = np.empty((paths, len(checkpoints)))
+    path_low = np.empty(paths)
+    path_high = np.empty(paths)
+    max_drawdown = np.empty(paths)
+
+    chunk = max(1, CHUNK_CELLS // horizon_days)
+    for start in range(0, paths, chunk):
+        size = min(chunk, paths - start)
+        if method == "bootstrap":
+            steps = returns[rng.integers(0, len(returns), size=(size, horizon_days))]
+        else:
+            # Ito correction keeps the median path on the historical drift
+            steps = rng.normal(drift - volatility ** 2 / 2, volatility, size=(size, horizon_days))
+        log_paths = np.cumsum(steps, axis=1)
+        at_checkpoints[start:start + size] = log_paths[:, checkpoint_index]
+        path_low[start:start + size] = np.minimum(log_paths.min(axis=1), 0)
+        path_high[start:start + size] = np.maximum(log_paths.max(axis=1), 0)
+        running_peak = np.maximum(np.maximum.accumulate(log_paths, axis=1), 0)
+        max_drawdown[start:start + size] = np.exp((log_paths - running_peak).min(axis=1)) - 1
+
+    bands = last_close * np.exp(np.percentile(at_checkpoints, PERCENTILES, axis=0))
+    final = at_checkpoints[:, -1]
+    # Bars are stamped at midnight UTC, so dates are UTC dates whatever the server's timezone
+    start_date = datetime.fromtimestamp(int(timestamps[-1]) / 1000, timezone.utc)
+
+    return {
+        "symbol": symbol,
+        "method": method,
+        "paths": paths,
+        "seed": seed,
+        "horizon_days": horizon_days,
+        "history_days": len(returns),
+        "last_close": _round(last_close, 6),
+        "as_of": start_date.strftime("%Y-%m-%d"),
+        "daily_drift": _round(drift, 6),
+        "daily_volatility": _round(volatility, 6),
+        "annualized_volatility": _round(volatility * math.sqrt(365)),
+        "bands": [
+            {
+                "day": day,
+                "date": (start_date + timedelta(days=day)).strftime("%Y-%m-%d"),
+                **{f"p{percentile}": _round(bands[row, column], 6) for row, percentile in enumerate(PERCENTILES)}
+            }
+            for column, day in enumerate(checkpoints)
+        ],
+        "probability_up": _round((final > 0).mean()),
+        "probability_final": {
+            **{f"+{int(level * 100)}%": _round((final >= math.log1p(level)).mean()) for level in MOVE_LEVELS},
+            **{f"-{int(level * 100)}%": _round((final <= math.log1p(-level)).mean()) for level in MOVE_LEVELS}
+        },
+        "probability_touch": {
+            **{f"+{int(level * 100)}%": _round((path_high >= math.log1p(level)).mean()) for level in MOVE_LEVELS},
+            **{f"-{int(level * 100)}%": _round((path_low <= math.log1p(-level)).mean()) for level in MOVE_LEVELS}
+        },
+        "median_max_drawdown": _round(np.median(max_drawdown))
+    }
+
+
+def _price(value):
+    return f"${value:,.2f}" if value >= 1 else f"${value:.6g}"
+
+
+def format_simulation(simulation):
+    """Simulation summary as short factual lines for a prompt"""
+    lines = [
+        f"{simulation['paths']:,} {simulation['method']} paths over {simulation['horizon_days']} days, "
+        f"calibrated on {simulation['history_days']} days of daily returns up to {simulation['as_of']} "
+        f"(last close {_price(simulation['last_close'])}, annualized volatility {simulation['annualized_volatility']:.0%})."
+    ]
+    for band in simulation["bands"]:
+        lines.append(
+            f"Day {band['day']} ({band['date']}): 5th {_price(band['p5'])}, 25th {_price(band['p25'])}, "
+            f"median {_price(band['p50'])}, 75th {_price(band['p75'])}, 95th {_price(band['p95'])}"
+        )
+    lines.append(f"Probability of ending higher: {simulation['probability_up']:.0%}")
+    # One line per direction and level, so downside odds can't be read as their complements
+    for key, label in (("probability_final", "ending"), ("probability_touch", "trading at any point")):
+        for move, probability in simulation[key].items():
+            direction = "higher" if move.startswith("+") else "lower"
+            lines.append(f"Probability of {label} at least {move[1:]} {direction} than the last close: {probability:.0%}")
+    lines.append(f"Median worst drawdown along a path: {simulation['median_max_drawdown']:.0%}")
+    return "\n".join(lines)
@@ -0,0 +1,184 @@
+# snapshot.py
+
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from services.storage import data_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-worker development only
+    fcntl = None
+
+load_dotenv()
+
+# File layout: header (magic, format version, payload length, SHA-256 of payload) + zlib-compressed JSON
+MAGIC = b"SCVSNAP\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHQ32s")
+
+# Cache namespaces worth carrying over a restart
+SNAPSHOT_NAMESPACES = ("analysis", "context", "stages", "sessions")
+
+
+class SnapshotError(ValueError):
+    """The snapshot file is missing, truncated, corrupt or from an unknown format version"""
+
+
+def read_snapshot(path: str):
+    """
+    Read and verify a snapshot file
+
+    Returns:
+        {namespace: [[key, value, expires_at], ...]} as written
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            payload = f.read()
+    except OSError as e:
+        raise SnapshotError(f"Cannot read snapshot {path}: {e}")
+
+    if len(header) < HEADER.size:
+        raise SnapshotError("Snapshot header is truncated")
+    magic, version, length, digest = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise SnapshotError("Not a cache snapshot file")
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+    if len(payload) != length or hashlib.sha256(payload).digest() != digest:
+        raise SnapshotError("Snapshot checksum mismatch")
+
+    return json.loads(zlib.decompress(payload))["namespaces"]
+
+
+def write_snapshot(path: str, namespaces):
+    """Write namespaces atomically: a crash mid-write leaves the previous snapshot intact"""
+    payload = zlib.compress(json.dumps({"created_at": time.time(), "namespaces": namespaces}, default=str).encode(), 6)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(payload), hashlib.sha256(payload).digest()))
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(payload) + HEADER.size
+
+
+@contextmanager
+def snapshot_lock(path: str):
+    """Exclusive cross-process lock for a snapshot's read-merge-replace (held on a sidecar .lock file)"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class CacheSnapshotter:
+    """
+    Periodically snapshots the hot cache namespaces and restores them at startup
+
+    Workers merge their entries into the existing snapshot rather than overwriting it,
+    so a restarted worker comes back with the union of what every worker had cached.
+    Expired entries are dropped both when writing and when loading.
+    """
+
+    def __init__(self, backend, path: str = None, interval: float = None, namespaces=SNAPSHOT_NAMESPACES):
+        self.backend = backend
+        self.path = path or os.getenv('CACHE_SNAPSHOT_PATH') or data_path("cache.snapshot")
+        self.interval = interval if interval is not None else float(os.getenv('CACHE_SNAPSHOT_INTERVAL', 300))
+        self.namespaces = namespaces
+        self._task = None
+
+    def restore(self):
+        """Load live entries from the snapshot into the backend; returns how many were restored"""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            stored = read_snapshot(self.path)
+        except (SnapshotError, ValueError, zlib.error) as e:
+            print(f"Ignoring cache snapshot {self.path}: {e}")
+            return 0
+
+        now = time.time()
+        restored = 0
+        for namespace in self.namespaces:
+            present = set(self.backend.keys(namespace))
+            for key, value, expires_at in stored.get(namespace, []):
+                # Entries computed since startup are newer than the snapshot's
+                if (expires_at is not None and expires_at <= now) or key in present:
+                    continue
+                self.backend.restore(namespace, key, value, expires_at)
+                restored += 1
+        print(f"Restored {restored} cache entries from {self.path}")
+        return restored
+
+    def save(self):
+        """Merge this worker's live entries into the snapshot file; returns how many entries it holds"""
+        # Without the lock, two workers saving at once would each drop the other's entries
+        with snapshot_lock(self.path):
+            now = time.time()
+            merged = {}
+            if os.path.exists(self.path):
+                try:
+                    for namespace, entries in read_snapshot(self.path).items():
+                        merged[namespace] = {
+                            key: (value, expires_at) for key, value, expires_at in entries
+                            if expires_at is None or expires_at > now
+                        }
+                except (SnapshotError, ValueError, zlib.error) as e:
+                    print(f"Overwriting unreadable cache snapshot: {e}")
+
+            for namespace in self.namespaces:
+                entries = merged.setdefault(namespace, {})
+                for key, value, expires_at in self.backend.items(namespace):
+                    entries[key] = (value, expires_at)
+
+            namespaces = {
+                namespace: [[key, value, expires_at] for key, (value, expires_at) in entries.items()]
+                for namespace, entries in merged.items()
+            }
+            size = write_snapshot(self.path, namespaces)
+        count = sum(len(entries) for entries in namespaces.values())
+        print(f"Saved {count} cache entries to {self.path} ({size} bytes)")
+        return count
+
+    def start(self):
+        """Snapshot every interval seconds in the background"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                print(f"Error saving cache snapshot: {e}")
+
+    async def stop(self):
+        """Stop the periodic task and write a final snapshot"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.to_thread(self.save)
+        except Exception as e:
+            print(f"Error saving cache snapshot: {e}")
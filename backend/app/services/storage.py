@@ -0,0 +1,72 @@
+# storage.py
+
+import os
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Default location for local state (caches, stores) shared by all workers on a host
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def data_path(filename: str):
+    """Return the path of a file inside the local data directory, creating the directory if needed"""
+    data_dir = os.getenv('SCOVA_DATA_DIR', DEFAULT_DATA_DIR)
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
+
+
+def connect_sqlite(path: str):
+    """Open a SQLite connection tuned for concurrent access from several processes"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class SQLiteStore:
+    """Base for local stores kept in a SQLite file, with one connection per process"""
+
+    # CREATE statements run once per connection; subclasses override this
+    SCHEMA = ()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._conn_pid = None
+        self._mutex = threading.RLock()
+
+    def _db(self):
+        """Return this process's connection (connections must not cross a fork)"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = connect_sqlite(self.path)
+            self._conn_pid = os.getpid()
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+        return self._conn
+
+    def execute(self, sql: str, params=()):
+        with self._mutex:
+            return self._db().execute(sql, params)
+
+    def query(self, sql: str, params=()):
+        with self._mutex:
+            return self._db().execute(sql, params).fetchall()
+
+    def executemany(self, sql: str, rows):
+        """Run one statement for many rows inside a single transaction"""
+        with self._mutex:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                db.executemany(sql, rows)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
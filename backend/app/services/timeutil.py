@@ -0,0 +1,31 @@
+# timeutil.py
+
+import re
+
+DURATION_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+    'w': 604800
+}
+
+
+def parse_duration(value, default: float = None):
+    """
+    Parse a duration such as '90s', '15m', '1h', '7d' or '2w' into seconds
+
+    Plain numbers are taken as seconds. Returns default for empty input.
+    """
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*', str(value).lower())
+    if not match:
+        raise ValueError(f"Invalid duration '{value}' (expected e.g. 15m, 1h, 7d)")
+
+    amount = float(match.group(1))
+    unit = match.group(2) or 's'
+    return amount * DURATION_UNITS[unit]
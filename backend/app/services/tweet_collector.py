@@ -0,0 +1,296 @@
+# tweet_collector.py
+
+import asyncio
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from services.storage import SQLiteStore, data_path
+
+load_dotenv()
+
+# search_recent_tweets only reaches back 7 days; older since_id cursors are rejected
+MAX_CURSOR_AGE = 6 * 86400
+
+
+def engagement(metrics: dict):
+    """Raw engagement count: reposts and quotes spread a tweet further than likes do"""
+    return (
+        metrics.get('like_count', 0)
+        + 2 * metrics.get('retweet_count', 0)
+        + 2 * metrics.get('quote_count', 0)
+        + metrics.get('reply_count', 0)
+    )
+
+
+class TweetStore(SQLiteStore):
+    """Local store of fetched tweets with their public metrics, plus a since_id cursor per symbol"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS tweets (
+            symbol TEXT NOT NULL,
+            id TEXT NOT NULL,
+            created_ts REAL NOT NULL,
+            author_id TEXT,
+            text TEXT NOT NULL,
+            like_count INTEGER NOT NULL DEFAULT 0,
+            retweet_count INTEGER NOT NULL DEFAULT 0,
+            reply_count INTEGER NOT NULL DEFAULT 0,
+            quote_count INTEGER NOT NULL DEFAULT 0,
+            impression_count INTEGER NOT NULL DEFAULT 0,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (symbol, id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS tweets_recent ON tweets (symbol, created_ts)",
+        """
+        CREATE TABLE IF NOT EXISTS tweet_cursors (
+            symbol TEXT PRIMARY KEY,
+            since_id TEXT,
+            since_updated_at REAL,
+            last_fetch REAL NOT NULL DEFAULT 0
+        )
+        """,
+    )
+
+    def __init__(self, path: str = None):
+        super().__init__(path or os.getenv('TWEETS_DB_PATH') or data_path("tweets.db"))
+
+    def claim_fetch(self, symbol: str, min_interval: float):
+        """
+        Atomically claim the right to fetch symbol
+
+        Returns:
+            The claim's timestamp (pass it to release_fetch if the fetch fails), or None
+            if any worker fetched symbol within min_interval
+        """
+        now = time.time()
+        self.execute("INSERT OR IGNORE INTO tweet_cursors (symbol, last_fetch) VALUES (?, 0)", (symbol,))
+        claimed = self.execute(
+            "UPDATE tweet_cursors SET last_fetch = ? WHERE symbol = ? AND last_fetch <= ?",
+            (now, symbol, now - min_interval)
+        ).rowcount > 0
+        return now if claimed else None
+
+    def release_fetch(self, symbol: str, claimed_at: float):
+        """Undo a claim whose fetch failed, so the next request can retry right away"""
+        self.execute("UPDATE tweet_cursors SET last_fetch = 0 WHERE symbol = ? AND last_fetch = ?", (symbol, claimed_at))
+
+    def cursor(self, symbol: str):
+        """The newest tweet id seen for symbol, if it is still usable as since_id"""
+        rows = self.query("SELECT since_id, since_updated_at FROM tweet_cursors WHERE symbol = ?", (symbol,))
+        if not rows or not rows[0][0] or time.time() - (rows[0][1] or 0) > MAX_CURSOR_AGE:
+            return None
+        return rows[0][0]
+
+    def save_tweets(self, symbol: str, tweets, newest_id: str = None):
+        """Store fetched tweets (refreshing the metrics of known ones) and advance the cursor; returns how many were new"""
+        now = time.time()
+        rows = []
+        for tweet in tweets:
+            metrics = tweet.get('public_metrics') or {}
+            rows.append((
+                symbol, str(tweet['id']), tweet['created_ts'], tweet.get('author_id'), tweet['text'],
+                metrics.get('like_count', 0), metrics.get('retweet_count', 0), metrics.get('reply_count', 0),
+                metrics.get('quote_count', 0), metrics.get('impression_count', 0), now
+            ))
+
+        before = self.query("SELECT COUNT(*) FROM tweets WHERE symbol = ?", (symbol,))[0][0]
+        if rows:
+            self.executemany(
+                "INSERT INTO tweets (symbol, id, created_ts, author_id, text, like_count, retweet_count, "
+                "reply_count, quote_count, impression_count, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(symbol, id) DO UPDATE SET like_count = excluded.like_count, "
+                "retweet_count = excluded.retweet_count, reply_count = excluded.reply_count, "
+                "quote_count = excluded.quote_count, impression_count = excluded.impression_count, "
+                "fetched_at = excluded.fetched_at",
+                rows
+            )
+        if newest_id:
+            current = self.cursor(symbol)
+            if current is None or int(newest_id) > int(current):
+                self.execute(
+                    "UPDATE tweet_cursors SET since_id = ?, since_updated_at = ? WHERE symbol = ?",
+                    (str(newest_id), now, symbol)
+                )
+        return self.query("SELECT COUNT(*) FROM tweets WHERE symbol = ?", (symbol,))[0][0] - before
+
+    def stale_metrics(self, symbol: str, hours: float, older_than: float, limit: int = 100):
+        """Ids of tweets in the window whose metrics were last fetched before older_than, newest first"""
+        rows = self.query(
+            "SELECT id FROM tweets WHERE symbol = ? AND created_ts >= ? AND fetched_at < ? "
+            "ORDER BY created_ts DESC LIMIT ?",
+            (symbol, time.time() - hours * 3600, older_than, limit)
+        )
+        return [row[0] for row in rows]
+
+    def update_metrics(self, symbol: str, metrics_by_id):
+        """Replace the public metrics of already stored tweets"""
+        now = time.time()
+        self.executemany(
+            "UPDATE tweets SET like_count = ?, retweet_count = ?, reply_count = ?, quote_count = ?, "
+            "impression_count = ?, fetched_at = ? WHERE symbol = ? AND id = ?",
+            [
+                (
+                    metrics.get('like_count', 0), metrics.get('retweet_count', 0), metrics.get('reply_count', 0),
+                    metrics.get('quote_count', 0), metrics.get('impression_count', 0), now, symbol, str(tweet_id)
+                )
+                for tweet_id, metrics in metrics_by_id.items()
+            ]
+        )
+
+    def recent(self, symbol: str, hours: float = 72):
+        rows = self.query(
+            "SELECT id, created_ts, author_id, text, like_count, retweet_count, reply_count, quote_count, "
+            "impression_count FROM tweets WHERE symbol = ? AND created_ts >= ? ORDER BY created_ts DESC",
+            (symbol, time.time() - hours * 3600)
+        )
+        return [
+            {
+                "id": row[0],
+                "created_ts": row[1],
+                "author_id": row[2],
+                "text": row[3],
+                "public_metrics": {
+                    "like_count": row[4],
+                    "retweet_count": row[5],
+                    "reply_count": row[6],
+                    "quote_count": row[7],
+                    "impression_count": row[8]
+                }
+            }
+            for row in rows
+        ]
+
+    def prune(self, older_than_hours: float):
+        self.execute("DELETE FROM tweets WHERE created_ts < ?", (time.time() - older_than_hours * 3600,))
+
+
+class TweetCollector:
+    """
+    Incremental recent-search collector
+
+    Each fetch asks only for tweets newer than the last one seen (since_id, or start_time
+    on the first fetch), pages through up to TWITTER_MAX_PAGES pages of 100, and keeps
+    everything locally so prompts can draw an engagement-weighted sample of the window.
+    Metrics of tweets still in the window are re-fetched in one batched lookup once they
+    are older than TWITTER_METRICS_REFRESH seconds, since a tweet's engagement mostly
+    arrives after it was first seen.
+    """
+
+    def __init__(self, store: TweetStore = None):
+        self.store = store or TweetStore()
+        self.page_size = max(10, min(100, int(os.getenv('TWITTER_PAGE_SIZE', 100))))
+        self.max_pages = int(os.getenv('TWITTER_MAX_PAGES', 3))
+        self.min_interval = float(os.getenv('TWITTER_MIN_FETCH_INTERVAL', 300))
+        self.lookback_hours = float(os.getenv('TWITTER_LOOKBACK_HOURS', 72))
+        self.half_life_hours = float(os.getenv('TWITTER_SAMPLE_HALF_LIFE_HOURS', 24))
+        self.metrics_refresh = float(os.getenv('TWITTER_METRICS_REFRESH', 1800))
+        self._client_lock = threading.Lock()
+
+    def _fetch(self, client, symbol: str):
+        """Page through new tweets (blocking); returns (tweets, newest_id)"""
+        params = {
+            'query': f"#{symbol} -is:retweet",
+            'max_results': self.page_size,
+            'tweet_fields': ['created_at', 'public_metrics', 'author_id']
+        }
+        since_id = self.store.cursor(symbol)
+        if since_id:
+            params['since_id'] = since_id
+        else:
+            start_time = datetime.now(timezone.utc) - timedelta(hours=min(self.lookback_hours, 167))
+            params['start_time'] = start_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        tweets = []
+        newest_id = None
+        for _ in range(self.max_pages):
+            response = client.search_recent_tweets(**params)
+            meta = getattr(response, 'meta', None) or {}
+            newest_id = newest_id or meta.get('newest_id')
+
+            for tweet in response.data or []:
+                created_at = tweet.created_at or datetime.now(timezone.utc)
+                tweets.append({
+                    'id': str(tweet.id),
+                    'created_ts': created_at.timestamp(),
+                    'author_id': str(tweet.author_id) if getattr(tweet, 'author_id', None) else None,
+                    'text': tweet.text,
+                    'public_metrics': getattr(tweet, 'public_metrics', None) or {}
+                })
+
+            if not meta.get('next_token'):
+                break
+            params['next_token'] = meta['next_token']
+
+        return tweets, newest_id
+
+    def _refresh_metrics(self, client, symbol: str):
+        """Re-fetch the metrics of window tweets last seen over metrics_refresh ago (one lookup of up to 100)"""
+        ids = self.store.stale_metrics(symbol, self.lookback_hours, time.time() - self.metrics_refresh)
+        if not ids:
+            return 0
+        response = client.get_tweets(ids=ids, tweet_fields=['public_metrics'])
+        metrics_by_id = {
+            str(tweet.id): getattr(tweet, 'public_metrics', None) or {}
+            for tweet in response.data or []
+        }
+        self.store.update_metrics(symbol, metrics_by_id)
+        return len(metrics_by_id)
+
+    def _fetch_serialized(self, client, symbol: str):
+        # The tweepy client's requests.Session is shared, so one thread pages through at a time
+        with self._client_lock:
+            tweets, newest_id = self._fetch(client, symbol)
+            try:
+                refreshed = self._refresh_metrics(client, symbol)
+                if refreshed:
+                    print(f"Refreshed metrics of {refreshed} {symbol} tweets")
+            except Exception as e:
+                print(f"Error refreshing tweet metrics: {e}")
+            return tweets, newest_id
+
+    async def collect(self, client, symbol: str):
+        """Fetch tweets newer than the symbol's cursor; returns how many new tweets were stored"""
+        symbol = symbol.upper()
+        if client is None:
+            return 0
+        claimed_at = self.store.claim_fetch(symbol, self.min_interval)
+        if claimed_at is None:
+            return 0
+
+        try:
+            tweets, newest_id = await asyncio.to_thread(self._fetch_serialized, client, symbol)
+            new_count = self.store.save_tweets(symbol, tweets, newest_id)
+            print(f"Fetched {len(tweets)} tweets about {symbol}, {new_count} new")
+            self.store.prune(max(self.lookback_hours, 168))
+            return new_count
+        except Exception as e:
+            print(f"Twitter API error: {e}")
+            self.store.release_fetch(symbol, claimed_at)
+            return 0
+
+    def sample(self, symbol: str, k: int = 10):
+        """
+        Engagement-weighted sample of the symbol's recent tweets, without replacement
+
+        Weights grow with log engagement and decay with age. Each tweet's random draw is
+        derived from its id, so the sample is stable between analyses and only changes
+        when new tweets arrive or refreshed metrics move, instead of reshuffling on every call.
+        """
+        now = time.time()
+        keyed = []
+        for tweet in self.store.recent(symbol.upper(), self.lookback_hours):
+            age_hours = max(0.0, (now - tweet['created_ts']) / 3600)
+            weight = (1 + math.log1p(engagement(tweet['public_metrics']))) * 0.5 ** (age_hours / self.half_life_hours)
+
+            # Efraimidis-Spirakis: keep the k largest u^(1/w)
+            u = (int.from_bytes(hashlib.blake2b(tweet['id'].encode(), digest_size=8).digest(), 'big') + 1) / 2 ** 64
+            keyed.append((math.log(u) / weight, tweet))
+
+        keyed.sort(key=lambda item: item[0], reverse=True)
+        return [tweet for _, tweet in keyed[:k]]
@@ -2,14 +2,21 @@
 import streamlit as st
 import requests
 import re
+import threading
+import uuid
+from requests.adapters import HTTPAdapter
+
+try:
+    # Optional (pip install streamlit-keyup): reports keystrokes, so prefetch starts while the user types
+    from st_keyup import st_keyup
+except ImportError:
+    st_keyup = None
 
 # Configuration
 BACKEND_URL = "http://127.0.0.1:8000"
-CRYPTO_SYMBOLS = {
-    'bitcoin': 'BTC', 'ethereum': 'ETH', 'solana': 'SOL', 'cardano': 'ADA',
-    'ripple': 'XRP', 'polkadot': 'DOT', 'dogecoin': 'DOGE', 'chainlink': 'LINK',
-    'avalanche': 'AVAX', 'polygon': 'MATIC'
-}
+HTTP_POOL_SIZE = 16       # Keep-alive connections kept open to the backend
+CHAT_CACHE_TTL = 60       # Seconds a repeated question in the same conversation is answered from cache
+PREFETCH_DEBOUNCE_MS = 400  # Typing pause after which the input is prefetched (with st_keyup)
 
 # Page setup
 st.set_page_config(
@@ -101,101 +108,101 @@ if "messages" not in st.session_state:
     ]
 if "current_symbol" not in st.session_state:
     st.session_state.current_symbol = None
-if "analyzed_symbols" not in st.session_state:
-    st.session_state.analyzed_symbols = []
-if "process_new_message" not in st.session_state:
-    st.session_state.process_new_message = False
+if "chat_session_id" not in st.session_state:
+    st.session_state.chat_session_id = None
+if "client_id" not in st.session_state:
+    st.session_state.client_id = uuid.uuid4().hex
+if "prefetched" not in st.session_state:
+    st.session_state.prefetched = set()
+if "last_prefetch" not in st.session_state:
+    st.session_state.last_prefetch = None
 
 # API Functions
-def api_analyze_crypto(symbol):
-    try:
-        response = requests.get(f"{BACKEND_URL}/api/analyze/{symbol}", timeout=60)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": str(e)}
+@st.cache_resource
+def http_session():
+    """One keep-alive connection pool to the backend, shared by every browser session and rerun"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-def api_follow_up(symbol, question):
-    try:
-        payload = {"symbol": symbol, "question": question}
-        response = requests.post(f"{BACKEND_URL}/api/followup", json=payload, timeout=30)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": str(e)}
+@st.cache_data(ttl=CHAT_CACHE_TTL, max_entries=256, show_spinner=False)
+def cached_chat(message, session_id, client_id):
+    """A repeated question within one conversation (e.g. a double submit) is answered once"""
+    return post_chat(message, session_id, client_id)
 
-def api_predict_price(symbol, timeframe):
-    try:
-        payload = {"symbol": symbol, "timeframe": timeframe}
-        response = requests.post(f"{BACKEND_URL}/api/predict", json=payload, timeout=60)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": str(e)}
+def post_chat(message, session_id, client_id):
+    payload = {"message": message, "session_id": session_id}
+    # The client id lets the backend apply its per-client concurrency cap to this browser session
+    response = http_session().post(f"{BACKEND_URL}/api/chat", json=payload, timeout=90,
+                                   headers={"X-Client-Id": client_id})
+    response.raise_for_status()
+    return response.json()
 
-def api_strategy(symbol, goal):
+def api_chat(message, session_id=None):
     try:
-        payload = {"symbol": symbol, "goal": goal}
-        response = requests.post(f"{BACKEND_URL}/api/strategy", json=payload, timeout=60)
-        response.raise_for_status()
-        return response.json()
+        # Only follow-ups are cached: a new conversation must get its own session id
+        if session_id:
+            return cached_chat(message.strip(), session_id, st.session_state.client_id)
+        return post_chat(message, session_id, st.session_state.client_id)
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
 
-def detect_crypto_symbol(text):
-    text_upper = text.upper()
-    text_lower = text.lower()
+def api_prefetch(text, replace_previous=True):
+    """Ask the backend to warm up the symbols in text; fire-and-forget so the UI never waits on it
     
-    for name, symbol in CRYPTO_SYMBOLS.items():
-        if symbol in text_upper or name in text_lower:
-            return symbol
+    With replace_previous, this prefetch supersedes (and cancels) the one for the previous input.
+    """
+    if not text:
+        return
+    if replace_previous:
+        # Input prefetches supersede each other, so only the latest text is remembered
+        if text == st.session_state.last_prefetch:
+            return
+        st.session_state.last_prefetch = text
+    elif text in st.session_state.prefetched:
+        return
+    else:
+        st.session_state.prefetched.add(text)
+    payload = {"text": text, "client_id": st.session_state.client_id if replace_previous else None}
+    session = http_session()
     
-    return None
-
-# UI Layout
-st.markdown('<div class="header-container"><span class="product-name">CoinSight</span></div>', unsafe_allow_html=True)
-st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-
-# Display sentiment meter for the most recent assistant message
-if st.session_state.messages and st.session_state.messages[-1]["role"] == "assistant":
-    latest_message = st.session_state.messages[-1]
-    sentiment_value = latest_message.get("sentiment", 0.5)
-    sources_count = latest_message.get("sources_count", 0)
+    def send():
+        try:
+            session.post(f"{BACKEND_URL}/api/prefetch", json=payload, timeout=2)
+        except requests.exceptions.RequestException:
+            pass
     
-    st.markdown(f"""
-    <div class="sentiment-container">
-        <span class="sentiment-label">Market Sentiment</span>
-        <div class="sentiment-track">
-            <div class="sentiment-value"></div>
-            <div class="sentiment-indicator" style="left: {sentiment_value * 100}%;"></div>
-        </div>
-        <span class="sources-label">Sources</span>
-        <span class="sources-count">{sources_count}</span>
-    </div>
-    """, unsafe_allow_html=True)
+    threading.Thread(target=send, daemon=True).start()
 
-# Display messages
-for message in st.session_state.messages:
-    role = message["role"]
-    content = message["content"]
-    sources = message.get("sources", [])
+def prefetch_input():
+    """Input callback: warm up whatever symbol the user has typed before they send it
     
+    With st_keyup this runs after each pause in typing; with st.text_input only on Enter or
+    blur, and a blur caused by clicking send is skipped, since the chat request runs the stages itself.
+    """
+    if st.session_state.get("send_button"):
+        return
+    api_prefetch(st.session_state.chat_input)
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def message_html(role, content, sources):
+    """HTML for one message; cached, so reruns of a long chat don't rebuild every message"""
     icon = "👤" if role == "user" else "🤖"
     
     # Create source links HTML if there are sources
     sources_html = ""
     if role == "assistant" and sources:
         sources_html = '<div class="sources-container"><strong>Sources:</strong> '
-        for source in sources:
-            name = source.get("name", "")
-            url = source.get("url", "")
+        for name, url in sources:
             if url:
                 sources_html += f'<a href="{url}" target="_blank" class="source-link">{name}</a>'
             else:
                 sources_html += f'<span class="source-link">{name}</span>'
         sources_html += '</div>'
     
-    st.markdown(f"""
+    return f"""
     <div class="message">
         <div class="message-icon">{icon}</div>
         <div class="message-content">
@@ -203,39 +210,113 @@ for message in st.session_state.messages:
             {sources_html}
         </div>
     </div>
-    """, unsafe_allow_html=True)
+    """
 
-# Display example buttons for first-time users
-if len(st.session_state.messages) <= 1:
-    st.markdown("<div style='margin-top: 1.5rem;'>", unsafe_allow_html=True)
+def render_message(message):
+    sources = tuple((source.get("name", ""), source.get("url", "")) for source in message.get("sources", []))
+    st.markdown(message_html(message["role"], message["content"], sources), unsafe_allow_html=True)
+
+def render_sentiment(placeholder):
+    """Sentiment meter for the most recent assistant message"""
+    if not st.session_state.messages or st.session_state.messages[-1]["role"] != "assistant":
+        return
+    latest_message = st.session_state.messages[-1]
+    sentiment_value = latest_message.get("sentiment", 0.5)
+    sources_count = latest_message.get("sources_count", 0)
     
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("What's happening with Ethereum?", key="example1", use_container_width=True):
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": "What's happening with Ethereum?",
-            })
-            st.session_state.process_new_message = True
-            st.rerun()
+    placeholder.markdown(f"""
+    <div class="sentiment-container">
+        <span class="sentiment-label">Market Sentiment</span>
+        <div class="sentiment-track">
+            <div class="sentiment-value"></div>
+            <div class="sentiment-indicator" style="left: {sentiment_value * 100}%;"></div>
+        </div>
+        <span class="sources-label">Sources</span>
+        <span class="sources-count">{sources_count}</span>
+    </div>
+    """, unsafe_allow_html=True)
+
+def send_message(prompt):
+    """Append the user's message and the reply to the chat in place, without rerunning the page"""
+    user_message = {"role": "user", "content": prompt}
+    st.session_state.messages.append(user_message)
+    examples_area.empty()
+    with messages_area:
+        render_message(user_message)
     
-    with col2:
-        if st.button("When should I sell my BTC?", key="example2", use_container_width=True):
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": "When should I sell my BTC?",
-            })
-            st.session_state.process_new_message = True
-            st.rerun()
+    with messages_area, st.spinner("Analyzing..."):
+        # One round trip: the backend routes the message and runs only what it needs
+        api_result = api_chat(prompt, st.session_state.chat_session_id)
+    if "error" in api_result:
+        response_data = {
+            "content": f"I encountered an error: {api_result['error']}",
+            "sentiment": 0.5,
+            "sources": [],
+            "sources_count": 0
+        }
+    else:
+        st.session_state.chat_session_id = api_result["session_id"]
+        st.session_state.current_symbol = api_result.get("symbol") or st.session_state.current_symbol
+        response_data = {
+            "content": api_result["content"],
+            "sentiment": api_result.get("sentiment_score", 50) / 100,  # Convert 0-100 to 0-1
+            "sources": api_result.get("sources", []),
+            "sources_count": api_result.get("sources_count", 0)
+        }
     
-    st.markdown("</div>", unsafe_allow_html=True)
+    assistant_message = {"role": "assistant", **response_data}
+    st.session_state.messages.append(assistant_message)
+    with messages_area:
+        render_message(assistant_message)
+    render_sentiment(sentiment_area)
+
+# UI Layout
+st.markdown('<div class="header-container"><span class="product-name">CoinSight</span></div>', unsafe_allow_html=True)
+st.markdown('<div class="chat-container">', unsafe_allow_html=True)
+
+# Display sentiment meter for the most recent assistant message
+sentiment_area = st.empty()
+render_sentiment(sentiment_area)
+
+# Display messages; new ones are appended to this container as they arrive
+messages_area = st.container()
+with messages_area:
+    for message in st.session_state.messages:
+        render_message(message)
+
+# Display example buttons for first-time users
+examples_area = st.empty()
+example_clicked = None
+if len(st.session_state.messages) <= 1:
+    with examples_area.container():
+        st.markdown("<div style='margin-top: 1.5rem;'>", unsafe_allow_html=True)
+        
+        # Warm up the suggested queries while the user reads them
+        api_prefetch("What's happening with Ethereum?", replace_previous=False)
+        api_prefetch("When should I sell my BTC?", replace_previous=False)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("What's happening with Ethereum?", key="example1", use_container_width=True):
+                example_clicked = "What's happening with Ethereum?"
+        
+        with col2:
+            if st.button("When should I sell my BTC?", key="example2", use_container_width=True):
+                example_clicked = "When should I sell my BTC?"
+        
+        st.markdown("</div>", unsafe_allow_html=True)
 
 # Input area
 st.markdown('<div class="input-area">', unsafe_allow_html=True)
 col1, col2 = st.columns([5, 1])
 with col1:
-    prompt = st.text_input("Ask a question", placeholder="Ask about crypto markets, analysis, or trends...", 
-                          label_visibility="collapsed", key="chat_input")
+    if st_keyup is not None:
+        prompt = st_keyup("Ask a question", placeholder="Ask about crypto markets, analysis, or trends...",
+                          label_visibility="collapsed", key="chat_input", debounce=PREFETCH_DEBOUNCE_MS,
+                          on_change=prefetch_input)
+    else:
+        prompt = st.text_input("Ask a question", placeholder="Ask about crypto markets, analysis, or trends...", 
+                              label_visibility="collapsed", key="chat_input", on_change=prefetch_input)
 with col2:
     send_button = st.button("→", key="send_button", use_container_width=True)
 st.markdown('</div>', unsafe_allow_html=True)
@@ -245,93 +326,7 @@ st.markdown('<div class="disclaimer">All market analysis is for informational pu
 st.markdown('</div>', unsafe_allow_html=True)  # Close chat container
 
 # Message handling logic
-if send_button and prompt:
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    st.session_state.process_new_message = True
-    st.rerun()
-
-if st.session_state.process_new_message and st.session_state.messages[-1]["role"] == "user":
-    prompt = st.session_state.messages[-1]["content"]
-    
-    with st.spinner("Analyzing..."):
-        crypto_symbol = detect_crypto_symbol(prompt)
-        if not crypto_symbol and st.session_state.current_symbol:
-            crypto_symbol = st.session_state.current_symbol
-        
-        if crypto_symbol:
-            st.session_state.current_symbol = crypto_symbol
-            
-            # Determine request type based on query
-            if "predict" in prompt.lower() or "forecast" in prompt.lower():
-                timeframe = "month"  # Default
-                if "week" in prompt.lower():
-                    timeframe = "week"
-                elif "3 month" in prompt.lower() or "three month" in prompt.lower():
-                    timeframe = "3months"
-                
-                api_result = api_predict_price(crypto_symbol, timeframe)
-                if "error" in api_result:
-                    response_data = {
-                        "content": f"I encountered an error: {api_result['error']}",
-                        "sentiment": 0.5,
-                        "sources": [],
-                        "sources_count": 0
-                    }
-                else:
-                    response_data = {
-                        "content": api_result["prediction"],
-                        "sentiment": api_result.get("sentiment_score", 50) / 100,  # Convert 0-100 to 0-1
-                        "sources": api_result.get("sources", []),
-                        "sources_count": api_result.get("sources_count", 0)
-                    }
-            
-            elif any(phrase in prompt.lower() for phrase in ["when should i", "strategy", "timing", "best time", "maximize"]):
-                api_result = api_strategy(crypto_symbol, prompt)
-                if "error" in api_result:
-                    response_data = {
-                        "content": f"I encountered an error: {api_result['error']}",
-                        "sentiment": 0.5,
-                        "sources": [],
-                        "sources_count": 0
-                    }
-                else:
-                    response_data = {
-                        "content": api_result["strategy"],
-                        "sentiment": api_result.get("sentiment_score", 50) / 100,
-                        "sources": api_result.get("sources", []),
-                        "sources_count": api_result.get("sources_count", 0)
-                    }
-            
-            else:
-                # Get base analysis if needed
-                if crypto_symbol not in st.session_state.analyzed_symbols:
-                    api_analyze_crypto(crypto_symbol)
-                    st.session_state.analyzed_symbols.append(crypto_symbol)
-                
-                # Handle follow-up question
-                api_result = api_follow_up(crypto_symbol, prompt)
-                if "error" in api_result:
-                    response_data = {
-                        "content": f"I encountered an error: {api_result['error']}",
-                        "sentiment": 0.5,
-                        "sources": [],
-                        "sources_count": 0
-                    }
-                else:
-                    response_data = {
-                        "content": api_result["response"],
-                        "sentiment": api_result.get("sentiment_score", 50) / 100,
-                        "sources": api_result.get("sources", []),
-                        "sources_count": api_result.get("sources_count", 0)
-                    }
-        else:
-            response_data = {
-                "content": "I'm not sure which cryptocurrency you're asking about. Could you mention a specific crypto symbol like BTC, ETH, or SOL?",
-                "sentiment": 0.5,
-                "sources": [],
-                "sources_count": 0
-            }
-        
-        st.session_state.messages.append({"role": "assistant", **response_data})
-        st.session_state.process_new_message = False
-        st.rerun()
\ No newline at end of file
+if example_clicked:
+    send_message(example_clicked)
+elif send_button and prompt:
+    send_message(prompt)
\ No newline at end of file